@@ -0,0 +1,182 @@
+"""Activity log writes.
+
+By default activities are buffered in a bounded in-process queue and written
+by a background task in multi-row INSERT batches, off the request path. On
+serverless, where work after the response may never run, or with
+ACTIVITY_LOG_BUFFERED=false, they are written inline instead.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from datetime import timezone
+from typing import List, Optional, Sequence
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, IS_SERVERLESS
+from models import Activity, DailyActivityCount
+from versions import bump_versions
+from cache import invalidate_tags, activity_tag
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_LOG_BUFFERED = os.environ.get(
+    'ACTIVITY_LOG_BUFFERED', 'false' if IS_SERVERLESS else 'true'
+).lower() == 'true'
+ACTIVITY_QUEUE_SIZE = int(os.environ.get('ACTIVITY_QUEUE_SIZE', '10000'))
+ACTIVITY_BATCH_SIZE = int(os.environ.get('ACTIVITY_BATCH_SIZE', '500'))
+ACTIVITY_FLUSH_INTERVAL = float(os.environ.get('ACTIVITY_FLUSH_INTERVAL', '1.0'))  # seconds
+ACTIVITY_DRAIN_TIMEOUT = float(os.environ.get('ACTIVITY_DRAIN_TIMEOUT', '10.0'))  # seconds
+
+
+def daily_count_upsert(rows: Sequence[dict]):
+    """Build an upsert adding the given activity rows to daily_activity_counts."""
+    buckets = {}
+    for r in rows:
+        key = (r["user_id"], r["created_at"].astimezone(timezone.utc).date(), r["entity_type"], r["action"])
+        buckets[key] = buckets.get(key, 0) + 1
+    # Sorted so concurrent batches lock the same counter rows in the same order
+    stmt = insert(DailyActivityCount).values([
+        {"user_id": u, "day": d, "entity_type": e, "action": act, "count": n}
+        for (u, d, e, act), n in sorted(buckets.items())
+    ])
+    return stmt.on_conflict_do_update(
+        index_elements=[
+            DailyActivityCount.user_id, DailyActivityCount.day,
+            DailyActivityCount.entity_type, DailyActivityCount.action,
+        ],
+        set_={"count": DailyActivityCount.count + stmt.excluded.count},
+    )
+
+
+async def insert_activities(db: AsyncSession, rows: Sequence[dict]) -> None:
+    """Insert activity rows, their rollup counts and version bumps; the caller commits."""
+    await db.execute(insert(Activity).values(list(rows)))
+    await db.execute(daily_count_upsert(rows))
+    await bump_versions(db, ((r["user_id"], "activities") for r in rows))
+
+
+async def invalidate_activity_caches(rows: Sequence[dict]) -> None:
+    await invalidate_tags(*{activity_tag(r["user_id"]) for r in rows})
+
+
+async def write_activities(db: AsyncSession, rows: Sequence[dict]) -> None:
+    """Insert activity rows and their rollup counts in one transaction."""
+    await insert_activities(db, rows)
+    await db.commit()
+    await invalidate_activity_caches(rows)
+
+
+class ActivitySink:
+    """Bounded queue of activity rows flushed in batches by a background task.
+
+    A batch is written once `batch_size` rows are waiting or `flush_interval`
+    seconds after its first row arrived, whichever comes first. When the
+    queue is full new rows are dropped and counted rather than blocking.
+    """
+
+    _STOP = object()
+
+    def __init__(self, maxsize: int, batch_size: int, flush_interval: float):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self._batch_ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self._latencies = deque(maxlen=256)  # recent flush durations, seconds
+
+    def put(self, rows: Sequence[dict]) -> None:
+        """Queue rows for writing; never blocks or raises."""
+        if self._closed:
+            self.dropped += len(rows)
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        for row in rows:
+            try:
+                self._queue.put_nowait(row)
+            except asyncio.QueueFull:
+                self.dropped += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._batch_ready.set()
+
+    async def _run(self) -> None:
+        while True:
+            first = await self._queue.get()
+            if first is self._STOP:
+                return
+            if self._queue.qsize() < self.batch_size - 1:
+                self._batch_ready.clear()
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch, stop = [first], False
+            while len(batch) < self.batch_size and not self._queue.empty():
+                row = self._queue.get_nowait()
+                if row is self._STOP:
+                    stop = True
+                    break
+                batch.append(row)
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: List[dict]) -> None:
+        start = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                await write_activities(db, batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.failed += len(batch)
+            logger.warning(f"Failed to write {len(batch)} activities: {e}")
+        finally:
+            self.flushes += 1
+            self._latencies.append(time.perf_counter() - start)
+
+    async def close(self, timeout: float = ACTIVITY_DRAIN_TIMEOUT) -> None:
+        """Stop accepting rows and write out everything still queued."""
+        self._closed = True
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Activity log drain timed out with {self._queue.qsize()} rows queued")
+
+    async def _drain(self) -> None:
+        # Rows queued before the sentinel are flushed before the task exits
+        await self._queue.put(self._STOP)
+        self._batch_ready.set()
+        await self._task
+
+    def metrics(self) -> dict:
+        latencies = list(self._latencies)
+        return {
+            "buffered": ACTIVITY_LOG_BUFFERED,
+            "queue_depth": self._queue.qsize(),
+            "queue_size": self.maxsize,
+            "dropped": self.dropped,
+            "written": self.written,
+            "failed": self.failed,
+            "flushes": self.flushes,
+            "flush_latency_ms": {
+                "last": round(latencies[-1] * 1000, 2) if latencies else None,
+                "avg": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else None,
+                "max": round(max(latencies) * 1000, 2) if latencies else None,
+            },
+        }
+
+
+activity_sink = ActivitySink(ACTIVITY_QUEUE_SIZE, ACTIVITY_BATCH_SIZE, ACTIVITY_FLUSH_INTERVAL)
@@ -0,0 +1,32 @@
+"""add_default_activity_partition
+
+Revision ID: 16e888b5035a
+Revises: 7dea57fac8d7
+Create Date: 2026-10-17 15:02:37.418206
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '16e888b5035a'
+down_revision: Union[str, Sequence[str], None] = '7dea57fac8d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Catches activities for months nobody created a partition for (no cron on
+    # serverless), which would otherwise fail to insert; partitions.py moves
+    # its rows into the month's partition when it creates one
+    op.execute("CREATE TABLE IF NOT EXISTS activities_default PARTITION OF activities DEFAULT")
+    op.execute("ALTER TABLE activities_default ENABLE ROW LEVEL SECURITY")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Rows still in it are lost; run partitions.py first to move them into monthly partitions
+    op.execute("DROP TABLE IF EXISTS activities_default")
@@ -0,0 +1,57 @@
+"""add_export_jobs
+
+Revision ID: 5f2a8c91d3e4
+Revises: 7698486f87de
+Create Date: 2026-10-17 11:26:08.417203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f2a8c91d3e4'
+down_revision: Union[str, Sequence[str], None] = '7698486f87de'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('export_jobs',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('entity_type', sa.String(length=20), nullable=False),
+    sa.Column('format', sa.String(length=10), nullable=False),
+    sa.Column('gzip', sa.Boolean(), nullable=False, server_default=sa.false()),
+    sa.Column('status', sa.String(length=20), nullable=False, server_default='queued'),
+    sa.Column('rows_total', sa.Integer(), nullable=True),
+    sa.Column('rows_done', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('bytes_written', sa.BigInteger(), nullable=False, server_default='0'),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_export_jobs_user_id'), 'export_jobs', ['user_id'], unique=False)
+    # Lets a standalone worker find queued jobs without scanning finished ones
+    op.create_index('ix_export_jobs_queued', 'export_jobs', ['created_at'], unique=False,
+                    postgresql_where=sa.text("status = 'queued'"))
+
+    op.execute("ALTER TABLE export_jobs ENABLE ROW LEVEL SECURITY")
+    op.execute(
+        "CREATE POLICY \"Users can manage their own export_jobs\" ON export_jobs FOR ALL "
+        "USING (auth.uid()::text = user_id) WITH CHECK (auth.uid()::text = user_id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP POLICY IF EXISTS \"Users can manage their own export_jobs\" ON export_jobs")
+    op.drop_index('ix_export_jobs_queued', table_name='export_jobs')
+    op.drop_index(op.f('ix_export_jobs_user_id'), table_name='export_jobs')
+    op.drop_table('export_jobs')
@@ -0,0 +1,56 @@
+"""add_full_text_search_vectors
+
+Revision ID: 7698486f87de
+Revises: e3c695712f8f
+Create Date: 2026-10-17 10:41:55.093162
+
+Adding a STORED generated column rewrites tasks, notes and posts in full
+while holding an ACCESS EXCLUSIVE lock on each, so reads and writes to a
+table wait for its rewrite; run it in a quiet window on large databases.
+The GIN indexes are built CONCURRENTLY afterwards and don't block writes.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7698486f87de'
+down_revision: Union[str, Sequence[str], None] = 'e3c695712f8f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table -> body column indexed alongside the title
+SEARCHABLE_TABLES = {
+    'tasks': 'description',
+    'notes': 'content',
+    'posts': 'content',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, body in SEARCHABLE_TABLES.items():
+        op.execute(
+            f"ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            f"setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            f"setweight(to_tsvector('english', coalesce({body}, '')), 'B')"
+            f") STORED"
+        )
+
+    # CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for table in SEARCHABLE_TABLES:
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_search_vector "
+                f"ON {table} USING gin (search_vector)"
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for table in SEARCHABLE_TABLES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS ix_{table}_search_vector")
+    for table in SEARCHABLE_TABLES:
+        op.drop_column(table, 'search_vector')
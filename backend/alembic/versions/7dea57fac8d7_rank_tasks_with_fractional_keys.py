@@ -0,0 +1,110 @@
+"""rank_tasks_with_fractional_keys
+
+Revision ID: 7dea57fac8d7
+Revises: bc87926e3ff5
+Create Date: 2026-10-17 14:26:09.504713
+
+Runs online: the backfill commits a batch of users at a time, NOT NULL is
+proven by a validated CHECK instead of a scan under ACCESS EXCLUSIVE, and the
+rank indexes are built CONCURRENTLY before the position ones are dropped.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7dea57fac8d7'
+down_revision: Union[str, Sequence[str], None] = 'bc87926e3ff5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BACKFILL_USERS_PER_BATCH = 100
+
+# Each listed user's tasks in their current list order, numbered from 0
+CURRENT_ORDER = (
+    "SELECT id, row_number() OVER (PARTITION BY user_id ORDER BY {sort}, created_at DESC, id DESC) - 1 AS n "
+    "FROM tasks WHERE user_id = ANY(:users)"
+)
+
+# name -> definition, for each sort column
+RANK_INDEXES = {
+    'ix_tasks_user_id_rank': "(user_id, rank, created_at DESC, id DESC)",
+    'ix_tasks_user_id_status': "(user_id, status, rank, created_at DESC, id DESC)",
+}
+POSITION_INDEXES = {
+    'ix_tasks_user_id_position': "(user_id, position, created_at DESC, id DESC)",
+    'ix_tasks_user_id_status': "(user_id, status, position, created_at DESC, id DESC)",
+}
+
+
+def rank_for(n: str) -> str:
+    """SQL for the fixed-width rank key of integer n: head 'd' plus 4 base-62 digits (see ranking.py)."""
+    digits = " || ".join(f"substr('{DIGITS}', (({n}) / {62 ** p} % 62)::int + 1, 1)" for p in (3, 2, 1, 0))
+    return f"'d' || {digits}"
+
+
+def backfill(column: str, value: str, sort: str) -> None:
+    """Number every user's tasks into `column`, committing a batch of users at a time.
+
+    Loops until no task is missing a value, so tasks the old code creates
+    while this runs are numbered too.
+    """
+    bind = op.get_bind()
+    while True:
+        users = bind.execute(sa.text(
+            f"SELECT DISTINCT user_id FROM tasks WHERE {column} IS NULL"
+        )).scalars().all()
+        if not users:
+            return
+        for i in range(0, len(users), BACKFILL_USERS_PER_BATCH):
+            bind.execute(
+                sa.text(
+                    f"UPDATE tasks SET {column} = {value} "
+                    f"FROM ({CURRENT_ORDER.format(sort=sort)}) AS ordered WHERE tasks.id = ordered.id"
+                ),
+                {"users": users[i:i + BACKFILL_USERS_PER_BATCH]},
+            )
+
+
+def set_not_null(table: str, column: str) -> None:
+    """SET NOT NULL without scanning under ACCESS EXCLUSIVE: a validated CHECK proves it first."""
+    constraint = f"{table}_{column}_not_null"
+    op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {constraint} CHECK ({column} IS NOT NULL) NOT VALID")
+    op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {constraint}")
+    op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL")
+    op.execute(f"ALTER TABLE {table} DROP CONSTRAINT {constraint}")
+
+
+def swap_indexes(old: dict, new: dict) -> None:
+    """Build the new indexes concurrently (under a temporary name when taken), then drop the old ones."""
+    for name, definition in new.items():
+        building = f"{name}_new" if name in old else name
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {building} ON tasks {definition}")
+    for name in old:
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    for name in new:
+        if name in old:
+            op.execute(f"ALTER INDEX {name}_new RENAME TO {name}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Each statement commits on its own, so no lock outlives its step
+    with op.get_context().autocommit_block():
+        op.add_column('tasks', sa.Column('rank', sa.String(length=255, collation='C'), nullable=True))
+        backfill('rank', rank_for('ordered.n'), sort='position')
+        set_not_null('tasks', 'rank')
+        swap_indexes(POSITION_INDEXES, RANK_INDEXES)
+        op.drop_column('tasks', 'position')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.add_column('tasks', sa.Column('position', sa.Integer(), nullable=True))
+        backfill('position', 'ordered.n', sort='rank')
+        swap_indexes(RANK_INDEXES, POSITION_INDEXES)
+        op.drop_column('tasks', 'rank')
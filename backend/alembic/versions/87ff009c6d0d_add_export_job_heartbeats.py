@@ -0,0 +1,33 @@
+"""add_export_job_heartbeats
+
+Revision ID: 87ff009c6d0d
+Revises: 16e888b5035a
+Create Date: 2026-10-17 16:12:48.203517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '87ff009c6d0d'
+down_revision: Union[str, Sequence[str], None] = '16e888b5035a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Constant defaults, so neither column rewrites the table
+    op.add_column('export_jobs', sa.Column('attempt', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('export_jobs', sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+    # Jobs already running count their start as the last heartbeat
+    op.execute("UPDATE export_jobs SET heartbeat_at = started_at WHERE status = 'running'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('export_jobs', 'heartbeat_at')
+    op.drop_column('export_jobs', 'attempt')
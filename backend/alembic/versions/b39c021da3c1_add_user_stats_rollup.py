@@ -0,0 +1,60 @@
+"""add_user_stats_rollup
+
+Revision ID: b39c021da3c1
+Revises: 0451f991de72
+Create Date: 2026-10-17 09:12:40.218377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b39c021da3c1'
+down_revision: Union[str, Sequence[str], None] = '0451f991de72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('user_stats',
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('stat', sa.String(length=100), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'stat')
+    )
+
+    op.execute("ALTER TABLE user_stats ENABLE ROW LEVEL SECURITY")
+    op.execute(
+        "CREATE POLICY \"Users can manage their own user_stats\" ON user_stats FOR ALL "
+        "USING (auth.uid()::text = user_id) WITH CHECK (auth.uid()::text = user_id)"
+    )
+
+    # Backfill counters for existing users from the source tables
+    op.execute(
+        "INSERT INTO user_stats (user_id, stat, count) "
+        "SELECT user_id, 'tasks.total', count(*) FROM tasks GROUP BY user_id "
+        "UNION ALL SELECT user_id, 'tasks.status:' || status, count(*) FROM tasks "
+        "WHERE status IS NOT NULL GROUP BY user_id, status "
+        "UNION ALL SELECT user_id, 'tasks.priority:' || priority, count(*) FROM tasks "
+        "WHERE priority IS NOT NULL GROUP BY user_id, priority "
+        "UNION ALL SELECT user_id, 'notes.total', count(*) FROM notes GROUP BY user_id "
+        "UNION ALL SELECT user_id, 'notes.pinned', count(*) FROM notes "
+        "WHERE is_pinned = true GROUP BY user_id "
+        "UNION ALL SELECT user_id, 'notes.color:' || color, count(*) FROM notes "
+        "WHERE color IS NOT NULL GROUP BY user_id, color "
+        "UNION ALL SELECT user_id, 'posts.total', count(*) FROM posts GROUP BY user_id "
+        "UNION ALL SELECT user_id, 'posts.published', count(*) FROM posts "
+        "WHERE is_published = true GROUP BY user_id "
+        "UNION ALL SELECT user_id, 'tags.total', count(*) FROM tags GROUP BY user_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP POLICY IF EXISTS \"Users can manage their own user_stats\" ON user_stats")
+    op.drop_table('user_stats')
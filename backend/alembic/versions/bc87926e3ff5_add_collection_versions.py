@@ -0,0 +1,41 @@
+"""add_collection_versions
+
+Revision ID: bc87926e3ff5
+Revises: d49664bbb0bd
+Create Date: 2026-10-17 13:04:52.318840
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bc87926e3ff5'
+down_revision: Union[str, Sequence[str], None] = 'd49664bbb0bd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('collection_versions',
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('collection', sa.String(length=20), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'collection')
+    )
+
+    op.execute("ALTER TABLE collection_versions ENABLE ROW LEVEL SECURITY")
+    op.execute(
+        "CREATE POLICY \"Users can manage their own collection_versions\" ON collection_versions FOR ALL "
+        "USING (auth.uid()::text = user_id) WITH CHECK (auth.uid()::text = user_id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP POLICY IF EXISTS \"Users can manage their own collection_versions\" ON collection_versions")
+    op.drop_table('collection_versions')
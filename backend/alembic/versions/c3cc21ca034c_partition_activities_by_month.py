@@ -0,0 +1,122 @@
+"""partition_activities_by_month
+
+Revision ID: c3cc21ca034c
+Revises: 5f2a8c91d3e4
+Create Date: 2026-10-17 11:58:41.730615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3cc21ca034c'
+down_revision: Union[str, Sequence[str], None] = '5f2a8c91d3e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ACTIVITY_COLUMNS = "id, user_id, action, entity_type, entity_id, entity_title, details, created_at"
+POLICY = "\"Users can manage their own activities\""
+
+
+def enable_rls() -> None:
+    op.execute("ALTER TABLE activities ENABLE ROW LEVEL SECURITY")
+    op.execute(
+        f"CREATE POLICY {POLICY} ON activities FOR ALL "
+        "USING (auth.uid()::text = user_id) WITH CHECK (auth.uid()::text = user_id)"
+    )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Move the existing table (and its index names) out of the way
+    op.execute("ALTER TABLE activities RENAME TO activities_unpartitioned")
+    op.execute("ALTER INDEX activities_pkey RENAME TO activities_unpartitioned_pkey")
+    op.execute("ALTER INDEX ix_activities_created_at RENAME TO ix_activities_unpartitioned_created_at")
+    op.execute("ALTER INDEX ix_activities_user_id RENAME TO ix_activities_unpartitioned_user_id")
+
+    # The partition key has to be part of the primary key
+    op.execute(
+        "CREATE TABLE activities ("
+        "id VARCHAR(36) NOT NULL, "
+        "user_id VARCHAR(36) NOT NULL REFERENCES users (id) ON DELETE CASCADE, "
+        "action VARCHAR(50) NOT NULL, "
+        "entity_type VARCHAR(20) NOT NULL, "
+        "entity_id VARCHAR(36), "
+        "entity_title VARCHAR(255), "
+        "details TEXT, "
+        "created_at TIMESTAMP WITH TIME ZONE NOT NULL, "
+        "PRIMARY KEY (id, created_at)"
+        ") PARTITION BY RANGE (created_at)"
+    )
+    op.create_index('ix_activities_created_at', 'activities', ['created_at'], unique=False)
+    # Serves the timeline's user_id filter + created_at ordering within each partition
+    op.create_index('ix_activities_user_id_created_at', 'activities', ['user_id', 'created_at'], unique=False)
+
+    # One partition per UTC month, from the oldest existing row to three months ahead
+    # (partitions.py keeps extending this)
+    op.execute("""
+        DO $$
+        DECLARE
+            m date;
+            name text;
+        BEGIN
+            FOR m IN
+                SELECT generate_series(
+                    date_trunc('month', coalesce(
+                        (SELECT min(created_at) FROM activities_unpartitioned), now()
+                    ) AT TIME ZONE 'UTC'),
+                    date_trunc('month', now() AT TIME ZONE 'UTC') + interval '3 months',
+                    interval '1 month'
+                )::date
+            LOOP
+                name := 'activities_y' || to_char(m, 'YYYY') || 'm' || to_char(m, 'MM');
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF activities FOR VALUES FROM (%L) TO (%L)',
+                    name, m::timestamp AT TIME ZONE 'UTC', (m + interval '1 month')::timestamp AT TIME ZONE 'UTC'
+                );
+                EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', name);
+            END LOOP;
+        END $$;
+    """)
+
+    op.execute(
+        f"INSERT INTO activities ({ACTIVITY_COLUMNS}) "
+        "SELECT id, user_id, action, entity_type, entity_id, entity_title, details, coalesce(created_at, now()) "
+        "FROM activities_unpartitioned"
+    )
+    op.drop_table('activities_unpartitioned')
+    enable_rls()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("ALTER TABLE activities RENAME TO activities_partitioned")
+    op.execute("ALTER INDEX activities_pkey RENAME TO activities_partitioned_pkey")
+    op.execute("ALTER INDEX ix_activities_created_at RENAME TO ix_activities_partitioned_created_at")
+    op.execute("ALTER INDEX ix_activities_user_id_created_at RENAME TO ix_activities_partitioned_user_id_created_at")
+
+    op.create_table('activities',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('action', sa.String(length=50), nullable=False),
+    sa.Column('entity_type', sa.String(length=20), nullable=False),
+    sa.Column('entity_id', sa.String(length=36), nullable=True),
+    sa.Column('entity_title', sa.String(length=255), nullable=True),
+    sa.Column('details', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_activities_created_at'), 'activities', ['created_at'], unique=False)
+    op.create_index(op.f('ix_activities_user_id'), 'activities', ['user_id'], unique=False)
+
+    op.execute(
+        f"INSERT INTO activities ({ACTIVITY_COLUMNS}) "
+        f"SELECT {ACTIVITY_COLUMNS} FROM activities_partitioned"
+    )
+    # Drops every attached partition with it
+    op.execute("DROP TABLE activities_partitioned")
+    enable_rls()
@@ -0,0 +1,91 @@
+"""composite_indexes_for_query_shapes
+
+Revision ID: d49664bbb0bd
+Revises: c3cc21ca034c
+Create Date: 2026-10-17 12:31:17.052948
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd49664bbb0bd'
+down_revision: Union[str, Sequence[str], None] = 'c3cc21ca034c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# name -> (table, definition); each matches a route's filter + ORDER BY
+NEW_INDEXES = {
+    'ix_tasks_user_id_position': ('tasks', "(user_id, position, created_at DESC, id DESC)"),
+    'ix_tasks_user_id_status': ('tasks', "(user_id, status, position, created_at DESC, id DESC)"),
+    'ix_notes_user_id_pinned': ('notes', "(user_id, is_pinned DESC, created_at DESC, id DESC)"),
+    'ix_posts_user_id_created_at': ('posts', "(user_id, created_at DESC, id DESC)"),
+    'ix_posts_user_id_published': ('posts', "(user_id, created_at DESC, id DESC) WHERE is_published"),
+    'ix_tags_user_id_name': ('tags', "(user_id, name)"),
+    'ix_task_tags_tag_id': ('task_tags', "(tag_id)"),
+    'ix_note_tags_tag_id': ('note_tags', "(tag_id)"),
+    'ix_post_tags_tag_id': ('post_tags', "(tag_id)"),
+}
+
+# Covered by a composite above, or too unselective to be worth maintaining
+DROPPED_INDEXES = {
+    'ix_tasks_user_id': ('tasks', "(user_id)"),
+    'ix_tasks_status': ('tasks', "(status)"),
+    'ix_tasks_priority': ('tasks', "(priority)"),
+    'ix_notes_user_id': ('notes', "(user_id)"),
+    'ix_notes_is_pinned': ('notes', "(is_pinned)"),
+    'ix_posts_user_id': ('posts', "(user_id)"),
+    'ix_posts_is_published': ('posts', "(is_published)"),
+    'ix_tags_user_id': ('tags', "(user_id)"),
+}
+
+# activities is partitioned; CONCURRENTLY has to go partition by partition
+ACTIVITY_INDEX = ('ix_activities_user_id_entity_type', "(user_id, entity_type, created_at)")
+ACTIVITY_DROPPED_INDEX = ('ix_activities_created_at', "(created_at)")
+
+
+def activity_partitions() -> list:
+    result = op.get_bind().execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'activities' ORDER BY c.relname"
+    ))
+    return [name for (name,) in result]
+
+
+def create_partitioned_index(name: str, definition: str) -> None:
+    """Build an index on every activities partition without blocking writes, then attach them."""
+    op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY activities {definition}")
+    for partition in activity_partitions():
+        op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_{name[3:]} ON {partition} {definition}")
+        op.execute(f"ALTER INDEX {name} ATTACH PARTITION {partition}_{name[3:]}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, (table, definition) in NEW_INDEXES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}")
+        create_partitioned_index(*ACTIVITY_INDEX)
+
+        for name in DROPPED_INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        # Partitioned indexes can't be dropped concurrently
+        op.execute(f"DROP INDEX IF EXISTS {ACTIVITY_DROPPED_INDEX[0]}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, (table, definition) in DROPPED_INDEXES.items():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}")
+        create_partitioned_index(*ACTIVITY_DROPPED_INDEX)
+
+        for name in NEW_INDEXES:
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        op.execute(f"DROP INDEX IF EXISTS {ACTIVITY_INDEX[0]}")
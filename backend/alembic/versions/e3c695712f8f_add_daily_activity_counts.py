@@ -0,0 +1,51 @@
+"""add_daily_activity_counts
+
+Revision ID: e3c695712f8f
+Revises: b39c021da3c1
+Create Date: 2026-10-17 10:03:27.551904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3c695712f8f'
+down_revision: Union[str, Sequence[str], None] = 'b39c021da3c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('daily_activity_counts',
+    sa.Column('user_id', sa.String(length=36), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('entity_type', sa.String(length=20), nullable=False),
+    sa.Column('action', sa.String(length=50), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False, server_default='0'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'day', 'entity_type', 'action')
+    )
+
+    op.execute("ALTER TABLE daily_activity_counts ENABLE ROW LEVEL SECURITY")
+    op.execute(
+        "CREATE POLICY \"Users can manage their own daily_activity_counts\" ON daily_activity_counts FOR ALL "
+        "USING (auth.uid()::text = user_id) WITH CHECK (auth.uid()::text = user_id)"
+    )
+
+    # Backfill from the existing activity log, bucketed by UTC day
+    op.execute(
+        "INSERT INTO daily_activity_counts (user_id, day, entity_type, action, count) "
+        "SELECT user_id, (created_at AT TIME ZONE 'UTC')::date, entity_type, action, count(*) "
+        "FROM activities WHERE created_at IS NOT NULL "
+        "GROUP BY 1, 2, 3, 4"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP POLICY IF EXISTS \"Users can manage their own daily_activity_counts\" ON daily_activity_counts")
+    op.drop_table('daily_activity_counts')
@@ -1,12 +1,15 @@
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.orm import make_transient_to_detached
+from cache import Cache
 from database import get_db
 from models import User
 from schemas import TokenData
@@ -18,22 +21,86 @@ if not SECRET_KEY:
 ALGORITHM = os.environ.get('ALGORITHM', 'HS256')
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get('ACCESS_TOKEN_EXPIRE_MINUTES', 1440))
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Principal cache — avoids a users SELECT on every authenticated request
+PRINCIPAL_CACHE_TTL = float(os.environ.get('PRINCIPAL_CACHE_TTL', 60))
+PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', 1024))
 
-# Bearer token scheme
-security = HTTPBearer()
+# Claims-only mode: routes that only need the user id trust the JWT `sub`
+# claim and skip the users table entirely (deleted users keep access until
+# their token expires).
+AUTH_CLAIMS_ONLY = os.environ.get('AUTH_CLAIMS_ONLY', '').lower() in ('1', 'true', 'yes')
+
+_principal_cache = Cache("principal", maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+# Columns kept in the cached snapshot, which may live in the shared cache tier;
+# password_hash is deliberately left out (login reads it from the database)
+_USER_COLUMNS = ["id", "email", "full_name", "bio", "avatar_url", "email_verified", "created_at", "updated_at"]
+
+# Password hash policy: new hashes use the first scheme; hashes in the others
+# (or with outdated parameters) still verify and are rehashed on next login
+PASSWORD_SCHEMES = [x.strip() for x in os.environ.get('PASSWORD_SCHEMES', 'argon2,bcrypt').split(',') if x.strip()]
+ARGON2_TIME_COST = int(os.environ.get('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST = int(os.environ.get('ARGON2_MEMORY_COST', 19456))  # KiB
+ARGON2_PARALLELISM = int(os.environ.get('ARGON2_PARALLELISM', 1))
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+
+# Hashing runs on a thread pool (bcrypt and argon2 release the GIL) so it never
+# blocks the event loop; at most PASSWORD_HASH_WORKERS run at once and callers
+# waiting longer than PASSWORD_HASH_QUEUE_TIMEOUT seconds get a 503
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 5))
+
+_hash_slots = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+
+# passlib and jose are imported on first use so that requests which never
+# hash or sign don't pay for them at cold start
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(
+        schemes=PASSWORD_SCHEMES,
+        deprecated="auto",
+        argon2__time_cost=ARGON2_TIME_COST,
+        argon2__memory_cost=ARGON2_MEMORY_COST,
+        argon2__parallelism=ARGON2_PARALLELISM,
+        bcrypt__rounds=BCRYPT_ROUNDS,
+    )
+
+@lru_cache(maxsize=None)
+def _hash_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+async def _run_hashing(fn, *args):
+    try:
+        await asyncio.wait_for(_hash_slots.acquire(), PASSWORD_HASH_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sign-ins in progress, please retry",
+            headers={"Retry-After": "1"},
+        )
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor(), fn, *args)
+    finally:
+        _hash_slots.release()
+
+async def hash_password(password: str) -> str:
+    """Hash a password off the event loop with the current policy."""
+    return await _run_hashing(get_pwd_context().hash, password)
 
-def get_password_hash(password: str) -> str:
-    """Hash a password."""
-    return pwd_context.hash(password)
+async def verify_and_update_password(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password off the event loop.
+
+    Returns (valid, new_hash); new_hash is set when the stored hash uses a
+    deprecated scheme or outdated parameters and should replace it.
+    """
+    return await _run_hashing(get_pwd_context().verify_and_update, password, hashed_password)
+
+# Bearer token scheme
+security = HTTPBearer()
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
+    from jose import jwt
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
@@ -43,28 +110,68 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db)
-) -> User:
-    """Get the current authenticated user from JWT token."""
-    credentials_exception = HTTPException(
+class Principal:
+    """Authenticated identity taken from the token claims alone."""
+    __slots__ = ("id",)
+
+    def __init__(self, id: str):
+        self.id = id
+
+async def invalidate_cached_user(user_id: str) -> None:
+    """Drop a user from the principal cache (on every worker) after their row changes."""
+    await _principal_cache.delete(user_id)
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def decode_token(token: str) -> TokenData:
+    """Decode a JWT access token, raising 401 if it is invalid."""
+    from jose import JWTError, jwt
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
-            raise credentials_exception
-        token_data = TokenData(user_id=user_id)
+            raise _credentials_exception()
+        return TokenData(user_id=user_id)
     except JWTError:
-        raise credentials_exception
+        raise _credentials_exception()
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """Get the current authenticated user from JWT token."""
+    token_data = decode_token(credentials.credentials)
+    
+    snapshot = await _principal_cache.get(token_data.user_id)
+    if snapshot is not None:
+        # Rebuild a detached instance from the cached column values and attach
+        # it to this request's session, so routes can still modify and commit it.
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        db.add(user)
+        return user
     
     result = await db.execute(select(User).where(User.id == token_data.user_id))
     user = result.scalar_one_or_none()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    await _principal_cache.set(user.id, {key: getattr(user, key) for key in _USER_COLUMNS})
     return user
+
+async def get_current_principal(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the caller's identity for routes that only need `current_user.id`.
+
+    Returns a `Principal` straight from the token in claims-only mode,
+    otherwise the (cached) `User`.
+    """
+    if AUTH_CLAIMS_ONLY:
+        return Principal(decode_token(credentials.credentials).user_id)
+    return await get_current_user(credentials, db)
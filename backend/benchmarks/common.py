@@ -0,0 +1,116 @@
+"""Shared seeding and timing utilities for the benchmark scripts.
+
+Benchmarks run against the database in DATABASE_URL (point it at a local,
+disposable Postgres) and clean up the user they seed.
+"""
+import os
+import sys
+import time
+import random
+import statistics
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+# Make the backend modules importable when run as `python benchmarks/<name>.py`
+sys.path.insert(0, str(Path(__file__).parent.parent))
+os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+
+from fastapi import Request
+from sqlalchemy import delete, insert
+
+from database import engine
+from models import User, Task, Note, Post, Tag, Activity, task_tags, note_tags, post_tags, generate_uuid
+from partitions import ensure_partitions
+from ranking import sequential_ranks
+
+
+async def seed_user(db, tasks: int = 1000, notes: int = 1000, posts: int = 200, tags: int = 20) -> str:
+    """Insert a throwaway user with the given number of rows and return its id."""
+    user_id = generate_uuid()
+    now = datetime.now(timezone.utc)
+    await db.execute(insert(User).values(
+        id=user_id, email=f"bench-{user_id}@example.com", password_hash="x",
+        full_name="Benchmark User", created_at=now, updated_at=now,
+    ))
+
+    tag_ids = [generate_uuid() for _ in range(tags)]
+    if tag_ids:
+        await db.execute(insert(Tag), [
+            {"id": tid, "user_id": user_id, "name": f"tag-{i}", "color": "default", "created_at": now}
+            for i, tid in enumerate(tag_ids)
+        ])
+
+    async def bulk(model, assoc, fk, count, make_row):
+        ids = [generate_uuid() for _ in range(count)]
+        if not ids:
+            return
+        await db.execute(insert(model), [make_row(i, rid) for i, rid in enumerate(ids)])
+        if tag_ids:
+            await db.execute(insert(assoc), [
+                {fk: rid, "tag_id": tid} for rid in ids for tid in random.sample(tag_ids, min(2, len(tag_ids)))
+            ])
+
+    def stamp(i):
+        return now - timedelta(minutes=i)
+
+    ranks = sequential_ranks(tasks)
+    await bulk(Task, task_tags, "task_id", tasks, lambda i, rid: {
+        "id": rid, "user_id": user_id, "title": f"Task {i}", "description": "Lorem ipsum " * 10,
+        "status": random.choice(["todo", "in_progress", "completed"]),
+        "priority": random.choice(["low", "medium", "high"]),
+        "rank": ranks[i], "created_at": stamp(i), "updated_at": stamp(i),
+    })
+    await bulk(Note, note_tags, "note_id", notes, lambda i, rid: {
+        "id": rid, "user_id": user_id, "title": f"Note {i}", "content": "Lorem ipsum " * 50,
+        "color": random.choice(["default", "blue", "green", "yellow"]),
+        "is_pinned": i % 10 == 0, "created_at": stamp(i), "updated_at": stamp(i),
+    })
+    await bulk(Post, post_tags, "post_id", posts, lambda i, rid: {
+        "id": rid, "user_id": user_id, "title": f"Post {i}", "content": "Lorem ipsum " * 50,
+        "is_published": i % 2 == 0, "published_at": stamp(i) if i % 2 == 0 else None,
+        "created_at": stamp(i), "updated_at": stamp(i),
+    })
+    activity_count = tasks + notes + posts
+    # Seeded activities reach back further than the partitions the app keeps ready
+    async with engine.connect() as conn:
+        await ensure_partitions(conn, since=(now - timedelta(hours=activity_count)).date())
+    await db.execute(insert(Activity), [
+        {"id": generate_uuid(), "user_id": user_id, "action": random.choice(["created", "updated", "completed"]),
+         "entity_type": random.choice(["task", "note", "post"]), "created_at": now - timedelta(hours=i)}
+        for i in range(activity_count)
+    ])
+    await db.commit()
+    return user_id
+
+
+async def drop_user(db, user_id: str) -> None:
+    """Remove a seeded user; row deletes cascade through the foreign keys."""
+    await db.execute(delete(User).where(User.id == user_id))
+    await db.commit()
+
+
+def make_request(path: str, headers: dict = None) -> Request:
+    """A bare GET request for calling route handlers directly."""
+    return Request({
+        "type": "http", "method": "GET", "path": path, "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    })
+
+
+async def measure(fn, iterations: int = 200, warmup: int = 10) -> list:
+    """Await fn() repeatedly and return per-call latencies in milliseconds."""
+    for _ in range(warmup):
+        await fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(label: str, samples: list) -> str:
+    """Format p50/p99 latency for a list of millisecond samples."""
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return f"{label:<32} p50={statistics.median(ordered):8.3f}ms  p99={p99:8.3f}ms  n={len(ordered)}"
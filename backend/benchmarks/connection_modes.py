@@ -0,0 +1,67 @@
+"""Compare hot list query latency under each connection mode's statement caching.
+
+Runs the task, note and post list queries on a single connection built with
+database.build_connect_args() for each mode. Only the statement caching
+differs between the modes, so pointing every mode at the same database
+isolates the parse/plan cost that the transaction-pooler settings pay on
+every execution. Pass a pooler URL in POOLER_URL to time the transaction mode
+through a real pooler as well.
+
+Usage (from backend/, against a local Postgres migrated to head):
+    DATABASE_URL=postgresql://localhost/flow_bench python benchmarks/connection_modes.py
+"""
+import asyncio
+import os
+
+from common import seed_user, drop_user, measure, summarize
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+from database import AsyncSessionLocal, ASYNC_DATABASE_URL, CONNECTION_MODES, build_connect_args
+from models import Task, Note, Post
+
+
+def hot_queries(user_id: str):
+    """First pages of the list routes, in the shape the routes send them."""
+    return [
+        ("tasks", select(Task).where(Task.user_id == user_id)
+            .order_by(Task.rank, Task.created_at.desc(), Task.id.desc()).limit(20)),
+        ("tasks?status", select(Task).where(Task.user_id == user_id, Task.status == "todo")
+            .order_by(Task.rank, Task.created_at.desc(), Task.id.desc()).limit(20)),
+        ("notes", select(Note).where(Note.user_id == user_id)
+            .order_by(Note.is_pinned.desc(), Note.created_at.desc(), Note.id.desc()).limit(20)),
+        ("posts", select(Post).where(Post.user_id == user_id)
+            .order_by(Post.created_at.desc(), Post.id.desc()).limit(20)),
+    ]
+
+
+async def bench_mode(mode: str, url: str, user_id: str, name: str = None) -> None:
+    # NullPool + one session: every sample runs on the same connection, like a warm worker
+    engine = create_async_engine(url, poolclass=NullPool, connect_args=build_connect_args(mode))
+    try:
+        async with AsyncSession(engine) as db:
+            for label, query in hot_queries(user_id):
+                async def run():
+                    (await db.execute(query)).scalars().all()
+                print(summarize(f"{name or mode}: {label}", await measure(run, iterations=500)))
+    finally:
+        await engine.dispose()
+
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        user_id = await seed_user(db)
+        try:
+            for mode in CONNECTION_MODES:
+                await bench_mode(mode, ASYNC_DATABASE_URL, user_id)
+            pooler_url = os.environ.get('POOLER_URL')
+            if pooler_url:
+                url = pooler_url.replace('postgresql://', 'postgresql+asyncpg://')
+                await bench_mode("transaction", url, user_id, name="pooler")
+        finally:
+            await drop_user(db, user_id)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
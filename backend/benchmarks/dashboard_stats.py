@@ -0,0 +1,112 @@
+"""Compare /dashboard/stats latency across aggregation strategies and the cache.
+
+Usage (from backend/, against a local Postgres):
+    DATABASE_URL=postgresql://localhost/flow_bench python benchmarks/dashboard_stats.py
+"""
+import asyncio
+
+from common import seed_user, drop_user, make_request, measure, summarize
+
+from fastapi import Response
+from sqlalchemy import select, func, true
+from database import AsyncSessionLocal
+from models import Task, Note, Post, Tag
+from auth import Principal
+from cache import dashboard_cache, invalidate_user_caches
+from stats import get_user_stats, check_user_stats
+from routes.data import get_dashboard_stats
+
+
+async def legacy_stats(db, user_id):
+    """The previous implementation: one awaited query per entity type."""
+    await db.execute(select(
+        func.count(Task.id),
+        func.count(Task.id).filter(Task.status == "completed"),
+        func.count(Task.id).filter(Task.status == "in_progress"),
+    ).where(Task.user_id == user_id))
+    await db.execute(select(
+        func.count(Note.id),
+        func.count(Note.id).filter(Note.is_pinned == True),
+    ).where(Note.user_id == user_id))
+    await db.execute(select(
+        func.count(Post.id),
+        func.count(Post.id).filter(Post.is_published == True),
+    ).where(Post.user_id == user_id))
+    await db.execute(select(func.count(Tag.id)).where(Tag.user_id == user_id))
+
+
+def dashboard_stats_query(user_id: str):
+    """Build a single SELECT returning every dashboard counter for a user."""
+    task_stats = select(
+        func.count(Task.id).label("total"),
+        func.count(Task.id).filter(Task.status == "completed").label("completed"),
+        func.count(Task.id).filter(Task.status == "in_progress").label("in_progress"),
+    ).where(Task.user_id == user_id).subquery()
+    
+    note_stats = select(
+        func.count(Note.id).label("total"),
+        func.count(Note.id).filter(Note.is_pinned == True).label("pinned"),
+    ).where(Note.user_id == user_id).subquery()
+    
+    post_stats = select(
+        func.count(Post.id).label("total"),
+        func.count(Post.id).filter(Post.is_published == True).label("published"),
+    ).where(Post.user_id == user_id).subquery()
+    
+    tag_stats = select(
+        func.count(Tag.id).label("total"),
+    ).where(Tag.user_id == user_id).subquery()
+    
+    # Each aggregate yields exactly one row, so the joins are 1x1x1x1
+    return select(
+        task_stats.c.total, task_stats.c.completed, task_stats.c.in_progress,
+        note_stats.c.total, note_stats.c.pinned,
+        post_stats.c.total, post_stats.c.published,
+        tag_stats.c.total,
+    ).select_from(
+        task_stats
+        .join(note_stats, true())
+        .join(post_stats, true())
+        .join(tag_stats, true())
+    )
+
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        user_id = await seed_user(db)
+        # Seeding bypasses the routes, so build the user's rollup rows directly
+        await check_user_stats(db, user_id, repair=True)
+        principal = Principal(user_id)
+        try:
+            results = [
+                ("before: 4 sequential queries", await measure(lambda: legacy_stats(db, user_id))),
+                ("single aggregate query", await measure(lambda: db.execute(dashboard_stats_query(user_id)))),
+                ("after: user_stats rollup read", await measure(lambda: get_user_stats(db, user_id))),
+            ]
+
+            def route_call(headers=None):
+                return get_dashboard_stats(make_request("/api/dashboard/stats", headers), Response(),
+                                           current_user=principal, db=db)
+
+            async def cache_miss():
+                await invalidate_user_caches(user_id)
+                await route_call()
+
+            results.append(("after: route, cache miss", await measure(cache_miss)))
+            results.append(("after: route, cache hit", await measure(route_call)))
+
+            response = Response()
+            await get_dashboard_stats(make_request("/api/dashboard/stats"), response,
+                                      current_user=principal, db=db)
+            etag = response.headers["ETag"]
+            # Revalidation reads the versions either way, so the cache doesn't matter here
+            results.append(("after: 304", await measure(lambda: route_call({"If-None-Match": etag}))))
+            for label, samples in results:
+                print(summarize(label, samples))
+        finally:
+            dashboard_cache.clear()
+            await drop_user(db, user_id)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
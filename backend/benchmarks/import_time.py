@@ -0,0 +1,94 @@
+"""Check serverless cold-start import time against a budget.
+
+Imports `server` in fresh interpreters with `-X importtime`, the way a cold
+Vercel instance does (VERCEL=1, so fast startup mode is on), and prints the
+slowest top-level modules from the median run. Exits non-zero when the
+median total exceeds the budget, or when openapi.json, which fast startup
+serves instead of generating the schema, no longer matches the routes.
+
+Usage (from backend/; no database needed):
+    python benchmarks/import_time.py [--budget-ms 700] [--runs 7] [--top 15]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent
+DEFAULT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 700))
+
+
+def cold_env() -> dict:
+    env = dict(os.environ, VERCEL="1")
+    env.pop("FAST_STARTUP", None)
+    # Imports must not need real credentials; nothing connects at import time
+    env.setdefault("SECRET_KEY", "import-time-check")
+    env.setdefault("DATABASE_URL", "postgresql://localhost/import_time_check")
+    return env
+
+
+def import_times() -> dict:
+    """{module: (self_us, cumulative_us, depth)} for one fresh `import server`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, env=cold_env(), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"import server failed:\n{result.stderr[-2000:]}")
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return modules
+
+
+def check_openapi() -> bool:
+    sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.update({k: v for k, v in cold_env().items() if k in ("SECRET_KEY", "DATABASE_URL")})
+    import server
+    return server.generate_openapi() == json.loads(server.OPENAPI_PATH.read_text())
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    import_times()  # warm the bytecode cache so runs measure imports, not compilation
+    runs = [import_times() for _ in range(args.runs)]
+    totals = [run["server"][1] / 1000 for run in runs]
+    median_ms = statistics.median(totals)
+    run = runs[totals.index(sorted(totals)[len(totals) // 2])]
+
+    # Output is post-order: server's direct imports are the depth-1 lines just before it
+    names = list(run)
+    end = names.index("server")
+    start = max((i for i in range(end) if run[names[i]][2] == 0), default=-1) + 1
+    children = sorted(names[start:end], key=lambda name: -run[name][1])
+    print(f"{'module':<40} {'self ms':>9} {'cumulative ms':>14}")
+    for name in ["server"] + [n for n in children if run[n][2] == 1][:args.top]:
+        self_us, cumulative_us, depth = run[name]
+        print(f"{'  ' * depth + name:<40} {self_us / 1000:>9.1f} {cumulative_us / 1000:>14.1f}")
+
+    failed = False
+    print(f"\nimport server: median {median_ms:.0f}ms over {args.runs} runs "
+          f"(min {min(totals):.0f}ms, max {max(totals):.0f}ms), budget {args.budget_ms:.0f}ms")
+    if median_ms > args.budget_ms:
+        print("FAIL cold-start import time is over budget")
+        failed = True
+    if not check_openapi():
+        print("FAIL openapi.json is stale; run `python server.py --write-openapi`")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Compare the ORM list read path with read_rows' Core-row DTOs.
+
+For pages of 100 and 10,000 tasks (with tags) it reports per-request latency,
+rows/sec, and peak Python memory allocated while loading one page in a fresh
+session, which is what a request pays for its identity map and instances.
+
+Usage (from backend/, against a local Postgres migrated to head):
+    DATABASE_URL=postgresql://localhost/flow_bench python benchmarks/list_read_path.py
+"""
+import asyncio
+import statistics
+import tracemalloc
+
+from common import seed_user, drop_user, measure, summarize
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from database import AsyncSessionLocal
+from models import Task, task_tags
+from read_rows import TaskRow, select_rows, to_dtos_with_tags
+
+ORDER = (Task.rank, Task.created_at.desc(), Task.id.desc())
+
+
+async def orm_page(user_id: str, limit: int) -> list:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Task).options(selectinload(Task.tags)).where(Task.user_id == user_id).order_by(*ORDER).limit(limit)
+        )
+        return result.scalars().all()
+
+
+async def row_page(user_id: str, limit: int) -> list:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select_rows(Task, TaskRow).where(Task.user_id == user_id).order_by(*ORDER).limit(limit))
+        return await to_dtos_with_tags(db, result.all(), TaskRow, task_tags.c.task_id)
+
+
+async def peak_memory_kib(fn) -> float:
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        page = await fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del page
+    return peak / 1024
+
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        user_id = await seed_user(db, tasks=10000, notes=0, posts=0)
+    try:
+        for limit in (100, 10000):
+            iterations = 200 if limit == 100 else 10
+            for label, page in (("ORM + selectinload", orm_page), ("Core rows + DTOs", row_page)):
+                def fn():
+                    return page(user_id, limit)
+                samples = await measure(fn, iterations=iterations, warmup=2)
+                rows_per_sec = limit / (statistics.mean(samples) / 1000)
+                memory = await peak_memory_kib(fn)
+                print(f"{summarize(f'{limit} rows, {label}', samples)}  "
+                      f"{rows_per_sec:>10,.0f} rows/s  peak {memory:>9,.0f} KiB")
+    finally:
+        async with AsyncSessionLocal() as db:
+            await drop_user(db, user_id)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""Time serializing a page of 100 tasks, the old way and through serialization.py.
+
+"before" is what FastAPI does with a list route's ORM rows: validate each one
+into TaskResponse (from_attributes, nested tags included), dump to JSON-able
+data and encode with the stdlib json. "after" is list_response's path: dicts
+built from the rows, encoded with orjson (or MessagePack). Checks that both
+JSON bodies decode to the same data. Runs on in-memory rows; no database needed.
+
+Usage (from backend/):
+    python benchmarks/list_serialization.py
+"""
+import json
+import os
+import timeit
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+os.environ.setdefault('DATABASE_URL', 'postgresql://localhost/flow_bench')
+
+from common import summarize
+
+from pydantic import TypeAdapter
+from models import Task, Tag, generate_uuid
+from ranking import sequential_ranks
+from schemas import TaskResponse
+from serialization import task_row, dumps_json, dumps_msgpack, msgpack, orjson
+
+PAGE_SIZE = 100
+
+
+def make_page() -> list:
+    now = datetime.now(timezone.utc)
+    tags = [Tag(id=generate_uuid(), user_id="u", name=f"tag-{i}", color="default", created_at=now) for i in range(5)]
+    ranks = sequential_ranks(PAGE_SIZE)
+    return [
+        Task(
+            id=generate_uuid(), user_id="u", title=f"Task {i}", description="Lorem ipsum " * 10,
+            status="todo", priority="medium", due_date=now + timedelta(days=i) if i % 3 else None,
+            rank=ranks[i], tags=tags[i % 4:i % 4 + 2], created_at=now - timedelta(minutes=i), updated_at=now,
+        )
+        for i in range(PAGE_SIZE)
+    ]
+
+
+def main():
+    items = make_page()
+    adapter = TypeAdapter(List[TaskResponse])
+
+    def before() -> bytes:
+        content = adapter.dump_python(adapter.validate_python(items, from_attributes=True), mode="json")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    def after_json() -> bytes:
+        return dumps_json([task_row(item) for item in items])
+
+    def after_msgpack() -> bytes:
+        return dumps_msgpack([task_row(item) for item in items])
+
+    assert json.loads(before()) == json.loads(after_json()), "fast path output differs from TaskResponse"
+
+    cases = [("before: TaskResponse + json", before),
+             (f"after: rows + {'orjson' if orjson else 'json'}", after_json)]
+    if msgpack is not None:
+        cases.append(("after: rows + msgpack", after_msgpack))
+    print(f"serializing {PAGE_SIZE} tasks with 2 tags each")
+    for label, fn in cases:
+        fn()
+        samples = [t * 1000 for t in timeit.repeat(fn, number=1, repeat=500)]
+        print(f"{summarize(label, samples)}  {len(fn())} bytes")
+
+
+if __name__ == "__main__":
+    main()
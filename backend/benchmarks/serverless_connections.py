@@ -0,0 +1,80 @@
+"""Compare serverless invocation latency with and without warm connection reuse.
+
+Simulates invocation sequences the way a serverless instance sees them:
+
+- cold: a fresh engine per invocation (a new instance, or NullPool)
+- warm: back-to-back invocations on one engine, reusing its pooled connection
+- warm after idle: invocations spaced past the ping threshold, so each reuse
+  is validated with a SELECT 1 first
+
+Each invocation opens a session, runs the first page of GET /tasks and
+closes it. Set DATABASE_URL to a pooler URL to include the pooler's
+handshake in the cold numbers.
+
+Usage (from backend/, against a local Postgres migrated to head):
+    DATABASE_URL=postgresql://localhost/flow_bench python benchmarks/serverless_connections.py
+"""
+import asyncio
+import os
+import time
+
+# Short ping threshold so the idle case doesn't need multi-second gaps
+os.environ.setdefault('DB_SERVERLESS_PING_AFTER', '0.2')
+IDLE_GAP = 0.3
+
+from common import seed_user, drop_user, summarize
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal, DATABASE_URL, create_engine_for
+from models import Task
+
+
+async def invocation(engine, user_id: str) -> float:
+    """One request's worth of database work; returns its latency in milliseconds."""
+    start = time.perf_counter()
+    async with AsyncSession(engine) as db:
+        (await db.execute(
+            select(Task).where(Task.user_id == user_id)
+            .order_by(Task.rank, Task.created_at.desc(), Task.id.desc()).limit(20)
+        )).scalars().all()
+    return (time.perf_counter() - start) * 1000
+
+
+async def cold(user_id: str, n: int, pool_size: int) -> list:
+    samples = []
+    for _ in range(n):
+        engine = create_engine_for(DATABASE_URL, "benchmark-cold", serverless=True, serverless_pool_size=pool_size)
+        samples.append(await invocation(engine, user_id))
+        await engine.dispose()
+    return samples
+
+
+async def warm(user_id: str, n: int, gap: float = 0.0) -> list:
+    engine = create_engine_for(DATABASE_URL, "benchmark-warm", serverless=True, serverless_pool_size=1)
+    try:
+        await invocation(engine, user_id)  # the cold start that opens the connection
+        samples = []
+        for _ in range(n):
+            await asyncio.sleep(gap)
+            samples.append(await invocation(engine, user_id))
+        return samples
+    finally:
+        await engine.dispose()
+
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        user_id = await seed_user(db, notes=0, posts=0)
+    try:
+        print(summarize("NullPool (every invocation)", await cold(user_id, 50, pool_size=0)))
+        print(summarize("warm pool: cold invocation", await cold(user_id, 50, pool_size=1)))
+        print(summarize("warm pool: warm invocation", await warm(user_id, 200)))
+        print(summarize(f"warm pool: after {IDLE_GAP}s idle", await warm(user_id, 50, gap=IDLE_GAP)))
+    finally:
+        async with AsyncSessionLocal() as db:
+            await drop_user(db, user_id)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
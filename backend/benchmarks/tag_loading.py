@@ -0,0 +1,71 @@
+"""Compare ways of loading a list page's tags.
+
+- selectinload: ORM entities, tags in a second SELECT ... WHERE id IN (...)
+- batch: read_rows DTOs, tags in a second query through task_tags
+- lateral: read_rows DTOs, tags aggregated with json_agg in the page query
+
+Each page is fetched through paginate with an exact count, as GET /tasks does,
+and the report includes the round trips each strategy makes per page.
+
+Usage (from backend/, against a local Postgres migrated to head):
+    DATABASE_URL=postgresql://localhost/flow_bench python benchmarks/tag_loading.py
+"""
+import asyncio
+
+from common import seed_user, drop_user, measure, summarize
+
+from fastapi import Response
+from sqlalchemy import event, select
+from sqlalchemy.orm import selectinload
+from database import AsyncSessionLocal, engine
+from helpers import paginate
+from models import Task, task_tags
+from read_rows import TaskRow, select_rows, tag_list_join, to_dtos_with_tags
+from routes.tasks import TASK_SORT_KEYS
+
+statements = 0
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def count_statement(*args):
+    global statements
+    statements += 1
+
+
+async def selectinload_page(user_id: str, limit: int) -> list:
+    async with AsyncSessionLocal() as db:
+        query = select(Task).options(selectinload(Task.tags)).where(Task.user_id == user_id)
+        return await paginate(db, Response(), query, TASK_SORT_KEYS, limit)
+
+
+def row_page(strategy: str):
+    async def page(user_id: str, limit: int) -> list:
+        async with AsyncSessionLocal() as db:
+            query = select_rows(Task, TaskRow).where(Task.user_id == user_id)
+            rows = await paginate(db, Response(), query, TASK_SORT_KEYS, limit, rows=True,
+                                  page_query=tag_list_join(task_tags.c.task_id, strategy))
+            return await to_dtos_with_tags(db, rows, TaskRow, task_tags.c.task_id, strategy)
+    return page
+
+
+async def main():
+    global statements
+    async with AsyncSessionLocal() as db:
+        user_id = await seed_user(db, tasks=2000, notes=0, posts=0)
+    try:
+        for limit in (20, 100):
+            for label, page in (("selectinload", selectinload_page),
+                                ("batch", row_page("batch")),
+                                ("lateral", row_page("lateral"))):
+                statements = 0
+                await page(user_id, limit)
+                round_trips = statements
+                samples = await measure(lambda: page(user_id, limit))
+                print(f"{summarize(f'{limit} rows, {label}', samples)}  {round_trips} round trips")
+    finally:
+        async with AsyncSessionLocal() as db:
+            await drop_user(db, user_id)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""Compare a drag-and-drop with POST /tasks/reorder and POST /tasks/{id}/move.
+
+Seeds a user with 2,000 tasks and moves one task from the bottom of the list
+to the middle each way: reorder sends and rewrites every listed task, move
+sends the two neighbours and rewrites one row. Also reports how long the
+rank key gets when the same spot is hit repeatedly before a rebalance.
+
+Usage (from backend/, against a local Postgres migrated to head):
+    DATABASE_URL=postgresql://localhost/flow_bench python benchmarks/task_reorder.py
+"""
+import asyncio
+
+from common import seed_user, drop_user, measure, summarize
+
+from sqlalchemy import select
+from auth import Principal
+from database import AsyncSessionLocal
+from models import Task
+from ranking import rank_between, rebalance_ranks
+from routes.tasks import move_task, reorder_tasks, TASK_SORT_KEYS
+from schemas import TaskMove, TaskReorder
+
+TASKS = 2000
+
+
+async def ordered_ids(db, user_id: str) -> list:
+    result = await db.execute(
+        select(Task.id).where(Task.user_id == user_id)
+        .order_by(*[col.desc() if descending else col for col, descending in TASK_SORT_KEYS])
+    )
+    return result.scalars().all()
+
+
+async def main():
+    async with AsyncSessionLocal() as db:
+        user_id = await seed_user(db, tasks=TASKS, notes=0, posts=0)
+    principal = Principal(user_id)
+    try:
+        async def reorder():
+            async with AsyncSessionLocal() as db:
+                ids = await ordered_ids(db, user_id)
+                ids.insert(TASKS // 2, ids.pop())
+                await reorder_tasks(TaskReorder(task_ids=ids), current_user=principal, db=db)
+
+        async def move():
+            async with AsyncSessionLocal() as db:
+                ids = await ordered_ids(db, user_id)
+                move_data = TaskMove(before_id=ids[TASKS // 2 - 1], after_id=ids[TASKS // 2])
+                await move_task(ids[-1], move_data, current_user=principal, db=db)
+
+        print(summarize(f"reorder: {TASKS} ids, {TASKS} rows", await measure(reorder, iterations=50, warmup=2)))
+        await rebalance_ranks(user_id)
+        print(summarize("move: 2 neighbours, 1 row", await measure(move, iterations=50, warmup=2)))
+
+        # Worst case for key length: always insert right after the same task
+        before, after = "a0", "a1"
+        for n in range(1, 201):
+            after = rank_between(before, after)
+            if n in (10, 50, 100, 200):
+                print(f"{n:>4} inserts at one spot: key length {len(after)}")
+    finally:
+        async with AsyncSessionLocal() as db:
+            await drop_user(db, user_id)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,296 @@
+"""Caching shared across route modules.
+
+Each named `Cache` keeps an in-process LRU tier. When CACHE_URL points at a
+Redis-protocol server it also has a shared tier that every worker reads and
+writes. Entries can carry tags (e.g. "user:<id>") so everything derived from
+one user's data can be dropped at once. Deletes and tag invalidations are
+published on a channel so every worker drops its local copies too.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Hashable, Iterable, Iterator, Optional, Tuple
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # only needed when CACHE_URL is set
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_URL = os.environ.get('CACHE_URL')
+CACHE_PREFIX = os.environ.get('CACHE_PREFIX', 'flow')
+# Upper bound on how long a worker keeps a local copy of a shared entry, in
+# case an invalidation message is missed while the subscriber reconnects
+CACHE_LOCAL_TTL = float(os.environ.get('CACHE_LOCAL_TTL', 5))
+CACHE_TAG_TTL = 24 * 3600  # tag sets outlive any entry they point at
+INVALIDATION_CHANNEL = f"{CACHE_PREFIX}:cache:invalidate"
+
+_MISSING = object()
+_INSTANCE_ID = uuid.uuid4().hex
+
+
+class TTLCache:
+    """A small LRU cache whose entries also expire after a fixed TTL.
+
+    Not thread-safe; intended for use from the event loop of a single worker.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default if missing or expired."""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, evicting the least recently used entry when full."""
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        """Drop a single entry if present."""
+        self._data.pop(key, None)
+
+    def items(self) -> Iterator[Tuple[Hashable, Any]]:
+        """Snapshot of the unexpired (key, value) pairs."""
+        now = time.monotonic()
+        return iter([(key, value) for key, (expires_at, value) in self._data.items() if expires_at > now])
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# ==================== SHARED TIER ====================
+
+def _encode(obj):
+    if isinstance(obj, datetime):
+        return {"__datetime__": obj.isoformat()}
+    if isinstance(obj, date):
+        return {"__date__": obj.isoformat()}
+    raise TypeError(f"Cannot cache {type(obj).__name__}")
+
+
+def _decode(obj: dict):
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return date.fromisoformat(obj["__date__"])
+    return obj
+
+
+class RedisBackend:
+    """Shared storage on a Redis-protocol server; values are JSON with datetimes preserved."""
+
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("CACHE_URL is set but the redis package is not installed")
+        self.client = aioredis.from_url(url)
+
+    @staticmethod
+    def _key(namespace: str, key: str) -> str:
+        return f"{CACHE_PREFIX}:cache:{namespace}:{key}"
+
+    @staticmethod
+    def _tag_key(tag: str) -> str:
+        return f"{CACHE_PREFIX}:tag:{tag}"
+
+    async def get(self, namespace: str, key: str) -> Any:
+        raw = await self.client.get(self._key(namespace, key))
+        return _MISSING if raw is None else json.loads(raw, object_hook=_decode)
+
+    async def set(self, namespace: str, key: str, value: Any, ttl: float, tags: Iterable[str]) -> None:
+        full_key = self._key(namespace, key)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(full_key, json.dumps(value, default=_encode), px=int(ttl * 1000))
+            for tag in tags:
+                pipe.sadd(self._tag_key(tag), full_key)
+                pipe.expire(self._tag_key(tag), CACHE_TAG_TTL)
+            await pipe.execute()
+
+    async def delete(self, namespace: str, key: str) -> None:
+        await self.client.delete(self._key(namespace, key))
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        for tag in tags:
+            tag_key = self._tag_key(tag)
+            members = await self.client.smembers(tag_key)
+            await self.client.delete(*members, tag_key)
+
+    async def publish(self, message: dict) -> None:
+        await self.client.publish(INVALIDATION_CHANNEL, json.dumps({"origin": _INSTANCE_ID, **message}))
+
+    async def listen(self) -> None:
+        """Apply other workers' invalidations to local tiers until cancelled."""
+        while True:
+            try:
+                pubsub = self.client.pubsub()
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        _apply_remote_invalidation(json.loads(message["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Cache invalidation subscriber failed, reconnecting: {e}")
+                await asyncio.sleep(1)
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+_shared: Optional[RedisBackend] = RedisBackend(CACHE_URL) if CACHE_URL else None
+_listener: Optional[asyncio.Task] = None
+_caches: Dict[str, "Cache"] = {}
+
+
+def _ensure_listener() -> None:
+    global _listener
+    if _shared is not None and _listener is None:
+        _listener = asyncio.create_task(_shared.listen())
+
+
+async def _shared_call(coro, default: Any = None) -> Any:
+    """Run a shared-tier operation; Redis trouble degrades to the local tier, never to errors."""
+    try:
+        return await coro
+    except Exception as e:
+        logger.warning(f"Shared cache unavailable: {e}")
+        return default
+
+
+def _apply_remote_invalidation(message: dict) -> None:
+    if message.get("origin") == _INSTANCE_ID:
+        return
+    if message.get("tags"):
+        for cache in _caches.values():
+            cache.drop_local_tags(message["tags"])
+    cache = _caches.get(message.get("namespace"))
+    if cache is not None:
+        for key in message.get("keys", ()):
+            cache.local.delete(key)
+
+
+# ==================== CACHE ====================
+
+class Cache:
+    """A named cache with a local LRU tier and, when configured, a shared tier.
+
+    Keys are strings. Values must be JSON-serializable (datetimes allowed)
+    so they can live in the shared tier.
+    """
+
+    def __init__(self, namespace: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.namespace = namespace
+        self.ttl = ttl
+        # Local entries hold (value, tags) so tag invalidation works without the shared tier
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        _caches[namespace] = self
+
+    def _local_ttl(self, ttl: float) -> float:
+        return min(ttl, CACHE_LOCAL_TTL) if _shared is not None else ttl
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        entry = self.local.get(key, _MISSING)
+        if entry is not _MISSING:
+            return entry[0]
+        if _shared is None:
+            return default
+        _ensure_listener()
+        payload = await _shared_call(_shared.get(self.namespace, key), _MISSING)
+        if payload is _MISSING:
+            return default
+        value, tags = payload["value"], tuple(payload["tags"])
+        self.local.set(key, (value, tags), self._local_ttl(self.ttl))
+        return value
+
+    async def set(self, key: str, value: Any, tags: Iterable[str] = (), ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        tags = tuple(tags)
+        self.local.set(key, (value, tags), self._local_ttl(ttl))
+        if _shared is not None:
+            _ensure_listener()
+            await _shared_call(_shared.set(self.namespace, key, {"value": value, "tags": tags}, ttl, tags))
+
+    async def delete(self, key: str) -> None:
+        self.local.delete(key)
+        if _shared is not None:
+            await _shared_call(_shared.delete(self.namespace, key))
+            await _shared_call(_shared.publish({"namespace": self.namespace, "keys": [key]}))
+
+    def drop_local_tags(self, tags: Iterable[str]) -> None:
+        tags = set(tags)
+        for key, (_, entry_tags) in self.local.items():
+            if tags.intersection(entry_tags):
+                self.local.delete(key)
+
+    def clear(self) -> None:
+        """Drop this worker's local entries."""
+        self.local.clear()
+
+
+async def invalidate_tags(*tags: str) -> None:
+    """Drop every entry carrying any of the tags, in all caches and on all workers."""
+    for cache in _caches.values():
+        cache.drop_local_tags(tags)
+    if _shared is not None:
+        await _shared_call(_shared.invalidate_tags(tags))
+        await _shared_call(_shared.publish({"tags": list(tags)}))
+
+
+async def close_cache() -> None:
+    """Stop the invalidation subscriber and close the shared connection."""
+    global _listener
+    if _listener is not None:
+        _listener.cancel()
+        _listener = None
+    if _shared is not None:
+        await _shared.close()
+
+
+def user_tag(user_id: str) -> str:
+    """Tag for anything derived from a user's tasks, notes, posts or tags."""
+    return f"user:{user_id}"
+
+
+def activity_tag(user_id: str) -> str:
+    """Tag for anything derived from a user's activity log."""
+    return f"activities:{user_id}"
+
+
+# Per-user aggregates; dropped by any write that changes them
+DASHBOARD_CACHE_TTL = float(os.environ.get('DASHBOARD_CACHE_TTL', 30))
+DASHBOARD_CACHE_SIZE = int(os.environ.get('DASHBOARD_CACHE_SIZE', 1024))
+ANALYTICS_CACHE_TTL = float(os.environ.get('ANALYTICS_CACHE_TTL', 60))
+ANALYTICS_CACHE_SIZE = int(os.environ.get('ANALYTICS_CACHE_SIZE', 1024))
+
+dashboard_cache = Cache("dashboard", maxsize=DASHBOARD_CACHE_SIZE, ttl=DASHBOARD_CACHE_TTL)
+analytics_cache = Cache("analytics", maxsize=ANALYTICS_CACHE_SIZE, ttl=ANALYTICS_CACHE_TTL)
+
+
+async def invalidate_user_caches(user_id: str) -> None:
+    """Drop cached aggregates for a user after they write tasks, notes, posts or tags."""
+    await invalidate_tags(user_tag(user_id))
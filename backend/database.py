@@ -1,10 +1,16 @@
+import asyncio
 import os
 import ssl
+import time
+import uuid
 from pathlib import Path
+from urllib.parse import urlparse
 from dotenv import load_dotenv
+from sqlalchemy import event, exc
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.pool import NullPool
+from sqlalchemy.util import await_only
+from pool_metrics import InstrumentedNullPool, InstrumentedQueuePool, instrument_pool
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -18,37 +24,164 @@ ASYNC_DATABASE_URL = DATABASE_URL.replace('postgresql://', 'postgresql+asyncpg:/
 # Detect serverless environment (Vercel sets VERCEL=1)
 IS_SERVERLESS = bool(os.environ.get('VERCEL'))
 
+# Pool sizing, per worker process
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+# Serverless keeps a tiny pool alive across warm invocations of an instance
+# (0 falls back to a new connection per request). A connection idle for
+# DB_SERVERLESS_PING_AFTER seconds is pinged before reuse; one idle for
+# DB_SERVERLESS_IDLE_TIMEOUT is closed and replaced without trying it, since
+# the pooler has likely dropped it while the instance was frozen.
+DB_SERVERLESS_POOL_SIZE = int(os.environ.get('DB_SERVERLESS_POOL_SIZE', 1))
+DB_SERVERLESS_MAX_OVERFLOW = int(os.environ.get('DB_SERVERLESS_MAX_OVERFLOW', 2))
+DB_SERVERLESS_PING_AFTER = float(os.environ.get('DB_SERVERLESS_PING_AFTER', 5))
+DB_SERVERLESS_IDLE_TIMEOUT = float(os.environ.get('DB_SERVERLESS_IDLE_TIMEOUT', 60))
+DB_PING_TIMEOUT = float(os.environ.get('DB_PING_TIMEOUT', 2))
+
+# How connections reach Postgres:
+#   direct       — straight to the database
+#   session      — through a session-mode pooler (one server connection per client connection)
+#   transaction  — through a transaction-mode pooler (server connection can change per transaction)
+CONNECTION_MODES = ("direct", "session", "transaction")
+
+
+def detect_connection_mode(url: str) -> str:
+    """Guess the mode from the URL: Supabase's transaction pooler listens on 6543."""
+    parsed = urlparse(url)
+    if parsed.port == 6543:
+        return "transaction"
+    if parsed.hostname and "pooler" in parsed.hostname:
+        return "session"
+    return "direct"
+
+
+DB_CONNECTION_MODE = os.environ.get('DB_CONNECTION_MODE') or detect_connection_mode(DATABASE_URL)
+if DB_CONNECTION_MODE not in CONNECTION_MODES:
+    raise RuntimeError(f"DB_CONNECTION_MODE must be one of {', '.join(CONNECTION_MODES)}")
+
+# Prepared statements kept per connection when they can outlive a transaction
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 256))
+
 # Build connect_args — always require SSL for Supabase
-ssl_context = ssl.create_default_context()
+# (certificates aren't verified, so skip loading the CA bundle create_default_context() reads)
+ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
 ssl_context.check_hostname = False
 ssl_context.verify_mode = ssl.CERT_NONE
 
-connect_args = {
-    "statement_cache_size": 0,
-    "command_timeout": 30,
-    "ssl": ssl_context,
-}
-
-if IS_SERVERLESS:
-    # Serverless: no persistent connection pool
-    engine = create_async_engine(
-        ASYNC_DATABASE_URL,
-        poolclass=NullPool,
-        echo=False,
-        connect_args=connect_args,
-    )
-else:
-    # Local dev: use connection pooling
-    engine = create_async_engine(
-        ASYNC_DATABASE_URL,
-        pool_size=10,
-        max_overflow=5,
-        pool_timeout=30,
-        pool_recycle=1800,
-        pool_pre_ping=True,
-        echo=False,
-        connect_args=connect_args,
-    )
+
+def build_connect_args(mode: str) -> dict:
+    """asyncpg connect arguments for a connection mode."""
+    args = {
+        "command_timeout": 30,
+        "ssl": ssl_context,
+    }
+    if mode == "transaction":
+        # Server connections are shared between clients, so a prepared statement
+        # can't be reused and its name must never collide with another client's
+        args.update({
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        })
+    else:
+        # Connections are ours for their whole life: parse and plan each query once
+        args.update({
+            "statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE,
+        })
+    return args
+
+
+def validate_warm_connections(engine) -> None:
+    """Check connections kept between serverless invocations before reusing them.
+
+    Raising DisconnectionError on checkout makes the pool discard the
+    connection and hand out a fresh one.
+    """
+    target = engine.sync_engine
+
+    @event.listens_for(target, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        # asyncpg connections only work on the event loop that opened them
+        connection_record.info["loop"] = asyncio.get_running_loop()
+
+    @event.listens_for(target, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        connection_record.info["idle_since"] = time.monotonic()
+
+    @event.listens_for(target, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        idle_since = connection_record.info.pop("idle_since", None)
+        if idle_since is None:
+            return  # just connected
+        if connection_record.info.get("loop") is not asyncio.get_running_loop():
+            raise exc.DisconnectionError("connection belongs to a previous invocation's event loop")
+        idle = time.monotonic() - idle_since
+        if idle >= DB_SERVERLESS_IDLE_TIMEOUT:
+            raise exc.DisconnectionError(f"connection idle for {idle:.0f}s")
+        if idle >= DB_SERVERLESS_PING_AFTER:
+            try:
+                await_only(dbapi_connection.driver_connection.fetchval("SELECT 1", timeout=DB_PING_TIMEOUT))
+            except Exception as e:
+                raise exc.DisconnectionError(f"ping failed: {e}") from e
+
+
+def create_engine_for(url: str, name: str = "primary", serverless: bool = IS_SERVERLESS,
+                      serverless_pool_size: int = DB_SERVERLESS_POOL_SIZE):
+    """Engine with this deployment's pooling and statement caching for a database URL.
+
+    `name` labels the engine's pool in the /admin/pool metrics.
+    """
+    async_url = url.replace('postgresql://', 'postgresql+asyncpg://')
+    args = build_connect_args(os.environ.get('DB_CONNECTION_MODE') or detect_connection_mode(url))
+    if serverless and serverless_pool_size <= 0:
+        # Serverless without reuse: a new connection per request
+        new_engine = create_async_engine(
+            async_url,
+            poolclass=InstrumentedNullPool,
+            echo=False,
+            connect_args=args,
+        )
+    elif serverless:
+        # Serverless: a tiny pool that survives between warm invocations.
+        # pre_ping is off; validate_warm_connections() only pings idle connections
+        new_engine = create_async_engine(
+            async_url,
+            poolclass=InstrumentedQueuePool,
+            pool_size=serverless_pool_size,
+            max_overflow=DB_SERVERLESS_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            echo=False,
+            connect_args=args,
+        )
+        validate_warm_connections(new_engine)
+    else:
+        # Local dev: use connection pooling
+        new_engine = create_async_engine(
+            async_url,
+            poolclass=InstrumentedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_pre_ping=DB_POOL_PRE_PING,
+            echo=False,
+            connect_args=args,
+        )
+    instrument_pool(new_engine, name)
+    return new_engine
+
+
+engine = create_engine_for(DATABASE_URL)
+
+# Read-only replicas (comma-separated URLs); see replicas.py
+DATABASE_REPLICA_URLS = [u.strip() for u in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+replica_engines = [create_engine_for(url, f"replica-{i}") for i, url in enumerate(DATABASE_REPLICA_URLS)]
 
 AsyncSessionLocal = async_sessionmaker(
     bind=engine,
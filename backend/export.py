@@ -0,0 +1,177 @@
+"""Streaming data export.
+
+Rows are read through server-side cursors and encoded incrementally, so
+memory stays flat no matter how much data an account holds.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Callable, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, engine
+from models import Task, Note, Post, Tag, task_tags, note_tags, post_tags
+
+EXPORT_BATCH_SIZE = 500
+CHUNK_SIZE = 64 * 1024
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "json": ("application/json", "json"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+
+def _tag_names(assoc_fk, entity_id_col):
+    """Correlated subquery aggregating an entity's tag names into an array."""
+    return (
+        select(func.array_agg(Tag.name))
+        .select_from(assoc_fk.table.join(Tag, Tag.id == assoc_fk.table.c.tag_id))
+        .where(assoc_fk == entity_id_col)
+        .scalar_subquery()
+    )
+
+
+# entity -> export query builder; columns are the exported fields, in order
+EXPORT_QUERIES = {
+    "tasks": lambda user_id: select(
+        Task.id, Task.title, Task.description, Task.status, Task.priority, Task.due_date,
+        _tag_names(task_tags.c.task_id, Task.id).label("tags"),
+        Task.created_at, Task.updated_at,
+    ).where(Task.user_id == user_id).order_by(Task.created_at),
+    "notes": lambda user_id: select(
+        Note.id, Note.title, Note.content, Note.color, Note.is_pinned,
+        _tag_names(note_tags.c.note_id, Note.id).label("tags"),
+        Note.created_at, Note.updated_at,
+    ).where(Note.user_id == user_id).order_by(Note.created_at),
+    "posts": lambda user_id: select(
+        Post.id, Post.title, Post.content, Post.is_published, Post.published_at,
+        _tag_names(post_tags.c.post_id, Post.id).label("tags"),
+        Post.created_at, Post.updated_at,
+    ).where(Post.user_id == user_id).order_by(Post.created_at),
+}
+
+
+def export_entities(entity_type: str) -> list:
+    """Entities covered by an export request's entity_type ('all' or one entity)."""
+    return list(EXPORT_QUERIES) if entity_type == "all" else [e for e in EXPORT_QUERIES if e == entity_type]
+
+
+def _serialize(row) -> dict:
+    item = {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in row._mapping.items()}
+    item["tags"] = item["tags"] or []
+    return item
+
+
+async def iter_entity_rows(db: AsyncSession, entity: str, user_id: str,
+                           on_row: Optional[Callable[[], None]] = None) -> AsyncIterator[dict]:
+    """Yield an entity's export rows as dicts, fetched in batches from a server-side cursor."""
+    query = EXPORT_QUERIES[entity](user_id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+    result = await db.stream(query)
+    async for row in result:
+        if on_row:
+            on_row()
+        yield _serialize(row)
+
+
+# Encoders take `rows(entity)`, an async iterator factory over one entity's rows
+
+async def _encode_json(rows, entities):
+    yield "{"
+    for i, entity in enumerate(entities):
+        yield f'{"," if i else ""}\n  {json.dumps(entity)}: ['
+        first = True
+        async for item in rows(entity):
+            yield ("\n    " if first else ",\n    ") + json.dumps(item)
+            first = False
+        yield "]" if first else "\n  ]"
+    yield "\n}\n"
+
+
+async def _encode_ndjson(rows, entities):
+    for entity in entities:
+        entity_name = entity[:-1]  # tasks -> task
+        async for item in rows(entity):
+            yield json.dumps({"type": entity_name, **item}) + "\n"
+
+
+async def _encode_csv(rows, entities):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for entity in entities:
+        header_written = False
+        async for item in rows(entity):
+            if not header_written:
+                buffer.write(f"\n=== {entity.upper()} ===\n")
+                writer.writerow(item.keys())
+                header_written = True
+            writer.writerow([", ".join(v) if isinstance(v, list) else v for v in item.values()])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+
+ENCODERS = {"csv": _encode_csv, "json": _encode_json, "ndjson": _encode_ndjson}
+
+
+async def _chunked(pieces: AsyncIterator[str], size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Coalesce small encoded pieces into chunks of roughly `size` bytes."""
+    parts, length = [], 0
+    async for piece in pieces:
+        data = piece.encode()
+        parts.append(data)
+        length += len(data)
+        if length >= size:
+            yield b"".join(parts)
+            parts, length = [], 0
+    if parts:
+        yield b"".join(parts)
+
+
+async def _gzipped(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def encode_export(db: AsyncSession, user_id: str, entity_type: str, fmt: str,
+                        gzip: bool = False, on_row: Optional[Callable[[], None]] = None) -> AsyncIterator[bytes]:
+    """Yield an encoded export for the given session and user.
+
+    `on_row` is called once per exported row, for progress reporting.
+    """
+    encoder = ENCODERS.get(fmt, _encode_csv)
+    rows = lambda entity: iter_entity_rows(db, entity, user_id, on_row)
+    chunks = _chunked(encoder(rows, export_entities(entity_type)))
+    if gzip:
+        chunks = _gzipped(chunks)
+    async for chunk in chunks:
+        yield chunk
+
+
+async def stream_export(user_id: str, entity_type: str, fmt: str, gzip: bool = False,
+                        bind=None) -> AsyncIterator[bytes]:
+    """Yield an encoded export using a session that lives as long as the stream.
+
+    `bind` picks the engine (e.g. a read replica); the primary by default.
+    """
+    async with AsyncSessionLocal(bind=bind or engine) as db:
+        async for chunk in encode_export(db, user_id, entity_type, fmt, gzip):
+            yield chunk
+
+
+def export_filename(fmt: str, gzip: bool = False) -> str:
+    _, ext = EXPORT_FORMATS.get(fmt, EXPORT_FORMATS["csv"])
+    return f"flow_export.{ext}{'.gz' if gzip else ''}"
+
+
+def export_media_type(fmt: str, gzip: bool = False) -> str:
+    return "application/gzip" if gzip else EXPORT_FORMATS.get(fmt, EXPORT_FORMATS["csv"])[0]
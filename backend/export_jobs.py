@@ -0,0 +1,333 @@
+"""Background export jobs.
+
+POST /export/jobs records an ExportJob and returns immediately. The export is
+then written to a file on local disk, either by an in-process asyncio task
+(the default) or by a standalone worker (`python export_jobs.py`), and the
+client polls the job and downloads the finished file.
+
+A running job records a heartbeat with each progress write. Jobs whose
+heartbeat has gone quiet, because the process running them died, are
+requeued when a worker starts, and the in-process worker also polls for
+queued jobs, so nothing queued before a restart is lost. Each claim starts a
+new attempt with its own partial file, and an attempt that lost its job to a
+requeue stops at its next progress write instead of finishing alongside the
+new one. On serverless there is no process to run jobs
+after the response and the local disk isn't shared between instances, so
+inline mode is off there: deploy the standalone worker and point EXPORT_DIR
+at storage it shares with the API.
+"""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import select, update, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import AsyncSessionLocal, IS_SERVERLESS
+from models import ExportJob
+from export import CHUNK_SIZE, encode_export, export_entities, export_filename, export_media_type
+from stats import get_user_stats
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+# Not under uploads/: that directory is mounted as public static files
+# (the deployment bundle is read-only on serverless; only /tmp is writable)
+EXPORT_DIR = Path(os.environ.get('EXPORT_DIR', "/tmp/exports" if IS_SERVERLESS else str(ROOT_DIR / "exports")))
+# Run jobs in the API process; disable when a standalone worker is deployed
+EXPORT_JOBS_INLINE = os.environ.get(
+    'EXPORT_JOBS_INLINE', 'false' if IS_SERVERLESS else 'true'
+).lower() == 'true'
+EXPORT_MAX_CONCURRENT_JOBS = int(os.environ.get('EXPORT_MAX_CONCURRENT_JOBS', '2'))
+EXPORT_JOB_TTL_HOURS = int(os.environ.get('EXPORT_JOB_TTL_HOURS', '24'))
+EXPORT_PROGRESS_INTERVAL = 1.0  # seconds between progress writes
+EXPORT_POLL_INTERVAL = float(os.environ.get('EXPORT_POLL_INTERVAL', '5'))
+# A running job whose heartbeat is older than this is taken to be orphaned
+EXPORT_JOB_STALE_MINUTES = int(os.environ.get('EXPORT_JOB_STALE_MINUTES', '10'))
+
+_job_slots = asyncio.Semaphore(EXPORT_MAX_CONCURRENT_JOBS)
+# Strong references so running tasks aren't garbage collected
+_running_jobs: set = set()
+
+
+def export_job_path(job: ExportJob) -> Path:
+    return EXPORT_DIR / f"{job.id}_{export_filename(job.format, job.gzip)}"
+
+
+class JobLost(Exception):
+    """The job was requeued and claimed by another attempt while this one ran."""
+
+
+async def _set_job(job_id: str, attempt: int, **values) -> None:
+    """Update a job from a short-lived session, independent of the export's cursor.
+
+    Only applies while `attempt` still owns the job; raises JobLost otherwise.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(ExportJob)
+            .where(ExportJob.id == job_id, ExportJob.attempt == attempt, ExportJob.status == "running")
+            .values(heartbeat_at=datetime.now(timezone.utc), **values)
+        )
+        await db.commit()
+    if result.rowcount == 0:
+        raise JobLost(job_id)
+
+
+async def _claim_job(job_id: Optional[str] = None) -> Optional[Tuple[str, int]]:
+    """Atomically move a queued job (the given one, or the oldest) to running.
+
+    Returns the job id and the attempt number the claim started.
+    """
+    async with AsyncSessionLocal() as db:
+        pending = select(ExportJob.id).where(ExportJob.status == "queued")
+        if job_id is not None:
+            pending = pending.where(ExportJob.id == job_id)
+        pending = pending.order_by(ExportJob.created_at).limit(1).with_for_update(skip_locked=True)
+        now = datetime.now(timezone.utc)
+        result = await db.execute(
+            update(ExportJob)
+            .where(ExportJob.id == pending.scalar_subquery())
+            .values(status="running", started_at=now, heartbeat_at=now, attempt=ExportJob.attempt + 1)
+            .returning(ExportJob.id, ExportJob.attempt)
+        )
+        claimed = result.one_or_none()
+        await db.commit()
+        return tuple(claimed) if claimed else None
+
+
+async def requeue_stale_jobs() -> int:
+    """Put running jobs whose heartbeat has gone quiet back in the queue."""
+    cutoff = datetime.now(timezone.utc) - timedelta(minutes=EXPORT_JOB_STALE_MINUTES)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(ExportJob)
+            .where(ExportJob.status == "running", ExportJob.heartbeat_at < cutoff)
+            .values(status="queued", started_at=None, heartbeat_at=None, rows_done=0, bytes_written=0)
+            .returning(ExportJob.id)
+        )
+        requeued = result.scalars().all()
+        await db.commit()
+    if requeued:
+        logger.warning(f"Requeued {len(requeued)} stale export job(s)")
+    return len(requeued)
+
+
+async def run_export_job(job_id: str, attempt: int) -> None:
+    """Write a claimed job's export to disk, recording progress as it goes."""
+    async with AsyncSessionLocal() as db:
+        job = await db.get(ExportJob, job_id)
+        path = export_job_path(job)
+        # Per attempt, so a run that lost its job never writes into the new run's file
+        partial = path.with_name(f"{path.name}.{attempt}.part")
+        rows_done, bytes_written = 0, 0
+
+        def on_row():
+            nonlocal rows_done
+            rows_done += 1
+
+        try:
+            # Totals come from the counter rollup, so progress costs no extra scans
+            stats = await get_user_stats(db, job.user_id)
+            rows_total = sum(stats.get(f"{entity}.total", 0) for entity in export_entities(job.entity_type))
+            await _set_job(job_id, attempt, rows_total=rows_total)
+
+            EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+            last_report = time.monotonic()
+            with open(partial, "wb") as f:
+                async for chunk in encode_export(db, job.user_id, job.entity_type, job.format, job.gzip, on_row):
+                    await asyncio.to_thread(f.write, chunk)
+                    bytes_written += len(chunk)
+                    if time.monotonic() - last_report >= EXPORT_PROGRESS_INTERVAL:
+                        await _set_job(job_id, attempt, rows_done=rows_done, bytes_written=bytes_written)
+                        last_report = time.monotonic()
+            # Last ownership check before the finished file replaces any earlier one
+            await _set_job(job_id, attempt, rows_done=rows_done, bytes_written=bytes_written)
+            os.replace(partial, path)
+        except JobLost:
+            logger.warning(f"Export job {job_id} attempt {attempt} was requeued; abandoning it")
+            partial.unlink(missing_ok=True)
+            return
+        except Exception as e:
+            logger.exception(f"Export job {job_id} failed")
+            partial.unlink(missing_ok=True)
+            try:
+                await _set_job(job_id, attempt, status="failed", error=str(e)[:500],
+                               completed_at=datetime.now(timezone.utc))
+            except JobLost:
+                pass
+            return
+
+    try:
+        await _set_job(job_id, attempt, status="completed", completed_at=datetime.now(timezone.utc))
+    except JobLost:
+        logger.warning(f"Export job {job_id} attempt {attempt} finished after being requeued")
+
+
+async def _run_inline(job_id: str) -> None:
+    async with _job_slots:
+        claimed = await _claim_job(job_id)
+        if claimed:
+            await run_export_job(*claimed)
+
+
+def _spawn(coro) -> None:
+    task = asyncio.create_task(coro)
+    _running_jobs.add(task)
+    task.add_done_callback(_running_jobs.discard)
+
+
+def enqueue_export_job(job_id: str) -> None:
+    """Start a job in this process unless a standalone worker handles the queue."""
+    if not EXPORT_JOBS_INLINE:
+        return
+    _spawn(_run_inline(job_id))
+
+
+async def _run_claimed(job_id: str, attempt: int) -> None:
+    try:
+        await run_export_job(job_id, attempt)
+    finally:
+        _job_slots.release()
+
+
+async def _poll_queue() -> None:
+    """Run queued jobs nobody started, e.g. ones enqueued before a restart."""
+    try:
+        await requeue_stale_jobs()
+    except Exception as e:
+        logger.warning(f"Could not requeue stale export jobs: {e}")
+    while True:
+        await _job_slots.acquire()
+        try:
+            claimed = await _claim_job()
+        except Exception as e:
+            logger.warning(f"Could not claim export jobs: {e}")
+            claimed = None
+        if claimed is None:
+            _job_slots.release()
+            await asyncio.sleep(EXPORT_POLL_INTERVAL)
+        else:
+            _spawn(_run_claimed(*claimed))
+
+
+def start_inline_worker() -> None:
+    """Start polling the queue in this process (when inline mode is on)."""
+    if EXPORT_JOBS_INLINE:
+        _spawn(_poll_queue())
+
+
+async def purge_expired_jobs(db: AsyncSession, user_id: str) -> None:
+    """Delete a user's finished jobs older than the TTL, along with their files."""
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=EXPORT_JOB_TTL_HOURS)
+    result = await db.execute(
+        delete(ExportJob)
+        .where(ExportJob.user_id == user_id, ExportJob.status.in_(("completed", "failed")),
+               ExportJob.created_at < cutoff)
+        .returning(ExportJob.id, ExportJob.format, ExportJob.gzip)
+    )
+    for row in result.all():
+        export_job_path(row).unlink(missing_ok=True)
+
+
+# ==================== RANGE DOWNLOADS ====================
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Parse a single `bytes=start-end` Range header into inclusive offsets.
+
+    Returns None when the header is absent or not something we serve partially
+    (other units, multiple ranges); raises 416 when the range is unsatisfiable.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1  # suffix range: last N bytes
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+async def _iter_file_range(path: Path, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            data = await asyncio.to_thread(f.read, min(CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def export_file_response(job: ExportJob, range_header: Optional[str], if_range: Optional[str]):
+    """Serve a finished export, honouring a single byte range so downloads can resume."""
+    path = export_job_path(job)
+    if not path.exists():
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Export file has expired")
+
+    size = path.stat().st_size
+    etag = f'"{job.id}-{size}"'
+    filename = export_filename(job.format, job.gzip)
+    media_type = export_media_type(job.format, job.gzip)
+    headers = {"Accept-Ranges": "bytes", "ETag": etag}
+
+    # A stale If-Range validator means the client's partial copy is unusable: send it all
+    byte_range = parse_range(range_header, size) if not if_range or if_range == etag else None
+    if byte_range is None:
+        return FileResponse(path, media_type=media_type, filename=filename, headers=headers)
+
+    start, end = byte_range
+    headers.update({
+        "Content-Range": f"bytes {start}-{end}/{size}",
+        "Content-Length": str(end - start + 1),
+        "Content-Disposition": f"attachment; filename={filename}",
+    })
+    return StreamingResponse(
+        _iter_file_range(path, start, end - start + 1),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=headers
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run queued export jobs (set EXPORT_JOBS_INLINE=false on the API).")
+    parser.add_argument("--poll", type=float, default=2.0, help="Seconds to wait when the queue is empty")
+    parser.add_argument("--once", action="store_true", help="Exit once the queue is empty")
+    args = parser.parse_args()
+
+    async def main():
+        await requeue_stale_jobs()
+        while True:
+            claimed = await _claim_job()
+            if claimed:
+                logger.info(f"Running export job {claimed[0]}")
+                await run_export_job(*claimed)
+            elif args.once:
+                return
+            else:
+                await asyncio.sleep(args.poll)
+
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,7 +1,18 @@
 """Shared helper functions used across route modules."""
+from fastapi import HTTPException, Response
+from sqlalchemy import select, func, and_, or_, false, delete, tuple_, DateTime
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.ext.asyncio import AsyncSession
-from models import Activity
+from datetime import datetime, timezone
+from typing import Callable, Iterable, List, Optional, Sequence, Set, Tuple
+from models import Tag, SEARCH_CONFIG, generate_uuid
+from activity_log import ACTIVITY_LOG_BUFFERED, activity_sink, insert_activities, invalidate_activity_caches
+from schemas import CountModeEnum
+import base64
+import json
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
@@ -11,19 +22,243 @@ def sanitize_search(term: str) -> str:
     return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
 
+def prefix_tsquery(term: str) -> Optional[str]:
+    """Turn free text into a prefix-matching tsquery, e.g. 'quar rep' -> 'quar:* & rep:*'."""
+    words = re.findall(r"[^\W_]+", term)
+    return " & ".join(f"{w}:*" for w in words) or None
+
+
+def search_condition(model, term: str):
+    """Full-text match on a model's indexed search_vector.
+
+    Falls back to a title ILIKE when the term has no searchable words.
+    """
+    tsquery = prefix_tsquery(term)
+    if tsquery is None:
+        return model.title.ilike(f"%{sanitize_search(term)}%")
+    return model.search_vector.op("@@")(func.to_tsquery(SEARCH_CONFIG, tsquery))
+
+
 async def log_activity(db: AsyncSession, user_id: str, action: str, entity_type: str,
                        entity_id: str = None, entity_title: str = None, details: str = None):
-    """Log a user activity. Failures are non-fatal to avoid breaking main operations."""
+    """Log a user activity and bump its daily rollup counter.
+
+    Failures are non-fatal to avoid breaking main operations.
+    """
+    await log_activities(db, user_id, [dict(
+        action=action,
+        entity_type=entity_type,
+        entity_id=entity_id,
+        entity_title=entity_title,
+        details=details
+    )])
+
+
+async def log_activities(db: AsyncSession, user_id: str, entries: Sequence[dict]):
+    """Log several activities, each entry holding Activity fields (action, entity_type, ...).
+
+    Buffered mode hands them to the background writer without touching `db`;
+    otherwise they are written here with one multi-row insert and commit,
+    which is why routes call this after their main commit. A failure is
+    rolled back and logged, leaving `db` usable for the rest of the route.
+    """
+    if not entries:
+        return
+    now = datetime.now(timezone.utc)
+    rows = [
+        {"entity_id": None, "entity_title": None, "details": None, **entry,
+         "id": generate_uuid(), "user_id": user_id, "created_at": now}
+        for entry in entries
+    ]
+    if ACTIVITY_LOG_BUFFERED:
+        activity_sink.put(rows)
+        return
+    try:
+        # Rolling back a savepoint only expires objects changed inside it, so
+        # whatever the route already committed (and may return) stays loaded
+        async with db.begin_nested():
+            await insert_activities(db, rows)
+    except Exception as e:
+        logger.warning(f"Failed to log activity: {e}")
+        return
     try:
-        activity = Activity(
-            user_id=user_id,
-            action=action,
-            entity_type=entity_type,
-            entity_id=entity_id,
-            entity_title=entity_title,
-            details=details
-        )
-        db.add(activity)
-        await db.flush()
+        await db.commit()
     except Exception as e:
         logger.warning(f"Failed to log activity: {e}")
+        await db.rollback()
+        return
+    await invalidate_activity_caches(rows)
+
+
+# ==================== TAGS ====================
+
+async def resolve_tags(db: AsyncSession, user_id: str, tag_ids: Iterable[str]) -> List[Tag]:
+    """Fetch the user's tags among tag_ids in one query, preserving request order.
+
+    Unknown ids and tags owned by other users are silently dropped.
+    """
+    wanted = list(dict.fromkeys(tag_ids))
+    if not wanted:
+        return []
+    result = await db.execute(select(Tag).where(Tag.id.in_(wanted), Tag.user_id == user_id))
+    by_id = {tag.id: tag for tag in result.scalars().all()}
+    return [by_id[tid] for tid in wanted if tid in by_id]
+
+
+async def set_entity_tags(db: AsyncSession, entity, entity_fk, user_id: str,
+                          tag_ids: Iterable[str], existing_ids: Set[str]) -> None:
+    """Replace an entity's tags with bulk writes on its association table.
+
+    `entity_fk` is the association column pointing at the entity (e.g.
+    `task_tags.c.task_id`) and `existing_ids` the tag ids it currently has.
+    """
+    await set_tags_bulk(db, entity_fk, user_id, [(entity, tag_ids, existing_ids)])
+
+
+async def set_tags_bulk(db: AsyncSession, entity_fk, user_id: str,
+                        assignments: Sequence[Tuple[object, Iterable[str], Set[str]]]) -> None:
+    """Apply many (entity, tag_ids, existing_ids) tag assignments at once.
+
+    Resolves every requested tag in one query, then writes only the
+    difference with one DELETE and one multi-row INSERT. Each `entity.tags`
+    is set without marking it dirty so the ORM doesn't write the rows again.
+    """
+    assignments = [(entity, list(tag_ids), existing) for entity, tag_ids, existing in assignments]
+    tags = await resolve_tags(db, user_id, (tid for _, tag_ids, _ in assignments for tid in tag_ids))
+    by_id = {tag.id: tag for tag in tags}
+    assoc = entity_fk.table
+    tag_fk = assoc.c.tag_id
+
+    removals, additions = [], []
+    for entity, tag_ids, existing_ids in assignments:
+        entity_tags = [by_id[tid] for tid in dict.fromkeys(tag_ids) if tid in by_id]
+        wanted = {tag.id for tag in entity_tags}
+        removals.extend((entity.id, tid) for tid in existing_ids - wanted)
+        additions.extend({entity_fk.key: entity.id, "tag_id": tag.id}
+                         for tag in entity_tags if tag.id not in existing_ids)
+        set_committed_value(entity, "tags", entity_tags)
+
+    if removals:
+        await db.execute(delete(assoc).where(tuple_(entity_fk, tag_fk).in_(removals)))
+    if additions:
+        await db.execute(insert(assoc).values(additions))
+
+
+# ==================== PAGINATION ====================
+
+# A sort key is an ORM column paired with whether it is sorted descending.
+SortKey = Tuple[object, bool]
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Encode the sort-key values of the last row on a page as an opaque cursor."""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_keys: Sequence[SortKey]) -> list:
+    """Decode a cursor produced by `encode_cursor` for the given sort keys."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(sort_keys):
+            raise ValueError("cursor does not match sort order")
+        return [
+            datetime.fromisoformat(v) if v is not None and isinstance(col.type, DateTime) else v
+            for (col, _), v in zip(sort_keys, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _keyset_after(col, descending: bool, value):
+    """Rows strictly after `value` in this column's sort order (Postgres NULL placement)."""
+    if descending:
+        # DESC sorts NULLS FIRST
+        return col.is_not(None) if value is None else col < value
+    # ASC sorts NULLS LAST
+    if value is None:
+        return None
+    return col > value if not col.expression.nullable else or_(col > value, col.is_(None))
+
+
+def _keyset_bound(col, descending: bool, value):
+    """An index range bound on this column covering every row at or after `value`, if one exists."""
+    if value is None or (not descending and col.expression.nullable):
+        return None  # rows after it include NULLs
+    return col <= value if descending else col >= value
+
+
+def keyset_condition(sort_keys: Sequence[SortKey], values: Sequence):
+    """Build a WHERE clause selecting rows that sort after the given key values.
+
+    Shaped so Postgres can seek the sort index to the cursor instead of
+    filtering from the start of the user's range: keys that all sort the same
+    way become one row comparison, otherwise the leading key is bounded and
+    ANDed with the expansion over the rest.
+    """
+    directions = {descending for _, descending in sort_keys}
+    # NULLs never sort after a non-NULL DESC value, so only ASC keys need NOT NULL columns
+    if len(sort_keys) > 1 and len(directions) == 1 and None not in values and (
+            directions == {True} or not any(col.expression.nullable for col, _ in sort_keys)):
+        row, cursor_row = tuple_(*(col for col, _ in sort_keys)), tuple_(*values)
+        return row < cursor_row if directions == {True} else row > cursor_row
+
+    (col, descending), value = sort_keys[0], values[0]
+    after = _keyset_after(col, descending, value)
+    if len(sort_keys) > 1:
+        tie = and_(col.is_(None) if value is None else col == value, keyset_condition(sort_keys[1:], values[1:]))
+        after = tie if after is None else or_(after, tie)
+    elif after is None:
+        return false()
+    bound = _keyset_bound(col, descending, value)
+    return after if bound is None else and_(bound, after)
+
+
+async def estimate_count(db: AsyncSession, query) -> int:
+    """Return the planner's row estimate for a query without executing it."""
+    conn = await db.connection()
+    compiled = query.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    # exec_driver_sql, so literal values containing ':name' aren't parsed as binds
+    result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def paginate(db: AsyncSession, response: Response, query, sort_keys: Sequence[SortKey],
+                   limit: int, offset: int = 0, cursor: Optional[str] = None,
+                   count: CountModeEnum = CountModeEnum.EXACT, rows: bool = False,
+                   page_query: Optional[Callable] = None):
+    """Run a list query with offset or keyset pagination.
+
+    Sets `X-Total-Count` according to the count mode and `X-Next-Cursor` when
+    more rows follow. A cursor, when given, takes precedence over the offset.
+    Returns entities, or Core rows with `rows=True` for column selects.
+    `page_query`, when given, is applied to the page query only, after the
+    count, for additions like per-row tags that the count doesn't need.
+    """
+    if count == CountModeEnum.EXACT:
+        count_result = await db.execute(select(func.count()).select_from(query.subquery()))
+        response.headers["X-Total-Count"] = str(count_result.scalar() or 0)
+    elif count == CountModeEnum.ESTIMATED:
+        response.headers["X-Total-Count"] = str(await estimate_count(db, query))
+        response.headers["X-Total-Count-Estimated"] = "true"
+
+    if page_query:
+        query = page_query(query)
+    query = query.order_by(*[col.desc() if descending else col for col, descending in sort_keys])
+    if cursor:
+        query = query.where(keyset_condition(sort_keys, decode_cursor(cursor, sort_keys)))
+    elif offset:
+        query = query.offset(offset)
+
+    result = await db.execute(query.limit(limit + 1))
+    items = result.all() if rows else result.scalars().all()
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor([getattr(last, col.key) for col, _ in sort_keys])
+    return items
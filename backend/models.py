@@ -1,7 +1,8 @@
 import uuid
 from datetime import datetime, timezone
-from sqlalchemy import Column, String, Text, Boolean, DateTime, ForeignKey, Integer, Table
-from sqlalchemy.orm import relationship
+from sqlalchemy import desc, text, Column, Computed, String, Text, Boolean, BigInteger, Date, DateTime, ForeignKey, Index, Integer, Table
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from database import Base
 import enum
 
@@ -11,6 +12,20 @@ def generate_uuid():
 def utc_now():
     return datetime.now(timezone.utc)
 
+# Text search configuration used by the generated search_vector columns
+SEARCH_CONFIG = 'english'
+
+def search_vector_column(title_col: str, body_col: str):
+    """Generated, GIN-indexed tsvector over a title (weight A) and body (weight B).
+
+    Deferred so list queries never load it.
+    """
+    return deferred(Column(TSVECTOR, Computed(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({title_col}, '')), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({body_col}, '')), 'B')",
+        persisted=True
+    )))
+
 class TaskStatus(str, enum.Enum):
     TODO = "todo"
     IN_PROGRESS = "in_progress"
@@ -26,21 +41,27 @@ task_tags = Table(
     'task_tags',
     Base.metadata,
     Column('task_id', String(36), ForeignKey('tasks.id', ondelete='CASCADE'), primary_key=True),
-    Column('tag_id', String(36), ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True)
+    Column('tag_id', String(36), ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    # The primary key leads with task_id; tag filters and tag deletes look up by tag_id
+    Index('ix_task_tags_tag_id', 'tag_id')
 )
 
 note_tags = Table(
     'note_tags',
     Base.metadata,
     Column('note_id', String(36), ForeignKey('notes.id', ondelete='CASCADE'), primary_key=True),
-    Column('tag_id', String(36), ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True)
+    Column('tag_id', String(36), ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    # The primary key leads with note_id; tag filters and tag deletes look up by tag_id
+    Index('ix_note_tags_tag_id', 'tag_id')
 )
 
 post_tags = Table(
     'post_tags',
     Base.metadata,
     Column('post_id', String(36), ForeignKey('posts.id', ondelete='CASCADE'), primary_key=True),
-    Column('tag_id', String(36), ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True)
+    Column('tag_id', String(36), ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    # The primary key leads with post_id; tag filters and tag deletes look up by tag_id
+    Index('ix_post_tags_tag_id', 'tag_id')
 )
 
 class User(Base):
@@ -65,9 +86,12 @@ class User(Base):
 
 class Tag(Base):
     __tablename__ = 'tags'
+    __table_args__ = (
+        Index('ix_tags_user_id_name', 'user_id', 'name'),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
-    user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     name = Column(String(50), nullable=False)
     color = Column(String(20), default='default')
     created_at = Column(DateTime(timezone=True), default=utc_now)
@@ -80,17 +104,26 @@ class Tag(Base):
 
 class Task(Base):
     __tablename__ = 'tasks'
+    # Composite indexes follow the list query shapes: user filter, then the sort keys
+    __table_args__ = (
+        Index('ix_tasks_user_id_rank', 'user_id', 'rank', desc('created_at'), desc('id')),
+        Index('ix_tasks_user_id_status', 'user_id', 'status', 'rank', desc('created_at'), desc('id')),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
-    user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     title = Column(String(255), nullable=False)
     description = Column(Text, nullable=True)
-    status = Column(String(20), default=TaskStatus.TODO.value, index=True)
-    priority = Column(String(20), default=TaskPriority.MEDIUM.value, index=True)
+    status = Column(String(20), default=TaskStatus.TODO.value)
+    priority = Column(String(20), default=TaskPriority.MEDIUM.value)
     due_date = Column(DateTime(timezone=True), nullable=True)
-    position = Column(Integer, default=0)
+    # Fractional rank key (see ranking.py), compared bytewise
+    rank = Column(String(255, collation='C'), nullable=False)
     created_at = Column(DateTime(timezone=True), default=utc_now)
     updated_at = Column(DateTime(timezone=True), default=utc_now, onupdate=utc_now)
+    search_vector = search_vector_column('title', 'description')
+    # Don't RETURNING the generated tsvector on every INSERT/UPDATE
+    __mapper_args__ = {'eager_defaults': False}
     
     # Relationships
     user = relationship('User', back_populates='tasks')
@@ -98,15 +131,21 @@ class Task(Base):
 
 class Note(Base):
     __tablename__ = 'notes'
+    __table_args__ = (
+        Index('ix_notes_user_id_pinned', 'user_id', desc('is_pinned'), desc('created_at'), desc('id')),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
-    user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     title = Column(String(255), nullable=False)
     content = Column(Text, nullable=True)
     color = Column(String(20), default='default')
-    is_pinned = Column(Boolean, default=False, index=True)
+    is_pinned = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), default=utc_now)
     updated_at = Column(DateTime(timezone=True), default=utc_now, onupdate=utc_now)
+    search_vector = search_vector_column('title', 'content')
+    # Don't RETURNING the generated tsvector on every INSERT/UPDATE
+    __mapper_args__ = {'eager_defaults': False}
     
     # Relationships
     user = relationship('User', back_populates='notes')
@@ -114,31 +153,93 @@ class Note(Base):
 
 class Post(Base):
     __tablename__ = 'posts'
+    __table_args__ = (
+        Index('ix_posts_user_id_created_at', 'user_id', desc('created_at'), desc('id')),
+        Index('ix_posts_user_id_published', 'user_id', desc('created_at'), desc('id'),
+              postgresql_where=text('is_published')),
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
-    user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     title = Column(String(255), nullable=False)
     content = Column(Text, nullable=True)
-    is_published = Column(Boolean, default=False, index=True)
+    is_published = Column(Boolean, default=False)
     published_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), default=utc_now)
     updated_at = Column(DateTime(timezone=True), default=utc_now, onupdate=utc_now)
+    search_vector = search_vector_column('title', 'content')
+    # Don't RETURNING the generated tsvector on every INSERT/UPDATE
+    __mapper_args__ = {'eager_defaults': False}
     
     # Relationships
     user = relationship('User', back_populates='posts')
     tags = relationship('Tag', secondary=post_tags, back_populates='posts')
 
 class Activity(Base):
+    """Activity log entry; the table is range-partitioned by month (see partitions.py)."""
     __tablename__ = 'activities'
+    __table_args__ = (
+        Index('ix_activities_user_id_created_at', 'user_id', 'created_at'),
+        Index('ix_activities_user_id_entity_type', 'user_id', 'entity_type', 'created_at'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
     
     id = Column(String(36), primary_key=True, default=generate_uuid)
-    user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     action = Column(String(50), nullable=False)  # created, updated, deleted, completed, published
     entity_type = Column(String(20), nullable=False)  # task, note, post
     entity_id = Column(String(36), nullable=True)
     entity_title = Column(String(255), nullable=True)
     details = Column(Text, nullable=True)
-    created_at = Column(DateTime(timezone=True), default=utc_now, index=True)
+    # Partition key, so it must be part of the primary key
+    created_at = Column(DateTime(timezone=True), primary_key=True, default=utc_now)
     
     # Relationships
     user = relationship('User', back_populates='activities')
+
+class UserStat(Base):
+    """Incrementally maintained per-user counter, e.g. ('tasks.status:completed', 12)."""
+    __tablename__ = 'user_stats'
+    
+    user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    stat = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class DailyActivityCount(Base):
+    """Per-user activity counts bucketed by UTC day, maintained by log_activity."""
+    __tablename__ = 'daily_activity_counts'
+    
+    user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    entity_type = Column(String(20), primary_key=True)
+    action = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+class CollectionVersion(Base):
+    """Per-user change counter for a collection (tasks, notes, ...), bumped by every write to it."""
+    __tablename__ = 'collection_versions'
+    
+    user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    collection = Column(String(20), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+
+class ExportJob(Base):
+    """A background export; the worker writes the file to local disk and records progress here."""
+    __tablename__ = 'export_jobs'
+    
+    id = Column(String(36), primary_key=True, default=generate_uuid)
+    user_id = Column(String(36), ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    entity_type = Column(String(20), nullable=False)  # tasks, notes, posts, all
+    format = Column(String(10), nullable=False)  # csv, json, ndjson
+    gzip = Column(Boolean, nullable=False, default=False)
+    status = Column(String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    rows_total = Column(Integer, nullable=True)
+    rows_done = Column(Integer, nullable=False, default=0)
+    bytes_written = Column(BigInteger, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=utc_now)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    # Bumped by every claim; a run only writes to the job while its attempt is current
+    attempt = Column(Integer, nullable=False, default=0)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,203 @@
+"""Monthly partitions of the activities table.
+
+`activities` is range-partitioned on created_at, one partition per UTC month
+named activities_yYYYYmMM, plus activities_default for rows in months that
+have no partition yet. This module creates partitions ahead of time (moving
+any rows the default partition caught into them) and applies the retention
+policy. Old partitions are detached whole instead of being deleted row by
+row, and are optionally archived to gzipped CSV on local disk and then
+dropped; a partition detached by a run that failed before dropping it is
+picked up again by the next run.
+
+Run it periodically (e.g. daily from cron):
+    python partitions.py            # ensure future partitions, apply retention
+    python partitions.py --dry-run  # show what retention would do
+"""
+import asyncio
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from database import engine
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+PARENT_TABLE = "activities"
+DEFAULT_PARTITION = "activities_default"
+# How many months past the current one to keep partitions ready for
+ACTIVITY_PARTITIONS_AHEAD = int(os.environ.get('ACTIVITY_PARTITIONS_AHEAD', '3'))
+# Months of activity to keep online, including the current one; 0 keeps everything
+ACTIVITY_RETENTION_MONTHS = int(os.environ.get('ACTIVITY_RETENTION_MONTHS', '0'))
+# 'archive' dumps expired partitions to ACTIVITY_ARCHIVE_DIR and drops them; 'detach' only detaches
+ACTIVITY_RETENTION_MODE = os.environ.get('ACTIVITY_RETENTION_MODE', 'archive')
+ACTIVITY_ARCHIVE_DIR = Path(os.environ.get('ACTIVITY_ARCHIVE_DIR', str(ROOT_DIR / "archives")))
+
+_PARTITION_NAME = re.compile(rf"^{PARENT_TABLE}_y(\d{{4}})m(\d{{2}})$")
+
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+
+def add_months(d: date, months: int) -> date:
+    index = d.year * 12 + d.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def current_month() -> date:
+    return month_start(datetime.now(timezone.utc).date())
+
+
+async def list_partitions(conn: AsyncConnection) -> List[date]:
+    """Months that currently have an attached partition, oldest first."""
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent"
+    ), {"parent": PARENT_TABLE})
+    months = []
+    for (name,) in result.all():
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+async def list_detached_partitions(conn: AsyncConnection) -> List[date]:
+    """Months whose partition table still exists but is no longer attached, oldest first."""
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_class c "
+        "WHERE c.relkind = 'r' AND pg_table_is_visible(c.oid) AND c.relname LIKE :pattern "
+        "AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid)"
+    ), {"pattern": f"{PARENT_TABLE}\\_y%"})
+    months = []
+    for (name,) in result.all():
+        match = _PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+async def ensure_partitions(conn: AsyncConnection, since: Optional[date] = None,
+                            ahead: int = ACTIVITY_PARTITIONS_AHEAD) -> List[str]:
+    """Create any missing partitions from `since` (default: this month) through `ahead` months out.
+
+    Each partition is built detached, filled with the month's rows from the
+    default partition, and then attached, since Postgres refuses to attach
+    a range the default partition holds rows for. Returns the names of the
+    partitions created.
+    """
+    month = month_start(since) if since else current_month()
+    last = add_months(current_month(), ahead)
+    existing = set(await list_partitions(conn))
+    created = []
+    while month <= last:
+        if month not in existing:
+            name = partition_name(month)
+            # Bounds are UTC midnights so partitions line up with daily_activity_counts days
+            start = f"'{month.isoformat()} 00:00:00+00'"
+            end = f"'{add_months(month, 1).isoformat()} 00:00:00+00'"
+            await conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+            ))
+            # Partitions are reachable directly through the API; without RLS they'd be readable
+            await conn.execute(text(f"ALTER TABLE {name} ENABLE ROW LEVEL SECURITY"))
+            await conn.execute(text(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                f"WHERE created_at >= {start} AND created_at < {end} RETURNING *) "
+                f"INSERT INTO {name} SELECT * FROM moved"
+            ))
+            # Attaching builds the table's copies of the partitioned indexes and constraints
+            await conn.execute(text(
+                f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES FROM ({start}) TO ({end})"
+            ))
+            await conn.commit()
+            created.append(name)
+        month = add_months(month, 1)
+    await conn.commit()
+    if created:
+        logger.info(f"Created activity partitions: {', '.join(created)}")
+    return created
+
+
+async def _archive_table(conn: AsyncConnection, name: str) -> Path:
+    """COPY a detached partition to a gzipped CSV file, written atomically."""
+    ACTIVITY_ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    path = ACTIVITY_ARCHIVE_DIR / f"{name}.csv.gz"
+    partial = path.with_name(path.name + ".part")
+    raw = await conn.get_raw_connection()
+    with gzip.open(partial, "wb") as f:
+        async def write(data: bytes):
+            await asyncio.to_thread(f.write, data)
+        await raw.driver_connection.copy_from_table(name, output=write, format="csv", header=True)
+    os.replace(partial, path)
+    return path
+
+
+async def apply_retention(conn: AsyncConnection, months: int = ACTIVITY_RETENTION_MONTHS,
+                          mode: str = ACTIVITY_RETENTION_MODE, dry_run: bool = False) -> List[str]:
+    """Detach partitions older than the retention window, archiving and dropping them in 'archive' mode.
+
+    Only activities are affected; the daily_activity_counts rollup keeps
+    analytics history intact. In 'archive' mode, expired partitions an
+    earlier run detached but didn't get to drop are archived now. Returns the
+    names of the partitions handled.
+    """
+    if months <= 0:
+        return []
+    cutoff = add_months(current_month(), -(months - 1))
+    attached = {partition_name(m) for m in await list_partitions(conn) if m < cutoff}
+    detached = set()
+    if mode == "archive":
+        detached = {partition_name(m) for m in await list_detached_partitions(conn) if m < cutoff}
+    expired = sorted(attached | detached)
+    if dry_run:
+        return expired
+
+    for name in expired:
+        if name in attached:
+            await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+            await conn.commit()
+        if mode == "archive":
+            # Detached and committed first, so a failed dump leaves its rows in place for the next run
+            path = await _archive_table(conn, name)
+            await conn.execute(text(f"DROP TABLE {name}"))
+            await conn.commit()
+            logger.info(f"Archived {name} to {path}")
+        else:
+            logger.info(f"Detached {name}")
+    return expired
+
+
+async def maintain_partitions(dry_run: bool = False) -> dict:
+    """Create upcoming partitions and apply the retention policy."""
+    async with engine.connect() as conn:
+        created = [] if dry_run else await ensure_partitions(conn)
+        expired = await apply_retention(conn, dry_run=dry_run)
+    return {"created": created, "expired": expired}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Maintain monthly partitions of the activities table.")
+    parser.add_argument("--dry-run", action="store_true", help="Only report partitions past retention")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    result = asyncio.run(maintain_partitions(dry_run=args.dry_run))
+    print(f"created: {', '.join(result['created']) or '-'}")
+    print(f"{'would expire' if args.dry_run else 'expired'}: {', '.join(result['expired']) or '-'}")
@@ -0,0 +1,192 @@
+"""Connection pool instrumentation.
+
+Hooks SQLAlchemy pool events to record how long callers wait to check a
+connection out, how long they hold it, and which route held it. Counts are
+kept per engine (the primary and each replica) and per worker process, and
+start from zero on boot; they are what to look at when sizing DB_POOL_SIZE /
+DB_MAX_OVERFLOW.
+"""
+import bisect
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+
+from request_context import current_scope
+
+# Upper bounds in milliseconds; the last bucket catches everything slower
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+_route_paths: Dict[Callable, str] = {}
+
+
+class Histogram:
+    """Fixed-bucket latency histogram."""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th observation."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, n in zip(BUCKETS_MS, self.counts):
+            seen += n
+            if seen >= rank:
+                return self.max_ms if bound == float("inf") else bound
+        return self.max_ms
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "max_ms": round(self.max_ms, 3),
+            "p50_ms": self.quantile(0.5),
+            "p95_ms": self.quantile(0.95),
+            "p99_ms": self.quantile(0.99),
+            "buckets": {
+                ("+Inf" if bound == float("inf") else str(bound)): n
+                for bound, n in zip(BUCKETS_MS, self.counts)
+            },
+        }
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self.checkout_wait = Histogram()
+        self.hold = Histogram()
+        self.hold_by_route: Dict[str, Histogram] = {}
+
+    def snapshot(self) -> dict:
+        return {
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "invalidations": self.invalidations,
+            "checkout_wait": self.checkout_wait.snapshot(),
+            "hold": self.hold.snapshot(),
+            "hold_by_route": {route: h.snapshot() for route, h in sorted(self.hold_by_route.items())},
+        }
+
+
+# Engine name -> (engine, metrics), in registration order
+_pools: Dict[str, Tuple[object, PoolMetrics]] = {}
+
+
+class _TimedCheckout:
+    """Times `_do_get`, which is where a caller waits for a free (or new) connection."""
+
+    metrics: Optional[PoolMetrics] = None  # set by instrument_pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            if self.metrics is not None:
+                self.metrics.checkout_wait.observe((time.perf_counter() - start) * 1000)
+
+    def recreate(self):
+        # engine.dispose() swaps in a new pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class InstrumentedQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    pass
+
+
+class InstrumentedNullPool(_TimedCheckout, NullPool):
+    pass
+
+
+def route_label(scope: Optional[dict]) -> str:
+    """"METHOD /path/{template}" for the request in scope, or "background" outside requests."""
+    if scope is None:
+        return "background"
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return f"{scope['method']} (unrouted)"
+    if endpoint not in _route_paths:
+        _route_paths.update({r.endpoint: r.path for r in scope["app"].routes if hasattr(r, "endpoint")})
+    return f"{scope['method']} {_route_paths.get(endpoint, endpoint.__name__)}"
+
+
+def instrument_pool(engine, name: str) -> None:
+    """Register the pool event listeners on an (async) engine, reporting under `name`."""
+    target = engine.sync_engine
+    # Re-registering a name (e.g. a recreated engine) keeps its counts
+    metrics = _pools[name][1] if name in _pools else PoolMetrics()
+    _pools[name] = (engine, metrics)
+    target.pool.metrics = metrics
+
+    @event.listens_for(target, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+
+    @event.listens_for(target, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.checkouts += 1
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        connection_record.info["checked_out_by"] = current_scope.get()
+
+    @event.listens_for(target, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        start = connection_record.info.pop("checked_out_at", None)
+        scope = connection_record.info.pop("checked_out_by", None)
+        if start is None:
+            return
+        ms = (time.perf_counter() - start) * 1000
+        metrics.hold.observe(ms)
+        label = route_label(scope)
+        histogram = metrics.hold_by_route.get(label)
+        if histogram is None:
+            histogram = metrics.hold_by_route[label] = Histogram()
+        histogram.observe(ms)
+
+    @event.listens_for(target, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.invalidations += 1
+
+
+def pool_status(engine) -> dict:
+    """Current occupancy; NullPool keeps no connections so it reports none."""
+    pool = engine.sync_engine.pool
+    if not isinstance(pool, AsyncAdaptedQueuePool):
+        return {"pool": type(pool).__name__}
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+        "timeout": pool.timeout(),
+    }
+
+
+def pool_report() -> dict:
+    """Occupancy and metrics for every instrumented engine, keyed by engine name."""
+    return {name: {**pool_status(engine), **metrics.snapshot()} for name, (engine, metrics) in _pools.items()}
+
+
+def reset_metrics() -> None:
+    for _, metrics in _pools.values():
+        metrics.reset()
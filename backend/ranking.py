@@ -0,0 +1,228 @@
+"""Fractional rank keys for task ordering.
+
+Tasks sort by `rank`, a base-62 string compared byte by byte (the column
+uses the "C" collation). A key between any two others can always be
+generated, so moving a task writes just that task's row. Keys follow the
+fractional-indexing scheme: an integer part whose first character encodes
+its length ('a'..'z' for 0 and up, 'A'..'Z' below zero) followed by an
+optional fraction that never ends in '0'. Appending increments the integer
+part, so keys grow logarithmically with the number of tasks; repeatedly
+inserting at the same spot grows the fraction, and once a key passes
+RANK_REBALANCE_LENGTH the user's tasks are rebalanced in the background.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import bindparam, select, update
+
+from database import AsyncSessionLocal
+from models import Task
+from versions import bump_version
+
+logger = logging.getLogger(__name__)
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+RANK_REBALANCE_LENGTH = int(os.environ.get('RANK_REBALANCE_LENGTH', '24'))
+
+# The smallest integer part; nothing can be generated below it
+_SMALLEST_INTEGER = "A" + DIGITS[0] * 26
+# Head of the integer part of appended keys: 'i' + 9 digits of microseconds since the epoch
+_APPEND_HEAD = "i"
+
+
+# ==================== KEYS ====================
+
+def _integer_length(head: str) -> int:
+    if "a" <= head <= "z":
+        return ord(head) - ord("a") + 2
+    if "A" <= head <= "Z":
+        return ord("Z") - ord(head) + 2
+    raise ValueError(f"Invalid rank head: {head!r}")
+
+
+def _integer_part(key: str) -> str:
+    length = _integer_length(key[0])
+    if length > len(key):
+        raise ValueError(f"Invalid rank: {key!r}")
+    return key[:length]
+
+
+def _validate(key: str) -> None:
+    if not key or key == _SMALLEST_INTEGER:
+        raise ValueError(f"Invalid rank: {key!r}")
+    integer = _integer_part(key)
+    if key[len(integer):].endswith(DIGITS[0]):
+        raise ValueError(f"Invalid rank (trailing zero): {key!r}")
+
+
+def _midpoint(a: str, b: Optional[str]) -> str:
+    """A fraction strictly between fractions a and b (None meaning 1)."""
+    if b is not None:
+        n = 0
+        while n < len(b) and (a[n] if n < len(a) else DIGITS[0]) == b[n]:
+            n += 1
+        if n > 0:
+            return b[:n] + _midpoint(a[n:], b[n:])
+    digit_a = DIGITS.index(a[0]) if a else 0
+    digit_b = DIGITS.index(b[0]) if b is not None else len(DIGITS)
+    if digit_b - digit_a > 1:
+        return DIGITS[(digit_a + digit_b + 1) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITS[digit_a] + _midpoint(a[1:], None)
+
+
+def _increment(integer: str) -> Optional[str]:
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) + 1
+        if d < len(DIGITS):
+            digits[i] = DIGITS[d]
+            return head + "".join(digits)
+        digits[i] = DIGITS[0]
+    if head == "Z":
+        return "a" + DIGITS[0]
+    if head == "z":
+        return None
+    head = chr(ord(head) + 1)
+    if head > "a":
+        digits.append(DIGITS[0])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+
+def _decrement(integer: str) -> Optional[str]:
+    head, digits = integer[0], list(integer[1:])
+    for i in reversed(range(len(digits))):
+        d = DIGITS.index(digits[i]) - 1
+        if d >= 0:
+            digits[i] = DIGITS[d]
+            return head + "".join(digits)
+        digits[i] = DIGITS[-1]
+    if head == "a":
+        return "Z" + DIGITS[-1]
+    if head == "A":
+        return None
+    head = chr(ord(head) - 1)
+    if head < "Z":
+        digits.append(DIGITS[-1])
+    else:
+        digits.pop()
+    return head + "".join(digits)
+
+
+def rank_between(before: Optional[str], after: Optional[str]) -> str:
+    """A key sorting after `before` and before `after` (either may be None for an open end).
+
+    Raises ValueError for malformed keys or when `before` doesn't sort before `after`.
+    """
+    if before is not None:
+        _validate(before)
+    if after is not None:
+        _validate(after)
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f"{before!r} does not sort before {after!r}")
+
+    if before is None:
+        if after is None:
+            return "a" + DIGITS[0]
+        integer = _integer_part(after)
+        if integer == _SMALLEST_INTEGER:
+            return integer + _midpoint("", after[len(integer):])
+        if integer < after:
+            return integer
+        key = _decrement(integer)
+        if key is None:
+            raise ValueError("No rank sorts before the smallest rank")
+        return key
+
+    integer = _integer_part(before)
+    fraction = before[len(integer):]
+    if after is None:
+        key = _increment(integer)
+        return key if key is not None else before + _midpoint(fraction, None)
+    if integer == _integer_part(after):
+        return integer + _midpoint(fraction, after[len(integer):])
+    key = _increment(integer)
+    if key is None:
+        raise ValueError("No rank sorts after the largest rank")
+    return key if key < after else integer + _midpoint(fraction, None)
+
+
+def sequential_ranks(n: int) -> List[str]:
+    """n short, evenly spaced keys in ascending order, starting at the zero integer."""
+    ranks, key = [], "a" + DIGITS[0]
+    for _ in range(n):
+        ranks.append(key)
+        key = _increment(key)
+    return ranks
+
+
+def append_rank(now: datetime, offset: int = 0) -> str:
+    """Key for a new task, sorting after every task created or ranked before it.
+
+    Derived from the creation time so inserts needn't read the current last
+    rank. Rebalanced keys stay below the 'i' head, so new tasks follow them.
+    """
+    value = int(now.timestamp() * 1_000_000) + offset
+    digits = []
+    for _ in range(_integer_length(_APPEND_HEAD) - 1):
+        value, d = divmod(value, len(DIGITS))
+        digits.append(DIGITS[d])
+    return _APPEND_HEAD + "".join(reversed(digits))
+
+
+# ==================== REBALANCING ====================
+
+_rebalancing = set()  # user ids with a rebalance in flight
+_rebalance_tasks = set()
+
+
+async def rebalance_ranks(user_id: str) -> None:
+    """Rewrite a user's ranks as short sequential keys, keeping their order."""
+    tasks = Task.__table__
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(tasks.c.id).where(tasks.c.user_id == user_id)
+            .order_by(tasks.c.rank, tasks.c.created_at.desc(), tasks.c.id.desc())
+            .with_for_update()
+        )
+        ids = result.scalars().all()
+        if not ids:
+            return
+        # Keep updated_at: the tasks themselves didn't change
+        await db.execute(
+            update(tasks).where(tasks.c.id == bindparam("task_id"))
+            .values(rank=bindparam("new_rank"), updated_at=tasks.c.updated_at),
+            [{"task_id": task_id, "new_rank": rank} for task_id, rank in zip(ids, sequential_ranks(len(ids)))],
+        )
+        await bump_version(db, user_id, "tasks")
+        await db.commit()
+
+
+async def _run_rebalance(user_id: str) -> None:
+    try:
+        await rebalance_ranks(user_id)
+    except Exception:
+        logger.exception(f"Rebalancing ranks for user {user_id} failed")
+    finally:
+        _rebalancing.discard(user_id)
+
+
+def needs_rebalance(rank: str) -> bool:
+    return len(rank) > RANK_REBALANCE_LENGTH
+
+
+def schedule_rebalance(user_id: str) -> None:
+    """Rebalance a user's ranks in the background, once at a time per user."""
+    if user_id in _rebalancing:
+        return
+    _rebalancing.add(user_id)
+    task = asyncio.create_task(_run_rebalance(user_id))
+    # The event loop only keeps weak references to tasks
+    _rebalance_tasks.add(task)
+    task.add_done_callback(_rebalance_tasks.discard)
@@ -0,0 +1,163 @@
+"""Read-only list queries on Core rows.
+
+The list GETs select just the columns their response needs and map each row
+into a NamedTuple DTO. Nothing enters the session's identity map and there is
+no attribute instrumentation or lazy-load state per row, so a page costs
+tuples rather than ORM instances. The DTOs have the same attribute names as
+the models, so serialization.py, paginate's keyset cursors and the
+`from_attributes` response models all read them unchanged.
+
+Tags are loaded one of two ways, set by LIST_TAG_LOADING:
+
+- lateral (default): each row's tags are aggregated with json_agg in a
+  LATERAL join on the page query, so a page is a single round trip
+- batch: a second query fetches the page's tags through the association
+  table, like selectinload does for entities
+
+Never use these for anything that writes: they are plain tuples.
+"""
+import os
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Type
+
+from sqlalchemy import JSON, func, literal_column, select, true
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Tag
+
+TAG_LOADING_STRATEGIES = ("lateral", "batch")
+LIST_TAG_LOADING = os.environ.get('LIST_TAG_LOADING', 'lateral').lower()
+
+if LIST_TAG_LOADING not in TAG_LOADING_STRATEGIES:
+    raise RuntimeError(f"LIST_TAG_LOADING must be one of {', '.join(TAG_LOADING_STRATEGIES)}")
+
+
+class TagRow(NamedTuple):
+    id: str
+    name: str
+    color: str
+    created_at: datetime
+
+
+class TaskRow(NamedTuple):
+    id: str
+    user_id: str
+    title: str
+    description: Optional[str]
+    status: str
+    priority: str
+    due_date: Optional[datetime]
+    rank: str
+    created_at: datetime
+    updated_at: datetime
+    tags: Tuple[TagRow, ...] = ()
+
+
+class NoteRow(NamedTuple):
+    id: str
+    user_id: str
+    title: str
+    content: Optional[str]
+    color: str
+    is_pinned: bool
+    created_at: datetime
+    updated_at: datetime
+    tags: Tuple[TagRow, ...] = ()
+
+
+class PostRow(NamedTuple):
+    id: str
+    user_id: str
+    title: str
+    content: Optional[str]
+    is_published: bool
+    published_at: Optional[datetime]
+    created_at: datetime
+    updated_at: datetime
+    tags: Tuple[TagRow, ...] = ()
+
+
+class ActivityRow(NamedTuple):
+    id: str
+    action: str
+    entity_type: str
+    entity_id: Optional[str]
+    entity_title: Optional[str]
+    details: Optional[str]
+    created_at: datetime
+
+
+def row_columns(model, dto: Type[NamedTuple]) -> list:
+    """The model's columns for every DTO field except `tags`, in field order."""
+    return [getattr(model, field) for field in dto._fields if field != "tags"]
+
+
+def select_rows(model, dto: Type[NamedTuple]):
+    """SELECT of just the DTO's columns; filter and paginate it like an entity query."""
+    return select(*row_columns(model, dto))
+
+
+async def load_tags(db: AsyncSession, fk_column, ids: Sequence[str]) -> Dict[str, List[TagRow]]:
+    """Tags for each id, via an association table's foreign key column (e.g. task_tags.c.task_id)."""
+    tags: Dict[str, List[TagRow]] = {}
+    if not ids:
+        return tags
+    assoc = fk_column.table
+    result = await db.execute(
+        select(fk_column, *row_columns(Tag, TagRow))
+        .join(assoc, assoc.c.tag_id == Tag.id)
+        .where(fk_column.in_(ids))
+    )
+    for owner_id, *tag in result.all():
+        tags.setdefault(owner_id, []).append(TagRow(*tag))
+    return tags
+
+
+def tag_list(fk_column):
+    """LATERAL subquery aggregating the tags of the outer row as a JSON array (NULL when untagged)."""
+    assoc = fk_column.table.alias()  # the outer query may join the same table to filter by tag
+    owner_id = next(iter(fk_column.foreign_keys)).column
+    fk_column = assoc.c[fk_column.key]
+    tag = func.json_build_object(*(
+        arg for field in TagRow._fields for arg in (literal_column(f"'{field}'"), getattr(Tag, field))
+    ))
+    return (
+        select(func.json_agg(aggregate_order_by(tag, Tag.name), type_=JSON).label("tags"))
+        .select_from(Tag)
+        .join(assoc, assoc.c.tag_id == Tag.id)
+        .where(fk_column == owner_id)
+        .lateral("tag_list")
+    )
+
+
+def tag_list_join(fk_column, strategy: str = LIST_TAG_LOADING) -> Optional[Callable]:
+    """paginate's `page_query` hook adding each row's tags to the page query.
+
+    None under the batch strategy, which loads tags after the page instead.
+    """
+    if strategy != "lateral":
+        return None
+    tags = tag_list(fk_column)
+    return lambda query: query.add_columns(tags.c.tags).join(tags, true())
+
+
+def tag_from_json(tag: dict) -> TagRow:
+    return TagRow(tag["id"], tag["name"], tag["color"], datetime.fromisoformat(tag["created_at"]))
+
+
+def to_dtos(rows: Sequence, dto: Type[NamedTuple]) -> list:
+    return [dto(*row) for row in rows]
+
+
+async def to_dtos_with_tags(db: AsyncSession, rows: Sequence, dto: Type[NamedTuple], fk_column,
+                            strategy: str = LIST_TAG_LOADING) -> list:
+    """Map rows to DTOs carrying their tags.
+
+    Under the lateral strategy the rows' last column is their tag list from
+    tag_list_join; under batch it's one extra query for the whole page.
+    """
+    if strategy == "lateral":
+        return [dto(*row[:-1], tuple(tag_from_json(tag) for tag in row[-1] or ())) for row in rows]
+    tags = await load_tags(db, fk_column, [row.id for row in rows])
+    return [dto(*row, tuple(tags.get(row.id, ()))) for row in rows]
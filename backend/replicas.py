@@ -0,0 +1,131 @@
+"""Routing read-only endpoints to read replicas.
+
+Read endpoints take `Depends(get_read_db)` instead of `get_db`. Their session
+is bound to a healthy replica, picked round-robin, unless:
+
+- no replica is configured or healthy, in which case they use the primary, or
+- the user wrote within the last READ_YOUR_WRITES_WINDOW seconds. Every write
+  bumps a collection version, which pins the user to the primary. Pins live
+  in the cache, so they hold on every worker only when CACHE_URL is set;
+  without it a request landing on another worker (or serverless instance)
+  can read from a replica that hasn't caught up with the write yet.
+
+Replica health is refreshed in the background at most every
+REPLICA_CHECK_INTERVAL seconds, triggered by read traffic. A replica is
+healthy when it answers within REPLICA_CHECK_TIMEOUT and has replayed
+everything it received or is at most REPLICA_MAX_LAG seconds behind. The
+pin window should exceed that lag plus the check interval.
+"""
+import asyncio
+import itertools
+import logging
+import os
+import time
+from typing import AsyncIterator, Iterable, List
+
+from fastapi import Depends
+from sqlalchemy import text
+
+from auth import get_current_principal, Principal
+from cache import Cache, CACHE_URL
+from database import AsyncSessionLocal, engine, replica_engines
+
+logger = logging.getLogger(__name__)
+
+READ_YOUR_WRITES_WINDOW = float(os.environ.get('READ_YOUR_WRITES_WINDOW', 15))
+REPLICA_MAX_LAG = float(os.environ.get('REPLICA_MAX_LAG', 5))
+REPLICA_CHECK_INTERVAL = float(os.environ.get('REPLICA_CHECK_INTERVAL', 5))
+REPLICA_CHECK_TIMEOUT = float(os.environ.get('REPLICA_CHECK_TIMEOUT', 2))
+
+# Zero when the replica has replayed all WAL it received, so an idle primary doesn't look like lag
+LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+_primary_pins = Cache("primary_pin", maxsize=10000, ttl=READ_YOUR_WRITES_WINDOW)
+
+if replica_engines and not CACHE_URL:
+    logger.warning(
+        "DATABASE_REPLICA_URLS is set without CACHE_URL: read-your-writes pins are per-process, "
+        "so users may not see their own writes when requests hit another worker"
+    )
+
+
+class ReplicaSet:
+    def __init__(self, engines: List):
+        self.engines = engines
+        # Unhealthy until the first check passes, so a dead replica never takes traffic at boot
+        self.healthy = [False] * len(engines)
+        self.lag = [None] * len(engines)
+        self._checked_at = 0.0
+        self._checking = None
+        self._next = itertools.count()
+
+    async def _lag(self, i: int) -> float:
+        async with self.engines[i].connect() as conn:
+            return (await conn.execute(LAG_QUERY)).scalar()
+
+    async def _check(self, i: int) -> None:
+        try:
+            # The timeout covers connecting too: a replica that hangs on connect is unhealthy
+            lag = await asyncio.wait_for(self._lag(i), REPLICA_CHECK_TIMEOUT)
+            self.lag[i] = float(lag)
+            healthy = self.lag[i] <= REPLICA_MAX_LAG
+        except Exception as e:
+            logger.warning(f"Replica {i} health check failed: {e}")
+            self.lag[i] = None
+            healthy = False
+        if healthy != self.healthy[i]:
+            logger.info(f"Replica {i} is now {'healthy' if healthy else 'unhealthy'}")
+        self.healthy[i] = healthy
+
+    async def check(self) -> None:
+        """Refresh every replica's health."""
+        self._checked_at = time.monotonic()
+        await asyncio.gather(*(self._check(i) for i in range(len(self.engines))))
+
+    def _maybe_check(self) -> None:
+        if self._checking is not None and not self._checking.done():
+            return
+        if time.monotonic() - self._checked_at >= REPLICA_CHECK_INTERVAL:
+            self._checking = asyncio.create_task(self.check())
+
+    def pick(self):
+        """A healthy replica engine, or None when there isn't one."""
+        self._maybe_check()
+        candidates = [e for e, ok in zip(self.engines, self.healthy) if ok]
+        if not candidates:
+            return None
+        return candidates[next(self._next) % len(candidates)]
+
+    def status(self) -> list:
+        return [{"healthy": ok, "lag_seconds": lag} for ok, lag in zip(self.healthy, self.lag)]
+
+
+replica_set = ReplicaSet(replica_engines)
+
+
+async def pin_to_primary(user_ids: Iterable[str]) -> None:
+    """Send these users' reads to the primary for the read-your-writes window."""
+    if not replica_engines:
+        return
+    for user_id in set(user_ids):
+        await _primary_pins.set(user_id, True)
+
+
+async def read_engine_for(user_id: str):
+    """The engine a user's reads should use right now."""
+    if not replica_engines or await _primary_pins.get(user_id):
+        return engine
+    return replica_set.pick() or engine
+
+
+async def get_read_db(current_user: Principal = Depends(get_current_principal)) -> AsyncIterator:
+    """Session for read-only endpoints; never write through it."""
+    bind = await read_engine_for(current_user.id)
+    async with AsyncSessionLocal(bind=bind) as session:
+        try:
+            yield session
+        finally:
+            await session.close()
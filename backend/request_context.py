@@ -0,0 +1,31 @@
+"""The current request's ASGI scope, for code running below the route handler.
+
+Kept free of heavy imports so server.py can install the middleware without
+loading SQLAlchemy at cold start.
+"""
+from contextvars import ContextVar
+from typing import Optional
+
+# The ASGI scope of the request running in this context, if any
+current_scope: ContextVar[Optional[dict]] = ContextVar("current_scope", default=None)
+
+
+class RequestScopeMiddleware:
+    """Makes the request's scope visible through `current_scope`.
+
+    Routing fills in scope["endpoint"] on the same dict later, so readers
+    see the matched route once the handler is running.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_scope.reset(token)
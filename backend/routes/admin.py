@@ -0,0 +1,50 @@
+"""Operator endpoints, enabled by setting ADMIN_TOKEN."""
+import os
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, status
+
+from activity_log import activity_sink
+from pool_metrics import pool_report, reset_metrics
+from replicas import replica_set
+
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+router = APIRouter(prefix="/admin", tags=["admin"], include_in_schema=False)
+
+
+def require_admin(token: Optional[str]) -> None:
+    # Without a configured token the endpoints don't exist
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not token or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+
+
+@router.get("/pool")
+async def get_pool_metrics(x_admin_token: Optional[str] = Header(None)):
+    """Per-engine pool occupancy plus checkout wait and hold time histograms for this worker."""
+    require_admin(x_admin_token)
+    return {"pid": os.getpid(), "engines": pool_report()}
+
+
+@router.delete("/pool", status_code=status.HTTP_204_NO_CONTENT)
+async def reset_pool_metrics(x_admin_token: Optional[str] = Header(None)):
+    """Start this worker's pool histograms over, e.g. after changing pool sizing."""
+    require_admin(x_admin_token)
+    reset_metrics()
+
+
+@router.get("/activity-log")
+async def get_activity_log_metrics(x_admin_token: Optional[str] = Header(None)):
+    """Activity sink queue depth, drops and flush stats for this worker."""
+    require_admin(x_admin_token)
+    return {"pid": os.getpid(), **activity_sink.metrics()}
+
+
+@router.get("/replicas")
+async def get_replica_status(x_admin_token: Optional[str] = Header(None)):
+    """Read replica health and lag as last checked by this worker."""
+    require_admin(x_admin_token)
+    return {"pid": os.getpid(), "replicas": replica_set.status()}
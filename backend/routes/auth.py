@@ -10,7 +10,10 @@ from pathlib import Path
 from database import get_db
 from models import User
 from schemas import UserRegister, UserLogin, Token, UserResponse, UserUpdate
-from auth import get_password_hash, verify_password, create_access_token, get_current_user
+from auth import (
+    hash_password, verify_and_update_password, create_access_token, get_current_user,
+    get_current_principal, invalidate_cached_user, Principal,
+)
 from helpers import log_activity
 
 router = APIRouter()
@@ -38,10 +41,12 @@ async def register(request: Request, user_data: UserRegister, db: AsyncSession =
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
+    # Hand the connection back to the pool while the password hashes
+    await db.commit()
     
     user = User(
         email=user_data.email,
-        password_hash=get_password_hash(user_data.password),
+        password_hash=await hash_password(user_data.password),
         full_name=user_data.full_name
     )
     db.add(user)
@@ -59,20 +64,31 @@ async def login(request: Request, user_data: UserLogin, db: AsyncSession = Depen
     """Login and get access token."""
     result = await db.execute(select(User).where(User.email == user_data.email))
     user = result.scalar_one_or_none()
+    # Hand the connection back to the pool while the password verifies
+    await db.commit()
     
-    if not user or not verify_password(user_data.password, user.password_hash):
+    valid, new_hash = (False, None)
+    if user:
+        valid, new_hash = await verify_and_update_password(user_data.password, user.password_hash)
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password"
         )
     
+    # Stored hash predates the current policy: replace it now that we have the password
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
+        await invalidate_cached_user(user.id)
+    
     await log_activity(db, user.id, "logged_in", "user", user.id, user.full_name)
     
     access_token = create_access_token(data={"sub": user.id})
     return Token(access_token=access_token)
 
 @router.post("/auth/refresh", response_model=Token)
-async def refresh_token(current_user: User = Depends(get_current_user)):
+async def refresh_token(current_user: Principal = Depends(get_current_principal)):
     """Refresh access token. Requires a valid (non-expired) token."""
     access_token = create_access_token(data={"sub": current_user.id})
     return Token(access_token=access_token)
@@ -100,6 +116,7 @@ async def update_profile(
     
     current_user.updated_at = datetime.now(timezone.utc)
     await db.commit()
+    await invalidate_cached_user(current_user.id)
     await db.refresh(current_user)
     
     await log_activity(db, current_user.id, "updated", "profile", current_user.id, "Profile")
@@ -155,6 +172,7 @@ async def upload_avatar(
     current_user.avatar_url = f"/uploads/{filename}"
     current_user.updated_at = datetime.now(timezone.utc)
     await db.commit()
+    await invalidate_cached_user(current_user.id)
     await db.refresh(current_user)
     
     await log_activity(db, current_user.id, "updated", "profile", current_user.id, "Avatar")
@@ -1,18 +1,23 @@
 """Activity, analytics, export, and dashboard routes."""
-from fastapi import APIRouter, Depends, Query, Response
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select
 from datetime import datetime, timezone, timedelta
 from typing import Optional, List
-import json
-import csv
-import io
 
 from database import get_db
-from models import User, Task, Note, Post, Tag, Activity
-from schemas import ActivityResponse, AnalyticsResponse, ExportRequest
-from auth import get_current_user
+from models import Activity, DailyActivityCount, ExportJob
+from schemas import ActivityResponse, AnalyticsResponse, ExportRequest, ExportJobResponse
+from auth import get_current_principal, Principal
+from replicas import get_read_db, read_engine_for
+from read_rows import select_rows, to_dtos, ActivityRow
+from serialization import list_response, activity_row
+from export import EXPORT_FORMATS, stream_export, export_entities, export_filename, export_media_type
+from export_jobs import enqueue_export_job, purge_expired_jobs, export_file_response
+from cache import dashboard_cache, analytics_cache, user_tag, activity_tag
+from versions import conditional_get, ANALYTICS_DEPS, DASHBOARD_DEPS
+from stats import get_user_stats, breakdown
 
 router = APIRouter()
 
@@ -20,112 +25,88 @@ router = APIRouter()
 
 @router.get("/activities", response_model=List[ActivityResponse])
 async def get_activities(
+    request: Request,
+    response: Response,
     limit: int = Query(50, le=100),
     entity_type: Optional[str] = Query(None),
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get activity timeline for current user."""
-    query = select(Activity).where(Activity.user_id == current_user.id)
+    query = select_rows(Activity, ActivityRow).where(Activity.user_id == current_user.id)
     
     if entity_type:
         query = query.where(Activity.entity_type == entity_type)
     
     query = query.order_by(Activity.created_at.desc()).limit(limit)
     result = await db.execute(query)
-    return result.scalars().all()
+    return list_response(request, response, to_dtos(result.all(), ActivityRow), activity_row)
 
 # ==================== ANALYTICS ====================
 
 @router.get("/analytics", response_model=AnalyticsResponse)
 async def get_analytics(
-    days: int = Query(30, le=365),
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    response: Response,
+    days: int = Query(30, ge=1, le=365),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get analytics data for current user."""
-    cutoff = min(days, 14)
-    start_date = datetime.now(timezone.utc) - timedelta(days=cutoff)
-    
-    # Tasks by status (1 query)
-    result = await db.execute(
-        select(Task.status, func.count(Task.id))
-        .where(Task.user_id == current_user.id)
-        .group_by(Task.status)
-    )
-    tasks_by_status = {r[0]: r[1] for r in result.all()}
-    
-    # Tasks by priority (1 query)
-    result = await db.execute(
-        select(Task.priority, func.count(Task.id))
-        .where(Task.user_id == current_user.id)
-        .group_by(Task.priority)
-    )
-    tasks_by_priority = {r[0]: r[1] for r in result.all()}
-    
-    # Notes by color (1 query)
-    result = await db.execute(
-        select(Note.color, func.count(Note.id))
-        .where(Note.user_id == current_user.id)
-        .group_by(Note.color)
-    )
-    notes_by_color = {r[0]: r[1] for r in result.all() if r[1] > 0}
-    
-    # Tasks completed over time (1 query)
-    result = await db.execute(
-        select(func.date(Activity.created_at), func.count(Activity.id))
-        .where(
-            Activity.user_id == current_user.id,
-            Activity.entity_type == "task",
-            Activity.action == "completed",
-            Activity.created_at >= start_date
-        )
-        .group_by(func.date(Activity.created_at))
-    )
-    completed_map = {str(r[0]): r[1] for r in result.all()}
-    tasks_completed_over_time = []
-    for i in range(cutoff - 1, -1, -1):
-        date = (datetime.now(timezone.utc).date() - timedelta(days=i)).isoformat()
-        tasks_completed_over_time.append({"date": date, "count": completed_map.get(date, 0)})
-    
-    # Posts published over time (1 query)
+    today = datetime.now(timezone.utc).date()
+    start_day = today - timedelta(days=days - 1)
+    
+    # The day window moves at midnight UTC even when nothing was written
+    not_modified = await conditional_get(request, response, db, current_user.id, ANALYTICS_DEPS, today)
+    if not_modified:
+        return not_modified
+    
+    # Keyed by the ETag, which covers the versions, days and date: analytics
+    # computed while a write commits land under the old versions' key
+    cache_key = f"{current_user.id}:{response.headers['ETag']}"
+    cached = await analytics_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    # Status, priority and color breakdowns from the counter rollup (1 query)
+    counters = await get_user_stats(db, current_user.id)
+    tasks_by_status = breakdown(counters, "tasks.status")
+    tasks_by_priority = breakdown(counters, "tasks.priority")
+    notes_by_color = breakdown(counters, "notes.color")
+    
+    # All three time series from the daily rollup (1 query)
     result = await db.execute(
-        select(func.date(Activity.created_at), func.count(Activity.id))
-        .where(
-            Activity.user_id == current_user.id,
-            Activity.entity_type == "post",
-            Activity.action == "published",
-            Activity.created_at >= start_date
+        select(
+            DailyActivityCount.day,
+            DailyActivityCount.entity_type,
+            DailyActivityCount.action,
+            DailyActivityCount.count,
         )
-        .group_by(func.date(Activity.created_at))
-    )
-    published_map = {str(r[0]): r[1] for r in result.all()}
-    posts_published_over_time = []
-    for i in range(cutoff - 1, -1, -1):
-        date = (datetime.now(timezone.utc).date() - timedelta(days=i)).isoformat()
-        posts_published_over_time.append({"date": date, "count": published_map.get(date, 0)})
-    
-    # Activity over time (1 query)
-    result = await db.execute(
-        select(func.date(Activity.created_at), func.count(Activity.id))
         .where(
-            Activity.user_id == current_user.id,
-            Activity.created_at >= start_date
+            DailyActivityCount.user_id == current_user.id,
+            DailyActivityCount.day >= start_day
         )
-        .group_by(func.date(Activity.created_at))
     )
-    activity_map = {str(r[0]): r[1] for r in result.all()}
-    activity_over_time = []
-    for i in range(cutoff - 1, -1, -1):
-        date = (datetime.now(timezone.utc).date() - timedelta(days=i)).isoformat()
-        activity_over_time.append({"date": date, "count": activity_map.get(date, 0)})
+    completed_map, published_map, activity_map = {}, {}, {}
+    for day, entity_type, action, count in result.all():
+        date = day.isoformat()
+        activity_map[date] = activity_map.get(date, 0) + count
+        if entity_type == "task" and action == "completed":
+            completed_map[date] = completed_map.get(date, 0) + count
+        elif entity_type == "post" and action == "published":
+            published_map[date] = published_map.get(date, 0) + count
+    
+    dates = [(today - timedelta(days=i)).isoformat() for i in range(days - 1, -1, -1)]
+    tasks_completed_over_time = [{"date": d, "count": completed_map.get(d, 0)} for d in dates]
+    posts_published_over_time = [{"date": d, "count": published_map.get(d, 0)} for d in dates]
+    activity_over_time = [{"date": d, "count": activity_map.get(d, 0)} for d in dates]
     
     # Productivity score
     total_tasks = sum(tasks_by_status.values())
     completed_tasks = tasks_by_status.get("completed", 0)
     productivity_score = int((completed_tasks / max(total_tasks, 1)) * 100)
     
-    return AnalyticsResponse(
+    analytics = AnalyticsResponse(
         tasks_by_status=tasks_by_status,
         tasks_by_priority=tasks_by_priority,
         tasks_completed_over_time=tasks_completed_over_time,
@@ -133,144 +114,138 @@ async def get_analytics(
         posts_published_over_time=posts_published_over_time,
         activity_over_time=activity_over_time,
         productivity_score=productivity_score
-    )
+    ).model_dump()
+    await analytics_cache.set(cache_key, analytics, tags=(user_tag(current_user.id), activity_tag(current_user.id)))
+    return analytics
 
 # ==================== EXPORT ====================
 
 @router.post("/export")
 async def export_data(
     export_req: ExportRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """Export user data in CSV, JSON or NDJSON format, optionally gzipped.
+
+    The body is streamed; the export holds its own session for the
+    duration of the stream rather than the request-scoped one.
+    """
+    bind = await read_engine_for(current_user.id)
+    return StreamingResponse(
+        stream_export(current_user.id, export_req.entity_type, export_req.format, export_req.gzip, bind),
+        media_type=export_media_type(export_req.format, export_req.gzip),
+        headers={"Content-Disposition": f"attachment; filename={export_filename(export_req.format, export_req.gzip)}"}
+    )
+
+def export_job_response(job: ExportJob) -> ExportJobResponse:
+    response = ExportJobResponse.model_validate(job)
+    if job.status == "completed":
+        response.download_url = f"/api/export/jobs/{job.id}/download"
+    return response
+
+
+async def get_user_export_job(db: AsyncSession, job_id: str, user_id: str) -> ExportJob:
+    result = await db.execute(
+        select(ExportJob).where(ExportJob.id == job_id, ExportJob.user_id == user_id)
+    )
+    job = result.scalar_one_or_none()
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+
+@router.post("/export/jobs", response_model=ExportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_export_job(
+    export_req: ExportRequest,
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    """Export user data in CSV or JSON format."""
-    data = {}
-    
-    if export_req.entity_type in ["tasks", "all"]:
-        result = await db.execute(
-            select(Task).options(selectinload(Task.tags)).where(Task.user_id == current_user.id)
-        )
-        tasks = result.scalars().all()
-        data["tasks"] = [{
-            "id": t.id,
-            "title": t.title,
-            "description": t.description,
-            "status": t.status,
-            "priority": t.priority,
-            "due_date": t.due_date.isoformat() if t.due_date else None,
-            "tags": [tag.name for tag in t.tags],
-            "created_at": t.created_at.isoformat(),
-            "updated_at": t.updated_at.isoformat()
-        } for t in tasks]
-    
-    if export_req.entity_type in ["notes", "all"]:
-        result = await db.execute(
-            select(Note).options(selectinload(Note.tags)).where(Note.user_id == current_user.id)
-        )
-        notes = result.scalars().all()
-        data["notes"] = [{
-            "id": n.id,
-            "title": n.title,
-            "content": n.content,
-            "color": n.color,
-            "is_pinned": n.is_pinned,
-            "tags": [tag.name for tag in n.tags],
-            "created_at": n.created_at.isoformat(),
-            "updated_at": n.updated_at.isoformat()
-        } for n in notes]
+    """Queue an export to be written in the background; poll the job for progress."""
+    if not export_entities(export_req.entity_type):
+        raise HTTPException(status_code=400, detail="Invalid entity type")
+    
+    await purge_expired_jobs(db, current_user.id)
+    job = ExportJob(
+        user_id=current_user.id,
+        entity_type=export_req.entity_type,
+        format=export_req.format if export_req.format in EXPORT_FORMATS else "csv",
+        gzip=export_req.gzip,
+        status="queued",
+        rows_done=0,
+        bytes_written=0,
+    )
+    db.add(job)
+    await db.commit()
     
-    if export_req.entity_type in ["posts", "all"]:
-        result = await db.execute(
-            select(Post).options(selectinload(Post.tags)).where(Post.user_id == current_user.id)
-        )
-        posts = result.scalars().all()
-        data["posts"] = [{
-            "id": p.id,
-            "title": p.title,
-            "content": p.content,
-            "is_published": p.is_published,
-            "published_at": p.published_at.isoformat() if p.published_at else None,
-            "tags": [tag.name for tag in p.tags],
-            "created_at": p.created_at.isoformat(),
-            "updated_at": p.updated_at.isoformat()
-        } for p in posts]
+    enqueue_export_job(job.id)
+    return export_job_response(job)
+
+
+@router.get("/export/jobs/{job_id}", response_model=ExportJobResponse)
+async def get_export_job(
+    job_id: str,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Report an export job's status and progress."""
+    job = await get_user_export_job(db, job_id, current_user.id)
+    return export_job_response(job)
+
+
+@router.get("/export/jobs/{job_id}/download")
+async def download_export_job(
+    job_id: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None, alias="If-Range"),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Download a finished export. Supports single byte ranges for resuming."""
+    job = await get_user_export_job(db, job_id, current_user.id)
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Export job is {job.status}")
     
-    if export_req.format == "json":
-        return Response(
-            content=json.dumps(data, indent=2),
-            media_type="application/json",
-            headers={"Content-Disposition": f"attachment; filename=flow_export.json"}
-        )
-    else:
-        output = io.StringIO()
-        for entity_type, items in data.items():
-            if items:
-                output.write(f"\n=== {entity_type.upper()} ===\n")
-                writer = csv.DictWriter(output, fieldnames=items[0].keys())
-                writer.writeheader()
-                for item in items:
-                    row = {k: (', '.join(v) if isinstance(v, list) else v) for k, v in item.items()}
-                    writer.writerow(row)
-        
-        return Response(
-            content=output.getvalue(),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename=flow_export.csv"}
-        )
+    return export_file_response(job, range_header, if_range)
 
 # ==================== DASHBOARD STATS ====================
 
 @router.get("/dashboard/stats")
 async def get_dashboard_stats(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get dashboard statistics for current user."""
-    result = await db.execute(
-        select(
-            func.count(Task.id),
-            func.count(Task.id).filter(Task.status == "completed"),
-            func.count(Task.id).filter(Task.status == "in_progress"),
-        ).where(Task.user_id == current_user.id)
-    )
-    task_total, task_completed, task_in_progress = result.one()
-    
-    result = await db.execute(
-        select(
-            func.count(Note.id),
-            func.count(Note.id).filter(Note.is_pinned == True),
-        ).where(Note.user_id == current_user.id)
-    )
-    note_total, note_pinned = result.one()
-    
-    result = await db.execute(
-        select(
-            func.count(Post.id),
-            func.count(Post.id).filter(Post.is_published == True),
-        ).where(Post.user_id == current_user.id)
-    )
-    post_total, post_published = result.one()
-    
-    tag_result = await db.execute(
-        select(func.count(Tag.id)).where(Tag.user_id == current_user.id)
-    )
-    tag_total = tag_result.scalar() or 0
-    
-    return {
+    not_modified = await conditional_get(request, response, db, current_user.id, DASHBOARD_DEPS)
+    if not_modified:
+        return not_modified
+    
+    # Keyed by the ETag, which covers the versions: stats read while a write
+    # commits are stored under the old versions' key, which no later read uses
+    cache_key = f"{current_user.id}:{response.headers['ETag']}"
+    cached = await dashboard_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
+    counters = await get_user_stats(db, current_user.id)
+    stats = {
         "tasks": {
-            "total": task_total or 0,
-            "completed": task_completed or 0,
-            "in_progress": task_in_progress or 0
+            "total": counters.get("tasks.total", 0),
+            "completed": counters.get("tasks.status:completed", 0),
+            "in_progress": counters.get("tasks.status:in_progress", 0)
         },
         "notes": {
-            "total": note_total or 0,
-            "pinned": note_pinned or 0
+            "total": counters.get("notes.total", 0),
+            "pinned": counters.get("notes.pinned", 0)
         },
         "posts": {
-            "total": post_total or 0,
-            "published": post_published or 0
+            "total": counters.get("posts.total", 0),
+            "published": counters.get("posts.published", 0)
         },
         "tags": {
-            "total": tag_total
+            "total": counters.get("tags.total", 0)
         }
     }
+    await dashboard_cache.set(cache_key, stats, tags=(user_tag(current_user.id),))
+    return stats
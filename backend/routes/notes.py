@@ -1,21 +1,35 @@
 """Note routes."""
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_
+from sqlalchemy import select, delete
 from sqlalchemy.orm import selectinload
 from datetime import datetime, timezone
 from typing import Optional, List
+from collections import Counter
 
 from database import get_db
-from models import User, Note, Tag, note_tags
-from schemas import NoteCreate, NoteUpdate, NoteResponse
-from auth import get_current_user
-from helpers import sanitize_search, log_activity
+from models import Note, note_tags
+from schemas import (
+    CountModeEnum, NoteCreate, NoteUpdate, NoteResponse,
+    NoteBulkRequest, BulkResponse, BulkItemResult,
+)
+from auth import get_current_principal, Principal
+from replicas import get_read_db
+from read_rows import select_rows, tag_list_join, to_dtos_with_tags, NoteRow
+from serialization import list_response, note_row
+from cache import invalidate_user_caches
+from versions import bump_version, conditional_get, NOTES_DEPS
+from stats import note_counters, counter_delta, negate, apply_stat_deltas
+from helpers import search_condition, log_activity, log_activities, paginate, set_entity_tags, set_tags_bulk
 
 router = APIRouter()
 
+# Sort order for list pages; the trailing id makes keyset cursors unambiguous
+NOTE_SORT_KEYS = [(Note.is_pinned, True), (Note.created_at, True), (Note.id, True)]
+
 @router.get("/notes", response_model=List[NoteResponse])
 async def get_notes(
+    request: Request,
     response: Response,
     search: Optional[str] = Query(None),
     is_pinned: Optional[bool] = Query(None),
@@ -23,20 +37,20 @@ async def get_notes(
     tag_id: Optional[str] = Query(None),
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    cursor: Optional[str] = Query(None),
+    count: CountModeEnum = Query(CountModeEnum.EXACT),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get all notes for current user with optional filters."""
-    query = select(Note).options(selectinload(Note.tags)).where(Note.user_id == current_user.id)
+    not_modified = await conditional_get(request, response, db, current_user.id, NOTES_DEPS)
+    if not_modified:
+        return not_modified
+    
+    query = select_rows(Note, NoteRow).where(Note.user_id == current_user.id)
     
     if search:
-        safe = sanitize_search(search)
-        query = query.where(
-            or_(
-                Note.title.ilike(f"%{safe}%"),
-                Note.content.ilike(f"%{safe}%")
-            )
-        )
+        query = query.where(search_condition(Note, search))
     if is_pinned is not None:
         query = query.where(Note.is_pinned == is_pinned)
     if color and color != 'all':
@@ -44,17 +58,15 @@ async def get_notes(
     if tag_id:
         query = query.join(note_tags).where(note_tags.c.tag_id == tag_id)
     
-    count_result = await db.execute(select(func.count()).select_from(query.subquery()))
-    response.headers["X-Total-Count"] = str(count_result.scalar() or 0)
-    
-    query = query.order_by(Note.is_pinned.desc(), Note.created_at.desc()).limit(limit).offset(offset)
-    result = await db.execute(query)
-    return result.scalars().all()
+    rows = await paginate(db, response, query, NOTE_SORT_KEYS, limit, offset, cursor, count, rows=True,
+                          page_query=tag_list_join(note_tags.c.note_id))
+    items = await to_dtos_with_tags(db, rows, NoteRow, note_tags.c.note_id)
+    return list_response(request, response, items, note_row)
 
 @router.post("/notes", response_model=NoteResponse, status_code=201)
 async def create_note(
     note_data: NoteCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Create a new note."""
@@ -68,21 +80,12 @@ async def create_note(
     db.add(note)
     await db.flush()
     
-    if note_data.tag_ids:
-        for tag_id in note_data.tag_ids:
-            result = await db.execute(
-                select(Tag).where(Tag.id == tag_id, Tag.user_id == current_user.id)
-            )
-            tag = result.scalar_one_or_none()
-            if tag:
-                note.tags.append(tag)
+    await set_entity_tags(db, note, note_tags.c.note_id, current_user.id, note_data.tag_ids or [], set())
     
+    await apply_stat_deltas(db, current_user.id, note_counters(note))
+    await bump_version(db, current_user.id, "notes")
     await db.commit()
-    
-    result = await db.execute(
-        select(Note).options(selectinload(Note.tags)).where(Note.id == note.id)
-    )
-    note = result.scalar_one()
+    await invalidate_user_caches(current_user.id)
     
     await log_activity(db, current_user.id, "created", "note", note.id, note.title)
     
@@ -91,7 +94,7 @@ async def create_note(
 @router.get("/notes/{note_id}", response_model=NoteResponse)
 async def get_note(
     note_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Get a specific note."""
@@ -103,64 +106,157 @@ async def get_note(
         raise HTTPException(status_code=404, detail="Note not found")
     return note
 
+def apply_note_update(note: Note, note_data: NoteUpdate) -> None:
+    """Copy the fields set on a NoteUpdate onto a note (tags excluded)."""
+    if note_data.title is not None:
+        note.title = note_data.title
+    if note_data.content is not None:
+        note.content = note_data.content
+    if note_data.color is not None:
+        note.color = note_data.color
+    if note_data.is_pinned is not None:
+        note.is_pinned = note_data.is_pinned
+
 @router.put("/notes/{note_id}", response_model=NoteResponse)
 async def update_note(
     note_id: str,
     note_data: NoteUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Update a note."""
     result = await db.execute(
-        select(Note).options(selectinload(Note.tags)).where(Note.id == note_id, Note.user_id == current_user.id)
+        select(Note).options(selectinload(Note.tags))
+        .where(Note.id == note_id, Note.user_id == current_user.id)
+        .with_for_update()
     )
     note = result.scalar_one_or_none()
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
     
-    if note_data.title is not None:
-        note.title = note_data.title
-    if note_data.content is not None:
-        note.content = note_data.content
-    if note_data.color is not None:
-        note.color = note_data.color
-    if note_data.is_pinned is not None:
-        note.is_pinned = note_data.is_pinned
+    old_counters = note_counters(note)
+    apply_note_update(note, note_data)
     
     if note_data.tag_ids is not None:
-        note.tags.clear()
-        for tag_id in note_data.tag_ids:
-            result = await db.execute(
-                select(Tag).where(Tag.id == tag_id, Tag.user_id == current_user.id)
-            )
-            tag = result.scalar_one_or_none()
-            if tag:
-                note.tags.append(tag)
+        await set_entity_tags(
+            db, note, note_tags.c.note_id, current_user.id, note_data.tag_ids,
+            existing_ids={tag.id for tag in note.tags}
+        )
     
+    await apply_stat_deltas(db, current_user.id, counter_delta(old_counters, note_counters(note)))
     note.updated_at = datetime.now(timezone.utc)
+    await bump_version(db, current_user.id, "notes")
     await db.commit()
+    await invalidate_user_caches(current_user.id)
     await db.refresh(note)
     
     await log_activity(db, current_user.id, "updated", "note", note.id, note.title)
     
     return note
 
+@router.post("/notes/bulk", response_model=BulkResponse)
+async def bulk_notes(
+    bulk_data: NoteBulkRequest,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create, update and delete many notes in a single transaction."""
+    results = BulkResponse()
+    deltas = Counter()
+    activities = []
+    tag_assignments = []
+    now = datetime.now(timezone.utc)
+    
+    if bulk_data.create:
+        created = [
+            Note(
+                user_id=current_user.id,
+                title=note_data.title,
+                content=note_data.content,
+                color=note_data.color,
+                is_pinned=note_data.is_pinned
+            )
+            for note_data in bulk_data.create
+        ]
+        db.add_all(created)
+        await db.flush()
+        for i, (note, note_data) in enumerate(zip(created, bulk_data.create)):
+            tag_assignments.append((note, note_data.tag_ids or [], set()))
+            deltas.update(note_counters(note))
+            activities.append(dict(action="created", entity_type="note", entity_id=note.id, entity_title=note.title))
+            results.created.append(BulkItemResult(index=i, id=note.id, ok=True))
+    
+    if bulk_data.update:
+        result = await db.execute(
+            select(Note).options(selectinload(Note.tags))
+            .where(Note.id.in_({item.id for item in bulk_data.update}), Note.user_id == current_user.id)
+            .with_for_update()
+        )
+        notes = {note.id: note for note in result.scalars().all()}
+        seen = set()
+        for i, note_data in enumerate(bulk_data.update):
+            note = notes.get(note_data.id)
+            if note is None or note_data.id in seen:
+                error = "Note not found" if note is None else "Duplicate id in request"
+                results.updated.append(BulkItemResult(index=i, id=note_data.id, ok=False, error=error))
+                continue
+            seen.add(note.id)
+            old_counters = note_counters(note)
+            apply_note_update(note, note_data)
+            note.updated_at = now
+            if note_data.tag_ids is not None:
+                tag_assignments.append((note, note_data.tag_ids, {tag.id for tag in note.tags}))
+            deltas.update(counter_delta(old_counters, note_counters(note)))
+            activities.append(dict(action="updated", entity_type="note", entity_id=note.id, entity_title=note.title))
+            results.updated.append(BulkItemResult(index=i, id=note.id, ok=True))
+    
+    await set_tags_bulk(db, note_tags.c.note_id, current_user.id, tag_assignments)
+    await db.flush()
+    
+    if bulk_data.delete:
+        result = await db.execute(
+            delete(Note)
+            .where(Note.id.in_(set(bulk_data.delete)), Note.user_id == current_user.id)
+            .returning(Note.id, Note.title, Note.is_pinned, Note.color)
+        )
+        deleted = {row.id: row for row in result.all()}
+        for row in deleted.values():
+            deltas.update(negate(note_counters(row)))
+            activities.append(dict(action="deleted", entity_type="note", entity_id=row.id, entity_title=row.title))
+        for i, note_id in enumerate(bulk_data.delete):
+            if note_id in deleted:
+                results.deleted.append(BulkItemResult(index=i, id=note_id, ok=True))
+            else:
+                results.deleted.append(BulkItemResult(index=i, id=note_id, ok=False, error="Note not found"))
+    
+    await apply_stat_deltas(db, current_user.id, deltas)
+    await bump_version(db, current_user.id, "notes")
+    await db.commit()
+    await invalidate_user_caches(current_user.id)
+    
+    await log_activities(db, current_user.id, activities)
+    
+    return results
+
 @router.delete("/notes/{note_id}", status_code=204)
 async def delete_note(
     note_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Delete a note."""
     result = await db.execute(
-        select(Note).where(Note.id == note_id, Note.user_id == current_user.id)
+        select(Note).where(Note.id == note_id, Note.user_id == current_user.id).with_for_update()
     )
     note = result.scalar_one_or_none()
     if not note:
         raise HTTPException(status_code=404, detail="Note not found")
     
     note_title = note.title
+    await apply_stat_deltas(db, current_user.id, negate(note_counters(note)))
     await db.delete(note)
+    await bump_version(db, current_user.id, "notes")
     await db.commit()
+    await invalidate_user_caches(current_user.id)
     
     await log_activity(db, current_user.id, "deleted", "note", note_id, note_title)
@@ -1,57 +1,69 @@
 """Post routes."""
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_
+from sqlalchemy import select, delete
 from sqlalchemy.orm import selectinload
 from datetime import datetime, timezone
 from typing import Optional, List
+from collections import Counter
 
 from database import get_db
-from models import User, Post, Tag, post_tags
-from schemas import PostCreate, PostUpdate, PostResponse
-from auth import get_current_user
-from helpers import sanitize_search, log_activity
+from models import Post, post_tags
+from schemas import (
+    CountModeEnum, PostCreate, PostUpdate, PostResponse,
+    PostBulkRequest, BulkResponse, BulkItemResult,
+)
+from auth import get_current_principal, Principal
+from replicas import get_read_db
+from read_rows import select_rows, tag_list_join, to_dtos_with_tags, PostRow
+from serialization import list_response, post_row
+from cache import invalidate_user_caches
+from versions import bump_version, conditional_get, POSTS_DEPS
+from stats import post_counters, counter_delta, negate, apply_stat_deltas
+from helpers import search_condition, log_activity, log_activities, paginate, set_entity_tags, set_tags_bulk
 
 router = APIRouter()
 
+# Sort order for list pages; the trailing id makes keyset cursors unambiguous
+POST_SORT_KEYS = [(Post.created_at, True), (Post.id, True)]
+
 @router.get("/posts", response_model=List[PostResponse])
 async def get_posts(
+    request: Request,
     response: Response,
     search: Optional[str] = Query(None),
     is_published: Optional[bool] = Query(None),
     tag_id: Optional[str] = Query(None),
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    cursor: Optional[str] = Query(None),
+    count: CountModeEnum = Query(CountModeEnum.EXACT),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get all posts for current user with optional filters."""
-    query = select(Post).options(selectinload(Post.tags)).where(Post.user_id == current_user.id)
+    not_modified = await conditional_get(request, response, db, current_user.id, POSTS_DEPS)
+    if not_modified:
+        return not_modified
+    
+    query = select_rows(Post, PostRow).where(Post.user_id == current_user.id)
     
     if search:
-        safe = sanitize_search(search)
-        query = query.where(
-            or_(
-                Post.title.ilike(f"%{safe}%"),
-                Post.content.ilike(f"%{safe}%")
-            )
-        )
+        query = query.where(search_condition(Post, search))
     if is_published is not None:
         query = query.where(Post.is_published == is_published)
     if tag_id:
         query = query.join(post_tags).where(post_tags.c.tag_id == tag_id)
     
-    count_result = await db.execute(select(func.count()).select_from(query.subquery()))
-    response.headers["X-Total-Count"] = str(count_result.scalar() or 0)
-    
-    query = query.order_by(Post.created_at.desc()).limit(limit).offset(offset)
-    result = await db.execute(query)
-    return result.scalars().all()
+    rows = await paginate(db, response, query, POST_SORT_KEYS, limit, offset, cursor, count, rows=True,
+                          page_query=tag_list_join(post_tags.c.post_id))
+    items = await to_dtos_with_tags(db, rows, PostRow, post_tags.c.post_id)
+    return list_response(request, response, items, post_row)
 
 @router.post("/posts", response_model=PostResponse, status_code=201)
 async def create_post(
     post_data: PostCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Create a new post."""
@@ -65,21 +77,12 @@ async def create_post(
     db.add(post)
     await db.flush()
     
-    if post_data.tag_ids:
-        for tag_id in post_data.tag_ids:
-            result = await db.execute(
-                select(Tag).where(Tag.id == tag_id, Tag.user_id == current_user.id)
-            )
-            tag = result.scalar_one_or_none()
-            if tag:
-                post.tags.append(tag)
+    await set_entity_tags(db, post, post_tags.c.post_id, current_user.id, post_data.tag_ids or [], set())
     
+    await apply_stat_deltas(db, current_user.id, post_counters(post))
+    await bump_version(db, current_user.id, "posts")
     await db.commit()
-    
-    result = await db.execute(
-        select(Post).options(selectinload(Post.tags)).where(Post.id == post.id)
-    )
-    post = result.scalar_one()
+    await invalidate_user_caches(current_user.id)
     
     action = "published" if post.is_published else "created"
     await log_activity(db, current_user.id, action, "post", post.id, post.title)
@@ -89,7 +92,7 @@ async def create_post(
 @router.get("/posts/{post_id}", response_model=PostResponse)
 async def get_post(
     post_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Get a specific post."""
@@ -101,44 +104,49 @@ async def get_post(
         raise HTTPException(status_code=404, detail="Post not found")
     return post
 
+def apply_post_update(post: Post, post_data: PostUpdate) -> None:
+    """Copy the fields set on a PostUpdate onto a post (tags excluded)."""
+    if post_data.title is not None:
+        post.title = post_data.title
+    if post_data.content is not None:
+        post.content = post_data.content
+    if post_data.is_published is not None:
+        post.is_published = post_data.is_published
+        if post_data.is_published and not post.published_at:
+            post.published_at = datetime.now(timezone.utc)
+
 @router.put("/posts/{post_id}", response_model=PostResponse)
 async def update_post(
     post_id: str,
     post_data: PostUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Update a post."""
     result = await db.execute(
-        select(Post).options(selectinload(Post.tags)).where(Post.id == post_id, Post.user_id == current_user.id)
+        select(Post).options(selectinload(Post.tags))
+        .where(Post.id == post_id, Post.user_id == current_user.id)
+        .with_for_update()
     )
     post = result.scalar_one_or_none()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
+    old_counters = post_counters(post)
     was_published = post.is_published
-    
-    if post_data.title is not None:
-        post.title = post_data.title
-    if post_data.content is not None:
-        post.content = post_data.content
-    if post_data.is_published is not None:
-        post.is_published = post_data.is_published
-        if post_data.is_published and not post.published_at:
-            post.published_at = datetime.now(timezone.utc)
+    apply_post_update(post, post_data)
     
     if post_data.tag_ids is not None:
-        post.tags.clear()
-        for tag_id in post_data.tag_ids:
-            result = await db.execute(
-                select(Tag).where(Tag.id == tag_id, Tag.user_id == current_user.id)
-            )
-            tag = result.scalar_one_or_none()
-            if tag:
-                post.tags.append(tag)
+        await set_entity_tags(
+            db, post, post_tags.c.post_id, current_user.id, post_data.tag_ids,
+            existing_ids={tag.id for tag in post.tags}
+        )
     
+    await apply_stat_deltas(db, current_user.id, counter_delta(old_counters, post_counters(post)))
     post.updated_at = datetime.now(timezone.utc)
+    await bump_version(db, current_user.id, "posts")
     await db.commit()
+    await invalidate_user_caches(current_user.id)
     await db.refresh(post)
     
     if not was_published and post.is_published:
@@ -148,22 +156,112 @@ async def update_post(
     
     return post
 
+@router.post("/posts/bulk", response_model=BulkResponse)
+async def bulk_posts(
+    bulk_data: PostBulkRequest,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create, update and delete many posts in a single transaction."""
+    results = BulkResponse()
+    deltas = Counter()
+    activities = []
+    tag_assignments = []
+    now = datetime.now(timezone.utc)
+    
+    if bulk_data.create:
+        created = [
+            Post(
+                user_id=current_user.id,
+                title=post_data.title,
+                content=post_data.content,
+                is_published=post_data.is_published,
+                published_at=now if post_data.is_published else None
+            )
+            for post_data in bulk_data.create
+        ]
+        db.add_all(created)
+        await db.flush()
+        for i, (post, post_data) in enumerate(zip(created, bulk_data.create)):
+            tag_assignments.append((post, post_data.tag_ids or [], set()))
+            deltas.update(post_counters(post))
+            action = "published" if post.is_published else "created"
+            activities.append(dict(action=action, entity_type="post", entity_id=post.id, entity_title=post.title))
+            results.created.append(BulkItemResult(index=i, id=post.id, ok=True))
+    
+    if bulk_data.update:
+        result = await db.execute(
+            select(Post).options(selectinload(Post.tags))
+            .where(Post.id.in_({item.id for item in bulk_data.update}), Post.user_id == current_user.id)
+            .with_for_update()
+        )
+        posts = {post.id: post for post in result.scalars().all()}
+        seen = set()
+        for i, post_data in enumerate(bulk_data.update):
+            post = posts.get(post_data.id)
+            if post is None or post_data.id in seen:
+                error = "Post not found" if post is None else "Duplicate id in request"
+                results.updated.append(BulkItemResult(index=i, id=post_data.id, ok=False, error=error))
+                continue
+            seen.add(post.id)
+            old_counters = post_counters(post)
+            was_published = post.is_published
+            apply_post_update(post, post_data)
+            post.updated_at = now
+            if post_data.tag_ids is not None:
+                tag_assignments.append((post, post_data.tag_ids, {tag.id for tag in post.tags}))
+            deltas.update(counter_delta(old_counters, post_counters(post)))
+            action = "published" if not was_published and post.is_published else "updated"
+            activities.append(dict(action=action, entity_type="post", entity_id=post.id, entity_title=post.title))
+            results.updated.append(BulkItemResult(index=i, id=post.id, ok=True))
+    
+    await set_tags_bulk(db, post_tags.c.post_id, current_user.id, tag_assignments)
+    await db.flush()
+    
+    if bulk_data.delete:
+        result = await db.execute(
+            delete(Post)
+            .where(Post.id.in_(set(bulk_data.delete)), Post.user_id == current_user.id)
+            .returning(Post.id, Post.title, Post.is_published)
+        )
+        deleted = {row.id: row for row in result.all()}
+        for row in deleted.values():
+            deltas.update(negate(post_counters(row)))
+            activities.append(dict(action="deleted", entity_type="post", entity_id=row.id, entity_title=row.title))
+        for i, post_id in enumerate(bulk_data.delete):
+            if post_id in deleted:
+                results.deleted.append(BulkItemResult(index=i, id=post_id, ok=True))
+            else:
+                results.deleted.append(BulkItemResult(index=i, id=post_id, ok=False, error="Post not found"))
+    
+    await apply_stat_deltas(db, current_user.id, deltas)
+    await bump_version(db, current_user.id, "posts")
+    await db.commit()
+    await invalidate_user_caches(current_user.id)
+    
+    await log_activities(db, current_user.id, activities)
+    
+    return results
+
 @router.delete("/posts/{post_id}", status_code=204)
 async def delete_post(
     post_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Delete a post."""
     result = await db.execute(
-        select(Post).where(Post.id == post_id, Post.user_id == current_user.id)
+        select(Post).where(Post.id == post_id, Post.user_id == current_user.id).with_for_update()
     )
     post = result.scalar_one_or_none()
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
     
     post_title = post.title
+    await apply_stat_deltas(db, current_user.id, negate(post_counters(post)))
     await db.delete(post)
+    await bump_version(db, current_user.id, "posts")
     await db.commit()
+    await invalidate_user_caches(current_user.id)
     
     await log_activity(db, current_user.id, "deleted", "post", post_id, post_title)
@@ -0,0 +1,69 @@
+"""Full-text search across tasks, notes and posts."""
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, literal, union_all
+from typing import Optional, List
+
+from database import get_db
+from models import Task, Note, Post, SEARCH_CONFIG
+from schemas import SearchResult
+from auth import get_current_principal, Principal
+from helpers import prefix_tsquery
+
+router = APIRouter()
+
+# entity_type -> (model, body column used for snippets)
+SEARCHABLE = {
+    "task": (Task, Task.description),
+    "note": (Note, Note.content),
+    "post": (Post, Post.content),
+}
+
+@router.get("/search", response_model=List[SearchResult])
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    types: Optional[str] = Query(None, description="Comma-separated subset of task,note,post"),
+    limit: int = Query(20, ge=1, le=50),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Search the current user's tasks, notes and posts, best matches first."""
+    tsquery_text = prefix_tsquery(q)
+    wanted = {t.strip() for t in types.split(",")} if types else set(SEARCHABLE)
+    if not tsquery_text or not wanted & set(SEARCHABLE):
+        return []
+    tsquery = func.to_tsquery(SEARCH_CONFIG, tsquery_text)
+    
+    matches = union_all(*[
+        select(
+            literal(entity_type).label("entity_type"),
+            model.id,
+            model.title,
+            body.label("body"),
+            model.updated_at,
+            func.ts_rank_cd(model.search_vector, tsquery).label("rank"),
+        ).where(model.user_id == current_user.id, model.search_vector.op("@@")(tsquery))
+        for entity_type, (model, body) in SEARCHABLE.items() if entity_type in wanted
+    ]).subquery()
+    
+    # Rank and limit first so snippets are only built for the returned rows
+    top = (
+        select(matches)
+        .order_by(matches.c.rank.desc(), matches.c.updated_at.desc())
+        .limit(limit)
+        .subquery()
+    )
+    result = await db.execute(
+        select(
+            top.c.entity_type,
+            top.c.id,
+            top.c.title,
+            func.ts_headline(
+                SEARCH_CONFIG, func.coalesce(top.c.body, ""), tsquery,
+                "MaxFragments=1, MaxWords=30, MinWords=10"
+            ).label("snippet"),
+            top.c.rank,
+            top.c.updated_at,
+        ).order_by(top.c.rank.desc(), top.c.updated_at.desc())
+    )
+    return [SearchResult(**row._mapping) for row in result.all()]
@@ -1,23 +1,32 @@
 """Tag routes."""
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from datetime import datetime, timezone
 from typing import List
 
 from database import get_db
-from models import User, Tag
+from models import Tag
 from schemas import TagCreate, TagUpdate, TagResponse
-from auth import get_current_user
+from auth import get_current_principal, Principal
+from cache import invalidate_user_caches
+from versions import bump_version, conditional_get, TAGS_DEPS
+from stats import tag_counters, negate, apply_stat_deltas
 
 router = APIRouter()
 
 @router.get("/tags", response_model=List[TagResponse])
 async def get_tags(
-    current_user: User = Depends(get_current_user),
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Get all tags for current user."""
+    not_modified = await conditional_get(request, response, db, current_user.id, TAGS_DEPS)
+    if not_modified:
+        return not_modified
+    
     result = await db.execute(
         select(Tag).where(Tag.user_id == current_user.id).order_by(Tag.name)
     )
@@ -26,7 +35,7 @@ async def get_tags(
 @router.post("/tags", response_model=TagResponse, status_code=status.HTTP_201_CREATED)
 async def create_tag(
     tag_data: TagCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Create a new tag."""
@@ -45,7 +54,10 @@ async def create_tag(
         color=tag_data.color or "#6366f1"
     )
     db.add(tag)
+    await apply_stat_deltas(db, current_user.id, tag_counters(tag))
+    await bump_version(db, current_user.id, "tags")
     await db.commit()
+    await invalidate_user_caches(current_user.id)
     await db.refresh(tag)
     return tag
 
@@ -53,7 +65,7 @@ async def create_tag(
 async def update_tag(
     tag_id: str,
     tag_data: TagUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Update a tag."""
@@ -78,6 +90,7 @@ async def update_tag(
         tag.color = tag_data.color
     
     tag.updated_at = datetime.now(timezone.utc)
+    await bump_version(db, current_user.id, "tags")
     await db.commit()
     await db.refresh(tag)
     return tag
@@ -85,7 +98,7 @@ async def update_tag(
 @router.delete("/tags/{tag_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_tag(
     tag_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Delete a tag."""
@@ -96,5 +109,8 @@ async def delete_tag(
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
     
+    await apply_stat_deltas(db, current_user.id, negate(tag_counters(tag)))
     await db.delete(tag)
+    await bump_version(db, current_user.id, "tags")
     await db.commit()
+    await invalidate_user_caches(current_user.id)
@@ -1,21 +1,37 @@
 """Task routes."""
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, or_, case, update
+from sqlalchemy import select, case, update, delete
 from sqlalchemy.orm import selectinload
 from datetime import datetime, timezone
 from typing import Optional, List
+from collections import Counter
 
 from database import get_db
-from models import User, Task, Tag, task_tags
-from schemas import TaskCreate, TaskUpdate, TaskResponse, TaskStatusEnum, TaskPriorityEnum, TaskReorder
-from auth import get_current_user
-from helpers import sanitize_search, log_activity
+from models import Task, task_tags
+from schemas import (
+    CountModeEnum, TaskCreate, TaskUpdate, TaskResponse, TaskStatusEnum, TaskPriorityEnum, TaskReorder,
+    TaskMove, TaskMoveResponse,
+    TaskBulkRequest, BulkResponse, BulkItemResult,
+)
+from auth import get_current_principal, Principal
+from replicas import get_read_db
+from read_rows import select_rows, tag_list_join, to_dtos_with_tags, TaskRow
+from serialization import list_response, task_row
+from cache import invalidate_user_caches
+from ranking import append_rank, needs_rebalance, rank_between, schedule_rebalance
+from versions import bump_version, conditional_get, TASKS_DEPS
+from stats import task_counters, counter_delta, negate, apply_stat_deltas
+from helpers import search_condition, log_activity, log_activities, paginate, set_entity_tags, set_tags_bulk
 
 router = APIRouter()
 
+# Sort order for list pages; the trailing id makes keyset cursors unambiguous
+TASK_SORT_KEYS = [(Task.rank, False), (Task.created_at, True), (Task.id, True)]
+
 @router.get("/tasks", response_model=List[TaskResponse])
 async def get_tasks(
+    request: Request,
     response: Response,
     search: Optional[str] = Query(None),
     status: Optional[TaskStatusEnum] = Query(None),
@@ -23,20 +39,20 @@ async def get_tasks(
     tag_id: Optional[str] = Query(None),
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    cursor: Optional[str] = Query(None),
+    count: CountModeEnum = Query(CountModeEnum.EXACT),
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get all tasks for current user with optional filters."""
-    query = select(Task).options(selectinload(Task.tags)).where(Task.user_id == current_user.id)
+    not_modified = await conditional_get(request, response, db, current_user.id, TASKS_DEPS)
+    if not_modified:
+        return not_modified
+    
+    query = select_rows(Task, TaskRow).where(Task.user_id == current_user.id)
     
     if search:
-        safe = sanitize_search(search)
-        query = query.where(
-            or_(
-                Task.title.ilike(f"%{safe}%"),
-                Task.description.ilike(f"%{safe}%")
-            )
-        )
+        query = query.where(search_condition(Task, search))
     if status:
         query = query.where(Task.status == status.value)
     if priority:
@@ -44,26 +60,18 @@ async def get_tasks(
     if tag_id:
         query = query.join(task_tags).where(task_tags.c.tag_id == tag_id)
     
-    # Total count for pagination
-    count_result = await db.execute(select(func.count()).select_from(query.subquery()))
-    response.headers["X-Total-Count"] = str(count_result.scalar() or 0)
-    
-    query = query.order_by(Task.position, Task.created_at.desc()).limit(limit).offset(offset)
-    result = await db.execute(query)
-    return result.scalars().all()
+    rows = await paginate(db, response, query, TASK_SORT_KEYS, limit, offset, cursor, count, rows=True,
+                          page_query=tag_list_join(task_tags.c.task_id))
+    items = await to_dtos_with_tags(db, rows, TaskRow, task_tags.c.task_id)
+    return list_response(request, response, items, task_row)
 
 @router.post("/tasks", response_model=TaskResponse, status_code=201)
 async def create_task(
     task_data: TaskCreate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Create a new task."""
-    result = await db.execute(
-        select(func.max(Task.position)).where(Task.user_id == current_user.id)
-    )
-    max_pos = result.scalar() or 0
-    
     task = Task(
         user_id=current_user.id,
         title=task_data.title,
@@ -71,26 +79,17 @@ async def create_task(
         status=task_data.status.value,
         priority=task_data.priority.value,
         due_date=task_data.due_date,
-        position=max_pos + 1
+        rank=append_rank(datetime.now(timezone.utc))
     )
     db.add(task)
     await db.flush()
     
-    if task_data.tag_ids:
-        for tag_id in task_data.tag_ids:
-            result = await db.execute(
-                select(Tag).where(Tag.id == tag_id, Tag.user_id == current_user.id)
-            )
-            tag = result.scalar_one_or_none()
-            if tag:
-                task.tags.append(tag)
+    await set_entity_tags(db, task, task_tags.c.task_id, current_user.id, task_data.tag_ids or [], set())
     
+    await apply_stat_deltas(db, current_user.id, task_counters(task))
+    await bump_version(db, current_user.id, "tasks")
     await db.commit()
-    
-    result = await db.execute(
-        select(Task).options(selectinload(Task.tags)).where(Task.id == task.id)
-    )
-    task = result.scalar_one()
+    await invalidate_user_caches(current_user.id)
     
     await log_activity(db, current_user.id, "created", "task", task.id, task.title)
     
@@ -99,7 +98,7 @@ async def create_task(
 @router.get("/tasks/{task_id}", response_model=TaskResponse)
 async def get_task(
     task_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Get a specific task."""
@@ -111,48 +110,51 @@ async def get_task(
         raise HTTPException(status_code=404, detail="Task not found")
     return task
 
+def apply_task_update(task: Task, task_data: TaskUpdate) -> None:
+    """Copy the fields set on a TaskUpdate onto a task (tags excluded)."""
+    if task_data.title is not None:
+        task.title = task_data.title
+    if task_data.description is not None:
+        task.description = task_data.description
+    if task_data.status is not None:
+        task.status = task_data.status.value
+    if task_data.priority is not None:
+        task.priority = task_data.priority.value
+    if task_data.due_date is not None:
+        task.due_date = task_data.due_date
+
 @router.put("/tasks/{task_id}", response_model=TaskResponse)
 async def update_task(
     task_id: str,
     task_data: TaskUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Update a task."""
     result = await db.execute(
-        select(Task).options(selectinload(Task.tags)).where(Task.id == task_id, Task.user_id == current_user.id)
+        select(Task).options(selectinload(Task.tags))
+        .where(Task.id == task_id, Task.user_id == current_user.id)
+        .with_for_update()
     )
     task = result.scalar_one_or_none()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    old_counters = task_counters(task)
     old_status = task.status
-    
-    if task_data.title is not None:
-        task.title = task_data.title
-    if task_data.description is not None:
-        task.description = task_data.description
-    if task_data.status is not None:
-        task.status = task_data.status.value
-    if task_data.priority is not None:
-        task.priority = task_data.priority.value
-    if task_data.due_date is not None:
-        task.due_date = task_data.due_date
-    if task_data.position is not None:
-        task.position = task_data.position
+    apply_task_update(task, task_data)
     
     if task_data.tag_ids is not None:
-        task.tags.clear()
-        for tag_id in task_data.tag_ids:
-            result = await db.execute(
-                select(Tag).where(Tag.id == tag_id, Tag.user_id == current_user.id)
-            )
-            tag = result.scalar_one_or_none()
-            if tag:
-                task.tags.append(tag)
+        await set_entity_tags(
+            db, task, task_tags.c.task_id, current_user.id, task_data.tag_ids,
+            existing_ids={tag.id for tag in task.tags}
+        )
     
+    await apply_stat_deltas(db, current_user.id, counter_delta(old_counters, task_counters(task)))
     task.updated_at = datetime.now(timezone.utc)
+    await bump_version(db, current_user.id, "tasks")
     await db.commit()
+    await invalidate_user_caches(current_user.id)
     await db.refresh(task)
     
     if old_status != task.status and task.status == "completed":
@@ -162,41 +164,184 @@ async def update_task(
     
     return task
 
-@router.post("/tasks/reorder")
+@router.post("/tasks/{task_id}/move", response_model=TaskMoveResponse)
+async def move_task(
+    task_id: str,
+    move_data: TaskMove,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Move a task between two neighbours, rewriting only its own rank."""
+    if move_data.before_id is None and move_data.after_id is None:
+        raise HTTPException(status_code=400, detail="before_id or after_id is required")
+    if task_id in (move_data.before_id, move_data.after_id):
+        raise HTTPException(status_code=400, detail="A task can't be moved next to itself")
+    
+    ids = {task_id, move_data.before_id, move_data.after_id} - {None}
+    result = await db.execute(
+        select(Task.id, Task.rank)
+        .where(Task.id.in_(ids), Task.user_id == current_user.id)
+        .with_for_update()
+    )
+    ranks = dict(result.all())
+    if ids - ranks.keys():
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    before, after = ranks.get(move_data.before_id), ranks.get(move_data.after_id)
+    try:
+        rank = rank_between(before, after)
+    except ValueError:
+        # The client's list is stale, or the neighbours share a rank that only a rebalance can split
+        if before == after:
+            schedule_rebalance(current_user.id)
+        raise HTTPException(status_code=409, detail="Task order has changed, refresh and try again")
+    
+    await db.execute(update(Task).where(Task.id == task_id).values(rank=rank))
+    await bump_version(db, current_user.id, "tasks")
+    await db.commit()
+    
+    if needs_rebalance(rank):
+        schedule_rebalance(current_user.id)
+    return {"id": task_id, "rank": rank}
+
+@router.post("/tasks/reorder", deprecated=True)
 async def reorder_tasks(
     reorder_data: TaskReorder,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
-    """Reorder tasks by updating their positions."""
+    """Reorder tasks by swapping their ranks around; use POST /tasks/{id}/move instead.
+    
+    The listed tasks take their own ranks in the given order, so they keep
+    their place among the tasks that weren't listed.
+    """
     if reorder_data.task_ids:
-        whens = {tid: idx for idx, tid in enumerate(reorder_data.task_ids)}
+        result = await db.execute(
+            select(Task.id, Task.rank)
+            .where(Task.id.in_(reorder_data.task_ids), Task.user_id == current_user.id)
+            .with_for_update()
+        )
+        ranks = dict(result.all())
+        task_ids = [tid for tid in dict.fromkeys(reorder_data.task_ids) if tid in ranks]
+        whens = dict(zip(task_ids, sorted(ranks.values())))
         stmt = (
             update(Task)
-            .where(Task.id.in_(reorder_data.task_ids), Task.user_id == current_user.id)
-            .values(position=case(whens, value=Task.id))
+            .where(Task.id.in_(task_ids), Task.user_id == current_user.id)
+            .values(rank=case(whens, value=Task.id))
         )
         await db.execute(stmt)
     
+    await bump_version(db, current_user.id, "tasks")
     await db.commit()
     return {"message": "Tasks reordered successfully"}
 
+@router.post("/tasks/bulk", response_model=BulkResponse)
+async def bulk_tasks(
+    bulk_data: TaskBulkRequest,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create, update and delete many tasks in a single transaction."""
+    results = BulkResponse()
+    deltas = Counter()
+    activities = []
+    tag_assignments = []
+    now = datetime.now(timezone.utc)
+    
+    if bulk_data.create:
+        created = [
+            Task(
+                user_id=current_user.id,
+                title=task_data.title,
+                description=task_data.description,
+                status=task_data.status.value,
+                priority=task_data.priority.value,
+                due_date=task_data.due_date,
+                rank=append_rank(now, offset=i)
+            )
+            for i, task_data in enumerate(bulk_data.create)
+        ]
+        db.add_all(created)
+        await db.flush()
+        for i, (task, task_data) in enumerate(zip(created, bulk_data.create)):
+            tag_assignments.append((task, task_data.tag_ids or [], set()))
+            deltas.update(task_counters(task))
+            activities.append(dict(action="created", entity_type="task", entity_id=task.id, entity_title=task.title))
+            results.created.append(BulkItemResult(index=i, id=task.id, ok=True))
+    
+    if bulk_data.update:
+        result = await db.execute(
+            select(Task).options(selectinload(Task.tags))
+            .where(Task.id.in_({item.id for item in bulk_data.update}), Task.user_id == current_user.id)
+            .with_for_update()
+        )
+        tasks = {task.id: task for task in result.scalars().all()}
+        seen = set()
+        for i, task_data in enumerate(bulk_data.update):
+            task = tasks.get(task_data.id)
+            if task is None or task_data.id in seen:
+                error = "Task not found" if task is None else "Duplicate id in request"
+                results.updated.append(BulkItemResult(index=i, id=task_data.id, ok=False, error=error))
+                continue
+            seen.add(task.id)
+            old_counters = task_counters(task)
+            old_status = task.status
+            apply_task_update(task, task_data)
+            task.updated_at = now
+            if task_data.tag_ids is not None:
+                tag_assignments.append((task, task_data.tag_ids, {tag.id for tag in task.tags}))
+            deltas.update(counter_delta(old_counters, task_counters(task)))
+            action = "completed" if old_status != task.status and task.status == "completed" else "updated"
+            activities.append(dict(action=action, entity_type="task", entity_id=task.id, entity_title=task.title))
+            results.updated.append(BulkItemResult(index=i, id=task.id, ok=True))
+    
+    await set_tags_bulk(db, task_tags.c.task_id, current_user.id, tag_assignments)
+    await db.flush()
+    
+    if bulk_data.delete:
+        result = await db.execute(
+            delete(Task)
+            .where(Task.id.in_(set(bulk_data.delete)), Task.user_id == current_user.id)
+            .returning(Task.id, Task.title, Task.status, Task.priority)
+        )
+        deleted = {row.id: row for row in result.all()}
+        for row in deleted.values():
+            deltas.update(negate(task_counters(row)))
+            activities.append(dict(action="deleted", entity_type="task", entity_id=row.id, entity_title=row.title))
+        for i, task_id in enumerate(bulk_data.delete):
+            if task_id in deleted:
+                results.deleted.append(BulkItemResult(index=i, id=task_id, ok=True))
+            else:
+                results.deleted.append(BulkItemResult(index=i, id=task_id, ok=False, error="Task not found"))
+    
+    await apply_stat_deltas(db, current_user.id, deltas)
+    await bump_version(db, current_user.id, "tasks")
+    await db.commit()
+    await invalidate_user_caches(current_user.id)
+    
+    await log_activities(db, current_user.id, activities)
+    
+    return results
+
 @router.delete("/tasks/{task_id}", status_code=204)
 async def delete_task(
     task_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
     db: AsyncSession = Depends(get_db)
 ):
     """Delete a task."""
     result = await db.execute(
-        select(Task).where(Task.id == task_id, Task.user_id == current_user.id)
+        select(Task).where(Task.id == task_id, Task.user_id == current_user.id).with_for_update()
     )
     task = result.scalar_one_or_none()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     
     task_title = task.title
+    await apply_stat_deltas(db, current_user.id, negate(task_counters(task)))
     await db.delete(task)
+    await bump_version(db, current_user.id, "tasks")
     await db.commit()
+    await invalidate_user_caches(current_user.id)
     
     await log_activity(db, current_user.id, "deleted", "task", task_id, task_title)
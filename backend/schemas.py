@@ -14,6 +14,11 @@ class TaskPriorityEnum(str, Enum):
     MEDIUM = "medium"
     HIGH = "high"
 
+class CountModeEnum(str, Enum):
+    EXACT = "exact"
+    ESTIMATED = "estimated"
+    NONE = "none"
+
 # Auth Schemas
 class UserRegister(BaseModel):
     email: EmailStr
@@ -89,7 +94,6 @@ class TaskUpdate(BaseModel):
     status: Optional[TaskStatusEnum] = None
     priority: Optional[TaskPriorityEnum] = None
     due_date: Optional[datetime] = None
-    position: Optional[int] = None
     tag_ids: Optional[List[str]] = None
 
 class TaskResponse(BaseModel):
@@ -102,7 +106,7 @@ class TaskResponse(BaseModel):
     status: str
     priority: str
     due_date: Optional[datetime] = None
-    position: Optional[int] = 0
+    rank: str
     tags: List[TagResponse] = []
     created_at: datetime
     updated_at: datetime
@@ -110,6 +114,14 @@ class TaskResponse(BaseModel):
 class TaskReorder(BaseModel):
     task_ids: List[str]
 
+class TaskMove(BaseModel):
+    before_id: Optional[str] = None  # the task to place this one right after
+    after_id: Optional[str] = None   # the task to place this one right before
+
+class TaskMoveResponse(BaseModel):
+    id: str
+    rank: str
+
 # Note Schemas
 class NoteCreate(BaseModel):
     title: str = Field(..., min_length=1, max_length=255)
@@ -176,6 +188,53 @@ class ActivityResponse(BaseModel):
     details: Optional[str] = None
     created_at: datetime
 
+# Bulk Schemas
+MAX_BULK_ITEMS = 500
+
+class TaskBulkUpdate(TaskUpdate):
+    id: str
+
+class NoteBulkUpdate(NoteUpdate):
+    id: str
+
+class PostBulkUpdate(PostUpdate):
+    id: str
+
+class TaskBulkRequest(BaseModel):
+    create: List[TaskCreate] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+    update: List[TaskBulkUpdate] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+    delete: List[str] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+
+class NoteBulkRequest(BaseModel):
+    create: List[NoteCreate] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+    update: List[NoteBulkUpdate] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+    delete: List[str] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+
+class PostBulkRequest(BaseModel):
+    create: List[PostCreate] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+    update: List[PostBulkUpdate] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+    delete: List[str] = Field(default_factory=list, max_length=MAX_BULK_ITEMS)
+
+class BulkItemResult(BaseModel):
+    index: int  # position of the item in its request list
+    id: Optional[str] = None
+    ok: bool
+    error: Optional[str] = None
+
+class BulkResponse(BaseModel):
+    created: List[BulkItemResult] = []
+    updated: List[BulkItemResult] = []
+    deleted: List[BulkItemResult] = []
+
+# Search Schemas
+class SearchResult(BaseModel):
+    entity_type: str  # task, note, post
+    id: str
+    title: str
+    snippet: Optional[str] = None
+    rank: float
+    updated_at: datetime
+
 # Analytics Schemas
 class AnalyticsResponse(BaseModel):
     tasks_by_status: dict
@@ -189,4 +248,22 @@ class AnalyticsResponse(BaseModel):
 # Export Schemas
 class ExportRequest(BaseModel):
     entity_type: str  # tasks, notes, posts, all
-    format: str = "csv"  # csv or json
+    format: str = "csv"  # csv, json or ndjson
+    gzip: bool = False
+
+class ExportJobResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: str
+    entity_type: str
+    format: str
+    gzip: bool
+    status: str  # queued, running, completed, failed
+    rows_total: Optional[int] = None
+    rows_done: int = 0
+    bytes_written: int = 0
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    download_url: Optional[str] = None
@@ -1,20 +1,16 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
+import importlib
+import json
 import os
 import logging
+import sys
 from pathlib import Path
 
-from database import engine, Base
-
-# Route modules
-from routes.auth import router as auth_router
-from routes.tags import router as tags_router
-from routes.tasks import router as tasks_router
-from routes.notes import router as notes_router
-from routes.posts import router as posts_router
-from routes.data import router as data_router
+from request_context import RequestScopeMiddleware
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -26,6 +22,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Fast startup (default on Vercel, where every cold start pays for imports):
+# route modules load on the first request under their path, and the docs
+# serve the precomputed openapi.json instead of generating it.
+# Same check as database.IS_SERVERLESS, which this module no longer imports up front
+IS_SERVERLESS = bool(os.environ.get('VERCEL'))
+FAST_STARTUP = os.environ.get('FAST_STARTUP', '1' if IS_SERVERLESS else '0').lower() in ('1', 'true', 'yes')
+OPENAPI_PATH = ROOT_DIR / "openapi.json"
+
+# First path segment under /api -> module whose `router` serves it, in include order
+ROUTE_MODULES = {
+    "auth": "routes.auth",
+    "profile": "routes.auth",
+    "tags": "routes.tags",
+    "tasks": "routes.tasks",
+    "notes": "routes.notes",
+    "posts": "routes.posts",
+    "activities": "routes.data",
+    "analytics": "routes.data",
+    "export": "routes.data",
+    "dashboard": "routes.data",
+    "search": "routes.search",
+    "admin": "routes.admin",
+}
+
 app = FastAPI(
     title="Flow API",
     description="Productivity dashboard API with tasks, notes, posts, analytics, and more.",
@@ -34,13 +54,13 @@ app = FastAPI(
     redoc_url="/redoc",
 )
 
-# Rate limiting
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+# Rate limiting — slowapi's RateLimitExceeded is a 429 HTTPException, so it is
+# handled by status code and slowapi only loads with the routes that use it
+async def rate_limit_exceeded(request: Request, exc):
+    # Same body as slowapi's _rate_limit_exceeded_handler (rate limit headers are off)
+    return JSONResponse({"error": f"Rate limit exceeded: {exc.detail}"}, status_code=429)
+
+app.add_exception_handler(429, rate_limit_exceeded)
 
 # Mount uploads directory for static files (skip on read-only serverless)
 UPLOAD_DIR = ROOT_DIR / "uploads"
@@ -64,26 +84,104 @@ app.add_middleware(
     allow_origins=ALLOWED_ORIGINS,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["X-Total-Count"],
+    expose_headers=["X-Total-Count", "X-Total-Count-Estimated", "X-Next-Cursor", "Content-Range", "ETag"],
 )
 
-# Create a router with the /api prefix and include all route modules
+# Attributes pool connection hold time to the route that held it
+app.add_middleware(RequestScopeMiddleware)
+
+# Root and health routes; route modules are included by include_routes()
 api_router = APIRouter(prefix="/api")
-api_router.include_router(auth_router)
-api_router.include_router(tags_router)
-api_router.include_router(tasks_router)
-api_router.include_router(notes_router)
-api_router.include_router(posts_router)
-api_router.include_router(data_router)
-
-# Health check and root routes
+
 @api_router.get("/")
 async def root():
     return {"message": "Flow API is running"}
 
 @api_router.get("/health")
 async def health_check():
+    # Liveness only; activity log and replica internals are under /api/admin
     return {"status": "healthy"}
 
-# Include the router in the main app
 app.include_router(api_router)
+
+_included_modules = set()
+
+def include_routes(module_name: str) -> None:
+    """Import a route module and add its routes under /api, once."""
+    if module_name in _included_modules:
+        return
+    app.include_router(importlib.import_module(module_name).router, prefix="/api")
+    _included_modules.add(module_name)
+
+def include_all_routes() -> None:
+    for module_name in dict.fromkeys(ROUTE_MODULES.values()):
+        include_routes(module_name)
+
+class LazyRoutesMiddleware:
+    """Includes the route module serving a request's path before routing it."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            parts = scope["path"].split("/", 3)
+            if len(parts) > 2 and parts[1] == "api" and parts[2] in ROUTE_MODULES:
+                include_routes(ROUTE_MODULES[parts[2]])
+        await self.app(scope, receive, send)
+
+def precomputed_openapi() -> dict:
+    if app.openapi_schema is None:
+        app.openapi_schema = json.loads(OPENAPI_PATH.read_text())
+    return app.openapi_schema
+
+def generate_openapi() -> dict:
+    """The schema FastAPI builds from every route (what openapi.json must match)."""
+    include_all_routes()
+    app.openapi_schema = None
+    return FastAPI.openapi(app)
+
+if FAST_STARTUP:
+    app.add_middleware(LazyRoutesMiddleware)
+    app.openapi = precomputed_openapi
+else:
+    include_all_routes()
+
+@app.on_event("startup")
+async def create_activity_partitions():
+    # Long-running servers top up future partitions on boot; cron runs partitions.py too
+    if IS_SERVERLESS:
+        return
+    from database import engine
+    from partitions import ensure_partitions
+    try:
+        async with engine.connect() as conn:
+            await ensure_partitions(conn)
+    except Exception as e:
+        logger.warning(f"Could not ensure activity partitions: {e}")
+
+@app.on_event("startup")
+async def start_export_worker():
+    # Picks up export jobs queued or orphaned before this process started
+    if IS_SERVERLESS:
+        return
+    from export_jobs import start_inline_worker
+    start_inline_worker()
+
+@app.on_event("shutdown")
+async def drain_activity_log():
+    # Write out activities still buffered in memory before the process exits
+    # (nothing to do if no route ever loaded the activity log)
+    if "activity_log" in sys.modules:
+        await sys.modules["activity_log"].activity_sink.close()
+
+@app.on_event("shutdown")
+async def close_shared_cache():
+    if "cache" in sys.modules:
+        await sys.modules["cache"].close_cache()
+
+if __name__ == "__main__":
+    # python server.py --write-openapi: refresh the schema served in fast startup mode
+    if sys.argv[1:] == ["--write-openapi"]:
+        OPENAPI_PATH.write_text(json.dumps(generate_openapi(), separators=(",", ":")))
+        print(f"Wrote {OPENAPI_PATH}")
@@ -0,0 +1,189 @@
+"""Per-user counter rollup backing the dashboard and analytics breakdowns.
+
+Route modules compute counter deltas for each write and apply them in the
+same transaction, so reads never have to re-aggregate a user's history.
+Run this module directly to check the rollup against the source tables:
+
+    python stats.py [--user USER_ID] [--repair]
+"""
+from collections import Counter
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, func, delete, literal, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Task, Note, Post, Tag, UserStat
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== COUNTERS ====================
+
+def task_counters(task: Task) -> Counter:
+    """Counters a single task contributes to its owner's rollup."""
+    counters = Counter({"tasks.total": 1})
+    if task.status:
+        counters[f"tasks.status:{task.status}"] += 1
+    if task.priority:
+        counters[f"tasks.priority:{task.priority}"] += 1
+    return counters
+
+
+def note_counters(note: Note) -> Counter:
+    """Counters a single note contributes to its owner's rollup."""
+    counters = Counter({"notes.total": 1})
+    if note.is_pinned:
+        counters["notes.pinned"] += 1
+    if note.color:
+        counters[f"notes.color:{note.color}"] += 1
+    return counters
+
+
+def post_counters(post: Post) -> Counter:
+    """Counters a single post contributes to its owner's rollup."""
+    counters = Counter({"posts.total": 1})
+    if post.is_published:
+        counters["posts.published"] += 1
+    return counters
+
+
+def tag_counters(tag: Tag) -> Counter:
+    """Counters a single tag contributes to its owner's rollup."""
+    return Counter({"tags.total": 1})
+
+
+def counter_delta(old: Counter, new: Counter) -> Dict[str, int]:
+    """Per-stat change needed to go from old to new contributions."""
+    return {k: new.get(k, 0) - old.get(k, 0) for k in old.keys() | new.keys()
+            if new.get(k, 0) != old.get(k, 0)}
+
+
+def negate(counters: Counter) -> Dict[str, int]:
+    return {k: -v for k, v in counters.items()}
+
+
+def _stats_lock_key(user_id: str):
+    return func.hashtext(literal("user_stats:") + user_id)
+
+
+async def apply_stat_deltas(db: AsyncSession, user_id: str, deltas: Dict[str, int]) -> None:
+    """Add deltas to the user's counters; call before the write's commit.
+
+    Holds the user's stats lock in shared mode until the commit, so a repair
+    (which takes it exclusively) never recounts around an in-flight write.
+    Shared holders don't exclude each other, so rows are sorted to keep the
+    upsert's row lock order stable across concurrent writes.
+    """
+    rows = [{"user_id": user_id, "stat": stat, "count": delta} for stat, delta in sorted(deltas.items()) if delta]
+    if not rows:
+        return
+    await db.execute(select(func.pg_advisory_xact_lock_shared(_stats_lock_key(user_id))))
+    stmt = insert(UserStat).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserStat.user_id, UserStat.stat],
+        set_={"count": UserStat.count + stmt.excluded.count},
+    )
+    await db.execute(stmt)
+
+
+# ==================== READS ====================
+
+async def get_user_stats(db: AsyncSession, user_id: str) -> Dict[str, int]:
+    """Return all counters for a user as a flat {stat: count} dict."""
+    result = await db.execute(
+        select(UserStat.stat, UserStat.count).where(UserStat.user_id == user_id)
+    )
+    return {stat: count for stat, count in result.all()}
+
+
+def breakdown(stats: Dict[str, int], prefix: str) -> Dict[str, int]:
+    """Extract a grouped breakdown, e.g. breakdown(stats, 'tasks.status') -> {'todo': 3}."""
+    prefix = f"{prefix}:"
+    return {k[len(prefix):]: v for k, v in stats.items() if k.startswith(prefix) and v > 0}
+
+
+# ==================== CONSISTENCY CHECK ====================
+
+def source_counts_query(user_id: Optional[str] = None):
+    """Recompute every counter from the source tables as (user_id, stat, count) rows."""
+    def grouped(model, stat, *conditions, key=None):
+        label = literal(stat) if key is None else literal(f"{stat}:") + key
+        query = select(model.user_id, label.label("stat"), func.count().label("count"))
+        query = query.where(*conditions)
+        if key is not None:
+            query = query.where(key.is_not(None)).group_by(model.user_id, key)
+        else:
+            query = query.group_by(model.user_id)
+        if user_id is not None:
+            query = query.where(model.user_id == user_id)
+        return query
+
+    return union_all(
+        grouped(Task, "tasks.total"),
+        grouped(Task, "tasks.status", key=Task.status),
+        grouped(Task, "tasks.priority", key=Task.priority),
+        grouped(Note, "notes.total"),
+        grouped(Note, "notes.pinned", Note.is_pinned == True),
+        grouped(Note, "notes.color", key=Note.color),
+        grouped(Post, "posts.total"),
+        grouped(Post, "posts.published", Post.is_published == True),
+        grouped(Tag, "tags.total"),
+    )
+
+
+async def check_user_stats(db: AsyncSession, user_id: Optional[str] = None,
+                           repair: bool = False) -> List[dict]:
+    """Compare the rollup with the source tables and optionally fix any drift.
+
+    Returns one entry per drifted counter with the stored and actual values.
+    Repairs take each drifted user's stats lock exclusively and recount under
+    it, so writes committed meanwhile are neither lost nor counted twice.
+    """
+    result = await db.execute(source_counts_query(user_id))
+    actual = {(r.user_id, r.stat): r.count for r in result.all()}
+
+    query = select(UserStat.user_id, UserStat.stat, UserStat.count)
+    if user_id is not None:
+        query = query.where(UserStat.user_id == user_id)
+    result = await db.execute(query)
+    stored = {(r.user_id, r.stat): r.count for r in result.all()}
+
+    drift = []
+    for key in actual.keys() | stored.keys():
+        expected, found = actual.get(key, 0), stored.get(key, 0)
+        if expected != found:
+            drift.append({"user_id": key[0], "stat": key[1], "stored": found, "actual": expected})
+
+    if repair and drift:
+        for user in {d["user_id"] for d in drift}:
+            await db.execute(select(func.pg_advisory_xact_lock(_stats_lock_key(user))))
+            result = await db.execute(source_counts_query(user))
+            await db.execute(delete(UserStat).where(UserStat.user_id == user))
+            rows = [{"user_id": user, "stat": r.stat, "count": r.count} for r in result.all()]
+            if rows:
+                await db.execute(insert(UserStat).values(rows))
+        await db.commit()
+        logger.info(f"Repaired user_stats drift for {len({d['user_id'] for d in drift})} user(s)")
+    return drift
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+    from database import AsyncSessionLocal
+
+    parser = argparse.ArgumentParser(description="Check the user_stats rollup for drift.")
+    parser.add_argument("--user", help="Only check this user id")
+    parser.add_argument("--repair", action="store_true", help="Rewrite drifted users' counters")
+    args = parser.parse_args()
+
+    async def main():
+        async with AsyncSessionLocal() as db:
+            drift = await check_user_stats(db, args.user, repair=args.repair)
+        for d in sorted(drift, key=lambda d: (d["user_id"], d["stat"])):
+            print(f"{d['user_id']}  {d['stat']:<40} stored={d['stored']} actual={d['actual']}")
+        print(f"{len(drift)} drifted counter(s){' repaired' if args.repair and drift else ''}")
+
+    asyncio.run(main())
@@ -0,0 +1,45 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# Backend modules import each other as top-level modules
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Tests that need Postgres run against this database (local and disposable,
+# migrated to head) and are skipped when it isn't set
+TEST_DATABASE_URL = os.environ.get("DATABASE_URL")
+
+# database.py and auth.py refuse to import without these; unit tests never
+# connect, so placeholders are enough
+os.environ.setdefault("DATABASE_URL", "postgresql://localhost/flow_test")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+
+@pytest.fixture
+def server():
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def shared(monkeypatch, server):
+    """Point the cache module at a fakeredis shared tier, with an isolated cache registry."""
+    import fakeredis
+    import cache
+
+    backend = cache.RedisBackend("redis://localhost")
+    backend.client = fakeredis.FakeAsyncRedis(server=server)
+    monkeypatch.setattr(cache, "_shared", backend)
+    monkeypatch.setattr(cache, "_caches", {})
+    # Tests drive invalidation messages themselves rather than through a background subscriber
+    monkeypatch.setattr(cache, "_listener", object())
+    return backend
+
+
+@pytest.fixture(scope="session")
+def database():
+    if not TEST_DATABASE_URL:
+        pytest.skip("DATABASE_URL is not set")
+    return TEST_DATABASE_URL
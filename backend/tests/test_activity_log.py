@@ -0,0 +1,25 @@
+"""Activity rollup statements."""
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects import postgresql
+
+from activity_log import daily_count_upsert
+
+
+def activity(user_id, entity_type, action):
+    return {"user_id": user_id, "entity_type": entity_type, "action": action,
+            "created_at": datetime(2024, 5, 1, 12, tzinfo=timezone.utc)}
+
+
+def upserted_keys(rows) -> list:
+    params = daily_count_upsert(rows).compile(dialect=postgresql.dialect()).params
+    n = len(params) // 5
+    return [(params[f"user_id_m{i}"], params[f"entity_type_m{i}"], params[f"action_m{i}"]) for i in range(n)]
+
+
+def test_daily_counts_are_upserted_in_key_order():
+    rows = [activity("u2", "task", "created"), activity("u1", "note", "updated"),
+            activity("u1", "note", "created"), activity("u2", "task", "created")]
+    expected = [("u1", "note", "created"), ("u1", "note", "updated"), ("u2", "task", "created")]
+    assert upserted_keys(rows) == expected
+    assert upserted_keys(rows[::-1]) == expected
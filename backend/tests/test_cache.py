@@ -0,0 +1,156 @@
+"""Cache tiers against fakeredis, an in-process Redis-protocol stand-in."""
+import asyncio
+import json
+from datetime import date, datetime, timezone
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+import cache
+from cache import Cache, RedisBackend, INVALIDATION_CHANNEL, invalidate_tags
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_set_then_get_from_shared_tier(shared):
+    async def scenario():
+        c = Cache("things")
+        await c.set("a", {"n": 1, "items": [1, 2]}, tags=["user:1"])
+        c.clear()  # force the read through to the shared tier
+        assert await c.get("a") == {"n": 1, "items": [1, 2]}
+        assert await c.get("missing", "default") == "default"
+    run(scenario())
+
+
+def test_shared_entry_expires_after_ttl(shared):
+    async def scenario():
+        c = Cache("short")
+        await c.set("a", 1, ttl=0.05)
+        c.clear()
+        assert await c.get("a") == 1
+        c.clear()
+        await asyncio.sleep(0.1)
+        assert await c.get("a") is None
+        assert await shared.client.exists(RedisBackend._key("short", "a")) == 0
+    run(scenario())
+
+
+def test_local_copy_of_shared_entry_is_capped(shared):
+    c = Cache("capped", ttl=600)
+    assert c._local_ttl(600) == cache.CACHE_LOCAL_TTL
+
+
+def test_invalidate_tags_drops_shared_entries_and_tag_sets(shared):
+    async def scenario():
+        c = Cache("tagged")
+        await c.set("one", 1, tags=["user:1"])
+        await c.set("two", 2, tags=["user:1", "activities:1"])
+        await c.set("other", 3, tags=["user:2"])
+
+        await invalidate_tags("user:1")
+
+        client = shared.client
+        assert await client.exists(RedisBackend._key("tagged", "one"), RedisBackend._key("tagged", "two")) == 0
+        assert await client.exists(RedisBackend._tag_key("user:1")) == 0
+        assert await client.exists(RedisBackend._key("tagged", "other")) == 1
+        assert await c.get("one") is None and await c.get("two") is None
+        assert await c.get("other") == 3
+    run(scenario())
+
+
+def test_delete_removes_shared_entry(shared):
+    async def scenario():
+        c = Cache("deleting")
+        await c.set("a", 1)
+        await c.delete("a")
+        assert await shared.client.exists(RedisBackend._key("deleting", "a")) == 0
+        assert await c.get("a") is None
+    run(scenario())
+
+
+def test_datetimes_round_trip_through_shared_tier(shared):
+    # The principal cache stores User column snapshots like this one
+    snapshot = {
+        "id": "u1",
+        "email": "a@example.com",
+        "email_verified": False,
+        "bio": None,
+        "created_at": datetime(2024, 5, 1, 10, 30, 15, 123456, tzinfo=timezone.utc),
+        "day": date(2024, 5, 1),
+    }
+
+    async def scenario():
+        c = Cache("principal-test")
+        await c.set("u1", snapshot)
+        c.clear()
+        value = await c.get("u1")
+        assert value == snapshot
+        assert isinstance(value["created_at"], datetime) and value["created_at"].tzinfo is not None
+        assert type(value["day"]) is date
+    run(scenario())
+
+
+def test_remote_invalidation_clears_another_instances_local_tier(shared):
+    async def scenario():
+        c = Cache("remote")
+        await c.set("tagged", 1, tags=["user:1"])
+        await c.set("keyed", 2)
+        await c.set("kept", 3, tags=["user:2"])
+
+        cache._apply_remote_invalidation({"origin": "another-worker", "tags": ["user:1"]})
+        cache._apply_remote_invalidation({"origin": "another-worker", "namespace": "remote", "keys": ["keyed"]})
+
+        assert c.local.get("tagged") is None
+        assert c.local.get("keyed") is None
+        assert c.local.get("kept") is not None
+    run(scenario())
+
+
+def test_own_invalidation_messages_are_ignored(shared):
+    async def scenario():
+        c = Cache("echo")
+        await c.set("a", 1, tags=["user:1"])
+        cache._apply_remote_invalidation({"origin": cache._INSTANCE_ID, "tags": ["user:1"]})
+        assert c.local.get("a") is not None
+    run(scenario())
+
+
+def test_listener_applies_published_invalidations(shared, server):
+    async def scenario():
+        c = Cache("subscribed")
+        await c.set("a", 1, tags=["user:1"])
+        listener = asyncio.create_task(shared.listen())
+        try:
+            other = fakeredis.FakeAsyncRedis(server=server)
+            message = json.dumps({"origin": "another-worker", "tags": ["user:1"]})
+            for _ in range(100):
+                # Publish until the subscriber is connected and has applied it
+                await other.publish(INVALIDATION_CHANNEL, message)
+                await asyncio.sleep(0.01)
+                if c.local.get("a") is None:
+                    break
+            assert c.local.get("a") is None
+        finally:
+            listener.cancel()
+    run(scenario())
+
+
+def test_shared_tier_errors_fall_back_to_local(shared, monkeypatch):
+    async def failing_get(*args, **kwargs):
+        raise ConnectionError("redis is down")
+
+    def failing_pipeline(*args, **kwargs):
+        raise ConnectionError("redis is down")
+
+    async def scenario():
+        c = Cache("degraded")
+        monkeypatch.setattr(shared.client, "get", failing_get)
+        monkeypatch.setattr(shared.client, "pipeline", failing_pipeline)
+        await c.set("a", 1)
+        assert await c.get("a") == 1  # served locally
+        c.clear()
+        assert await c.get("a", "default") == "default"
+    run(scenario())
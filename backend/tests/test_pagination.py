@@ -0,0 +1,38 @@
+"""Keyset cursor predicates, checked on the SQL they compile to."""
+from datetime import datetime, timezone
+
+from sqlalchemy.dialects import postgresql
+
+from helpers import decode_cursor, encode_cursor, keyset_condition
+from routes.notes import NOTE_SORT_KEYS
+from routes.posts import POST_SORT_KEYS
+from routes.tasks import TASK_SORT_KEYS
+
+CREATED = datetime(2024, 5, 1, 10, 30, tzinfo=timezone.utc)
+
+
+def sql(sort_keys, values) -> str:
+    return " ".join(str(keyset_condition(sort_keys, values).compile(dialect=postgresql.dialect())).split())
+
+
+def test_task_cursor_bounds_the_rank_index():
+    clause = sql(TASK_SORT_KEYS, ["d0001", CREATED, "t1"])
+    assert clause.startswith("tasks.rank >= %(rank_1)s AND (")
+    assert "(tasks.created_at, tasks.id) < (" in clause
+    assert "IS NULL" not in clause  # rank is NOT NULL
+
+
+def test_descending_cursors_are_one_row_comparison():
+    assert sql(POST_SORT_KEYS, [CREATED, "p1"]) == "(posts.created_at, posts.id) < (%(param_1)s, %(param_2)s)"
+    assert sql(NOTE_SORT_KEYS, [True, CREATED, "n1"]).startswith("(notes.is_pinned, notes.created_at, notes.id) < (")
+
+
+def test_null_cursor_values_fall_back_to_the_expansion():
+    # DESC sorts NULLs first, so every non-NULL row follows a NULL is_pinned
+    clause = sql(NOTE_SORT_KEYS, [None, CREATED, "n1"])
+    assert clause.startswith("notes.is_pinned IS NOT NULL OR notes.is_pinned IS NULL AND")
+
+
+def test_cursor_round_trip():
+    values = ["d0001", CREATED, "t1"]
+    assert decode_cursor(encode_cursor(values), TASK_SORT_KEYS) == values
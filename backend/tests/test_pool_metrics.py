@@ -0,0 +1,26 @@
+"""Per-engine pool metrics, on engines that never connect."""
+from database import create_engine_for
+from pool_metrics import _pools, pool_report
+
+
+def test_each_engine_reports_its_own_pool():
+    replica = create_engine_for("postgresql://replica.invalid/flow", "replica-test", serverless=False)
+    try:
+        report = pool_report()
+        assert {"primary", "replica-test"} <= report.keys()
+        _pools["replica-test"][1].checkouts = 3
+        assert pool_report()["replica-test"]["checkouts"] == 3
+        assert _pools["primary"][1] is not _pools["replica-test"][1]
+        assert report["replica-test"]["size"] == replica.sync_engine.pool.size()
+    finally:
+        _pools.pop("replica-test")
+
+
+def test_disposed_engine_keeps_counting_into_the_same_metrics():
+    engine = create_engine_for("postgresql://replica.invalid/flow", "dispose-test", serverless=False)
+    try:
+        metrics = _pools["dispose-test"][1]
+        engine.sync_engine.dispose()
+        assert engine.sync_engine.pool.metrics is metrics
+    finally:
+        _pools.pop("dispose-test")
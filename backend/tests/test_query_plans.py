@@ -0,0 +1,143 @@
+"""The hot read routes' queries must be served by indexes.
+
+Calls each route handler against a seeded user, captures every SELECT it
+sends, and runs EXPLAIN on it with sequential scans disabled. The planner then
+only picks a Seq Scan when no index can serve the query at all, so the check
+holds regardless of how small the seeded tables are. Needs DATABASE_URL:
+
+    DATABASE_URL=postgresql://localhost/flow_test python -m pytest tests/test_query_plans.py
+"""
+import asyncio
+import json
+
+import pytest
+from fastapi import Response
+from sqlalchemy import event, select
+
+from benchmarks.common import seed_user, drop_user, make_request
+from auth import Principal
+from schemas import CountModeEnum, TaskStatusEnum
+
+
+def list_args(**overrides):
+    """Explicit values for the list routes' Query parameters (defaults are FieldInfo objects)."""
+    args = dict(search=None, tag_id=None, limit=20, offset=0, cursor=None, count=CountModeEnum.EXACT)
+    args.update(overrides)
+    return args
+
+
+def route_cases(db, user, tag_id):
+    """(label, zero-arg coroutine factory) for every checked route variant."""
+    from routes.tasks import get_tasks
+    from routes.notes import get_notes
+    from routes.posts import get_posts
+    from routes.tags import get_tags
+    from routes.data import get_activities, get_analytics, get_dashboard_stats
+    from routes.search import search
+
+    def get(handler, path, response=None, **params):
+        return handler(make_request(path), response or Response(), **params, current_user=user, db=db)
+
+    tasks = dict(status=None, priority=None)
+    notes = dict(is_pinned=None, color=None)
+
+    async def tasks_second_page():
+        response = Response()
+        await get(get_tasks, "/api/tasks", response, **list_args(**tasks))
+        await get(get_tasks, "/api/tasks", **list_args(**tasks, cursor=response.headers.get("X-Next-Cursor")))
+
+    return [
+        ("GET /tasks", lambda: get(get_tasks, "/api/tasks", **list_args(**tasks))),
+        ("GET /tasks?status", lambda: get(
+            get_tasks, "/api/tasks", **list_args(status=TaskStatusEnum.TODO, priority=None))),
+        ("GET /tasks?tag_id", lambda: get(get_tasks, "/api/tasks", **list_args(**tasks, tag_id=tag_id))),
+        ("GET /tasks?cursor", tasks_second_page),
+        ("GET /notes", lambda: get(get_notes, "/api/notes", **list_args(**notes))),
+        ("GET /notes?is_pinned", lambda: get(get_notes, "/api/notes", **list_args(is_pinned=True, color=None))),
+        ("GET /posts", lambda: get(get_posts, "/api/posts", **list_args(is_published=None))),
+        ("GET /posts?is_published", lambda: get(get_posts, "/api/posts", **list_args(is_published=True))),
+        ("GET /tags", lambda: get(get_tags, "/api/tags")),
+        ("GET /activities", lambda: get(get_activities, "/api/activities", limit=50, entity_type=None)),
+        ("GET /activities?entity_type", lambda: get(
+            get_activities, "/api/activities", limit=50, entity_type="task")),
+        ("GET /analytics", lambda: get(get_analytics, "/api/analytics", days=30)),
+        ("GET /dashboard/stats", lambda: get(get_dashboard_stats, "/api/dashboard/stats")),
+        ("GET /search", lambda: search(q="lorem", types=None, limit=20, current_user=user, db=db)),
+    ]
+
+
+ROUTES = [label for label, _ in route_cases(None, None, None)]
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+async def capture_statements(engine, fn) -> list:
+    """Run fn() and return the (statement, parameters) of every SELECT it executed."""
+    captured = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        await fn()
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return captured
+
+
+async def explain(db, statement: str, parameters) -> dict:
+    conn = await db.connection()
+    result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+    plan = result.scalar()
+    return (json.loads(plan) if isinstance(plan, str) else plan)[0]["Plan"]
+
+
+async def collect_plans() -> dict:
+    """{route label: [(statement, tables scanned sequentially)]} for a freshly seeded user."""
+    from database import AsyncSessionLocal, engine
+    from models import Tag
+    from stats import check_user_stats
+
+    plans = {}
+    try:
+        async with AsyncSessionLocal() as db:
+            user_id = await seed_user(db)
+            await check_user_stats(db, user_id, repair=True)
+            tag_id = (await db.execute(select(Tag.id).where(Tag.user_id == user_id).limit(1))).scalar()
+            try:
+                for label, fn in route_cases(db, Principal(user_id), tag_id):
+                    statements = await capture_statements(engine, fn)
+                    await db.rollback()
+
+                    conn = await db.connection()
+                    await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+                    plans[label] = []
+                    for statement, parameters in statements:
+                        nodes = plan_nodes(await explain(db, statement, parameters))
+                        seq_scans = sorted({n["Relation Name"] for n in nodes if n["Node Type"] == "Seq Scan"})
+                        plans[label].append((" ".join(statement.split()), seq_scans))
+                    await db.rollback()
+            finally:
+                await drop_user(db, user_id)
+    finally:
+        # Pooled connections belong to this event loop
+        await engine.dispose()
+    return plans
+
+
+@pytest.fixture(scope="module")
+def plans(database):
+    return asyncio.run(collect_plans())
+
+
+@pytest.mark.parametrize("route", ROUTES)
+def test_route_queries_use_indexes(plans, route):
+    assert plans[route], f"{route} sent no SELECT"
+    seq_scans = [(statement[:120], tables) for statement, tables in plans[route] if tables]
+    assert not seq_scans, f"{route} fell back to a sequential scan: {seq_scans}"
@@ -0,0 +1,185 @@
+"""Read routing across replicas, with fake engines and a fakeredis pin cache."""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+
+import replicas
+from cache import Cache
+from replicas import ReplicaSet
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class FakeEngine:
+    """Answers the lag query with a fixed lag, or hangs while connecting or querying."""
+
+    def __init__(self, name, lag=0.0, hang=None, fail=False):
+        self.name, self.lag, self.hang, self.fail = name, lag, hang, fail
+
+    @asynccontextmanager
+    async def connect(self):
+        if self.fail:
+            raise ConnectionRefusedError(f"{self.name} is down")
+        if self.hang == "connect":
+            await asyncio.sleep(3600)
+        yield self
+
+    async def execute(self, statement):
+        if self.hang == "query":
+            await asyncio.sleep(3600)
+        return FakeResult(self.lag)
+
+    def __repr__(self):
+        return self.name
+
+
+PRIMARY = FakeEngine("primary")
+
+
+@pytest.fixture
+def route(monkeypatch, shared):
+    """Install the given replicas behind a fake primary, with pins in the fakeredis-backed cache."""
+    monkeypatch.setattr(replicas, "engine", PRIMARY)
+    monkeypatch.setattr(replicas, "_primary_pins", Cache("primary_pin", ttl=replicas.READ_YOUR_WRITES_WINDOW))
+    monkeypatch.setattr(replicas, "REPLICA_CHECK_TIMEOUT", 0.05)
+
+    def install(*engines):
+        monkeypatch.setattr(replicas, "replica_engines", list(engines))
+        monkeypatch.setattr(replicas, "replica_set", ReplicaSet(list(engines)))
+        return replicas.replica_set
+    return install
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_reads_go_round_robin_to_healthy_replicas(route):
+    a, b = FakeEngine("a"), FakeEngine("b")
+    replica_set = route(a, b)
+
+    async def scenario():
+        await replica_set.check()
+        return [await replicas.read_engine_for("u1") for _ in range(4)]
+    assert run(scenario()) == [a, b, a, b]
+
+
+def test_replicas_are_unused_until_checked(route):
+    route(FakeEngine("a"))
+
+    async def scenario():
+        return await replicas.read_engine_for("u1")
+    assert run(scenario()) is PRIMARY
+
+
+def test_lagging_and_failing_replicas_are_skipped(route):
+    behind = FakeEngine("behind", lag=replicas.REPLICA_MAX_LAG + 1)
+    down = FakeEngine("down", fail=True)
+    ok = FakeEngine("ok", lag=replicas.REPLICA_MAX_LAG)
+    replica_set = route(behind, down, ok)
+
+    async def scenario():
+        await replica_set.check()
+        return [await replicas.read_engine_for("u1") for _ in range(3)]
+    assert run(scenario()) == [ok, ok, ok]
+    assert replica_set.status() == [
+        {"healthy": False, "lag_seconds": replicas.REPLICA_MAX_LAG + 1},
+        {"healthy": False, "lag_seconds": None},
+        {"healthy": True, "lag_seconds": replicas.REPLICA_MAX_LAG},
+    ]
+
+
+@pytest.mark.parametrize("hang", ["connect", "query"])
+def test_hung_health_check_times_out_and_falls_back_to_primary(route, hang):
+    replica_set = route(FakeEngine("hung", hang=hang))
+
+    async def scenario():
+        start = time.monotonic()
+        await replica_set.check()
+        return time.monotonic() - start, await replicas.read_engine_for("u1")
+    elapsed, chosen = run(scenario())
+    assert elapsed < 1
+    assert chosen is PRIMARY
+    assert replica_set.healthy == [False]
+
+
+def test_replica_that_falls_behind_stops_taking_reads(route):
+    replica = FakeEngine("a")
+    replica_set = route(replica)
+
+    async def scenario():
+        await replica_set.check()
+        first = await replicas.read_engine_for("u1")
+        replica.lag = replicas.REPLICA_MAX_LAG + 1
+        await replica_set.check()
+        return first, await replicas.read_engine_for("u1")
+    assert run(scenario()) == (replica, PRIMARY)
+
+
+def test_pinned_user_reads_from_primary_on_every_worker(route):
+    replica = FakeEngine("a")
+    replica_set = route(replica)
+
+    async def scenario():
+        await replica_set.check()
+        await replicas.pin_to_primary(["u1"])
+        replicas._primary_pins.clear()  # another worker: only the shared tier has the pin
+        return await replicas.read_engine_for("u1"), await replicas.read_engine_for("u2")
+    assert run(scenario()) == (PRIMARY, replica)
+
+
+def test_pins_expire_after_the_window(route, monkeypatch):
+    replica = FakeEngine("a")
+    replica_set = route(replica)
+    monkeypatch.setattr(replicas, "_primary_pins", Cache("primary_pin", ttl=0.05))
+
+    async def scenario():
+        await replica_set.check()
+        await replicas.pin_to_primary(["u1"])
+        pinned = await replicas.read_engine_for("u1")
+        await asyncio.sleep(0.1)
+        return pinned, await replicas.read_engine_for("u1")
+    assert run(scenario()) == (PRIMARY, replica)
+
+
+class FakeSession:
+    def __init__(self, bind):
+        self.bind = bind
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def close(self):
+        pass
+
+
+def test_read_session_is_bound_to_the_chosen_engine(route, monkeypatch):
+    monkeypatch.setattr(replicas, "AsyncSessionLocal", FakeSession)
+    replica = FakeEngine("a")
+    replica_set = route(replica)
+
+    async def scenario():
+        await replica_set.check()
+        bound = []
+        for user_id in ("u1", "u2"):
+            sessions = replicas.get_read_db(replicas.Principal(user_id))
+            session = await sessions.__anext__()
+            bound.append(session.bind)
+            await sessions.aclose()
+        return bound
+
+    async def pinned():
+        await replicas.pin_to_primary(["u1"])
+        return await scenario()
+    assert run(pinned()) == [PRIMARY, replica]
@@ -0,0 +1,41 @@
+"""Counter rollup writes, checked on the statements they send."""
+import asyncio
+from collections import Counter
+
+from sqlalchemy.dialects import postgresql
+
+from stats import apply_stat_deltas, counter_delta
+
+
+class RecordingSession:
+    """Stands in for AsyncSession, keeping every statement instead of running it."""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+
+
+def upserted_stats(deltas) -> list:
+    db = RecordingSession()
+    asyncio.run(apply_stat_deltas(db, "u1", deltas))
+    params = db.statements[-1].compile(dialect=postgresql.dialect()).params
+    return [params[f"stat_m{i}"] for i in range(len(params) // 3)]
+
+
+def test_deltas_are_upserted_in_stat_order():
+    # A status and priority change at once: four counters move
+    deltas = counter_delta(
+        Counter({"tasks.total": 1, "tasks.status:todo": 1, "tasks.priority:low": 1}),
+        Counter({"tasks.total": 1, "tasks.status:done": 1, "tasks.priority:high": 1}),
+    )
+    expected = ["tasks.priority:high", "tasks.priority:low", "tasks.status:done", "tasks.status:todo"]
+    assert upserted_stats(deltas) == expected
+    assert upserted_stats(dict(reversed(list(deltas.items())))) == expected
+
+
+def test_zero_deltas_send_nothing():
+    db = RecordingSession()
+    asyncio.run(apply_stat_deltas(db, "u1", {"tasks.total": 0}))
+    assert db.statements == []
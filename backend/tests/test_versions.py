@@ -0,0 +1,9 @@
+"""Conditional GET responses."""
+from versions import not_modified_response
+
+
+def test_not_modified_varies_on_accept_like_the_full_response():
+    response = not_modified_response('"abc"')
+    assert response.status_code == 304
+    assert response.headers["etag"] == '"abc"'
+    assert response.headers["vary"] == "Accept"
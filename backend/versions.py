@@ -0,0 +1,111 @@
+"""Per-user collection versions backing conditional GETs.
+
+Every write bumps the version of the collection it touches inside its own
+transaction. A read derives a strong ETag from the versions it depends on and
+its query string. When the client's If-None-Match matches, the read answers
+304 before running its query.
+
+Versions are read before the data, so a write landing in between can only
+pair newer data with an older ETag, which costs one extra refetch and is
+never stale.
+"""
+import hashlib
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import CollectionVersion
+from replicas import pin_to_primary
+from serialization import wants_msgpack
+
+# Collections each read depends on; tag names are embedded in task/note/post responses
+TASKS_DEPS = ("tasks", "tags")
+NOTES_DEPS = ("notes", "tags")
+POSTS_DEPS = ("posts", "tags")
+TAGS_DEPS = ("tags",)
+DASHBOARD_DEPS = ("tasks", "notes", "posts", "tags")
+ANALYTICS_DEPS = ("tasks", "notes", "posts", "activities")
+
+
+async def bump_versions(db: AsyncSession, keys: Iterable[Tuple[str, str]]) -> None:
+    """Increment (user_id, collection) versions as part of the caller's transaction.
+
+    Every write goes through here, so it also pins the users' reads to the primary.
+    """
+    # Deduplicated (ON CONFLICT can't touch a row twice) and sorted to keep lock order stable
+    rows = [{"user_id": u, "collection": c, "version": 1} for u, c in sorted(set(keys))]
+    if not rows:
+        return
+    await pin_to_primary(row["user_id"] for row in rows)
+    stmt = insert(CollectionVersion).values(rows)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[CollectionVersion.user_id, CollectionVersion.collection],
+        set_={"version": CollectionVersion.version + 1},
+    ))
+
+
+async def bump_version(db: AsyncSession, user_id: str, *collections: str) -> None:
+    await bump_versions(db, ((user_id, c) for c in collections))
+
+
+async def get_versions(db: AsyncSession, user_id: str, collections: Sequence[str]) -> Dict[str, int]:
+    result = await db.execute(
+        select(CollectionVersion.collection, CollectionVersion.version)
+        .where(CollectionVersion.user_id == user_id, CollectionVersion.collection.in_(collections))
+    )
+    versions = dict.fromkeys(collections, 0)
+    versions.update({r.collection: r.version for r in result.all()})
+    return versions
+
+
+def make_etag(request: Request, user_id: str, versions: Dict[str, int], *extra) -> str:
+    """Strong ETag over the route, its query parameters, the user and the collection versions.
+
+    MessagePack and JSON bodies are different representations, so they get different tags.
+    """
+    key = "|".join([
+        request.url.path,
+        "msgpack" if wants_msgpack(request) else "json",
+        repr(sorted(request.query_params.multi_items())),
+        user_id,
+        *(f"{c}:{versions[c]}" for c in sorted(versions)),
+        *map(str, extra),
+    ])
+    return f'"{hashlib.sha1(key.encode()).hexdigest()[:32]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    # no-cache: browsers may store the response but must revalidate it every time
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def not_modified_response(etag: str) -> Response:
+    # The ETag differs per representation (see make_etag), so shared caches must key 304s on Accept too
+    return Response(status_code=304, headers={**etag_headers(etag), "Vary": "Accept"})
+
+
+async def conditional_get(request: Request, response: Response, db: AsyncSession, user_id: str,
+                          collections: Sequence[str], *extra) -> Optional[Response]:
+    """Set a read's ETag; return a 304 response when the client already has this version.
+
+    `extra` adds anything else the response depends on (e.g. the current date).
+    """
+    versions = await get_versions(db, user_id, collections)
+    etag = make_etag(request, user_id, versions, *extra)
+    if etag_matches(request, etag):
+        return not_modified_response(etag)
+    response.headers.update(etag_headers(etag))
+    return None
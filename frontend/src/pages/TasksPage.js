@@ -277,7 +277,10 @@ export default function TasksPage() {
       setTasks(newTasks);
       
       try {
-        await api.post('/tasks/reorder', { task_ids: newTasks.map(t => t.id) });
+        await api.post(`/tasks/${active.id}/move`, {
+          before_id: newTasks[newIndex - 1]?.id ?? null,
+          after_id: newTasks[newIndex + 1]?.id ?? null,
+        });
       } catch (error) {
         toast.error('Failed to reorder tasks');
         fetchTasks();